@@ -0,0 +1,452 @@
+import os
+import threading
+import numpy as np
+from scipy import sparse
+import mysql_utils as sqlDB
+from flight_utils import single_flight
+from keyword_utils import FINGERPRINT_QUERY
+from fanout_utils import fan_out
+from snapshot_utils import sparse_arrays, sparse_from
+
+TABLE_QUERIES = {
+    'university': "SELECT id, name FROM university",
+    'faculty': "SELECT id, name, university_id FROM faculty",
+    'publication': "SELECT id, num_citations FROM publication",
+    'keyword': "SELECT id, name FROM keyword",
+    'faculty_publication': "SELECT faculty_Id AS faculty_id, publication_Id AS publication_id FROM faculty_publication",
+    'publication_keyword': "SELECT publication_id, keyword_id FROM Publication_Keyword"
+}
+
+# the matrices and vectors derived from the loaded arrays, exported with them so shared
+# snapshot readers map them instead of deriving their own copies
+DERIVED_MATRICES = {'FP': 'csr', 'PK': 'csr', 'PK_csc': 'csc', 'G_UP': 'csr', 'G_FP': 'csr', 'G_FP_links': 'csr',
+                    'G_faculty': 'csr'}
+DERIVED_VECTORS = ('faculty_to_university_group', 'university_groups', 'faculty_groups', 'total_publications',
+                   'total_citations', 'citations')
+
+# the per request queries the engine replaces, used by parity mode to check its answers
+PARITY_QUERIES = {
+    'total_publications': """
+    SELECT university.name AS name, COUNT(DISTINCT fp.publication_Id) AS value
+    FROM university
+    JOIN faculty ON university.id = faculty.university_id
+    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+    JOIN publication ON publication.id = fp.publication_Id
+    GROUP BY university.name
+    ORDER BY value DESC
+    LIMIT %s OFFSET %s
+    """,
+    'total_citations': """
+    SELECT university.name AS name, SUM(publication.num_citations) AS value
+    FROM university
+    JOIN faculty ON university.id = faculty.university_id
+    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+    JOIN publication ON publication.id = fp.publication_Id
+    GROUP BY university.name
+    ORDER BY value DESC
+    LIMIT %s OFFSET %s
+    """,
+    'research_areas': """
+    SELECT k.name AS name, COUNT(DISTINCT fp.publication_Id) AS value
+    FROM university
+    JOIN faculty ON university.id = faculty.university_id
+    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+    JOIN publication ON publication.id = fp.publication_Id
+    JOIN Publication_Keyword pk ON publication.id = pk.publication_id
+    JOIN keyword k ON k.id = pk.keyword_id
+    WHERE university.name = %s
+    GROUP BY k.name
+    ORDER BY value DESC
+    LIMIT %s OFFSET %s
+    """,
+    'keyword_universities': """
+    SELECT university.name AS name, COUNT(DISTINCT faculty.id) AS num_faculty, COUNT(DISTINCT publication.id) AS value
+    FROM university
+    JOIN faculty ON university.id = faculty.university_id
+    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+    JOIN publication ON publication.id = fp.publication_Id
+    JOIN Publication_Keyword pk ON publication.id = pk.publication_id
+    JOIN keyword k ON k.id = pk.keyword_id
+    WHERE k.name = %s
+    GROUP BY university.name
+    ORDER BY value DESC, num_faculty DESC
+    LIMIT %s OFFSET %s
+    """,
+    'keyword_faculty': """
+    SELECT faculty.name AS name, COUNT(DISTINCT publication.id) AS value, SUM(publication.num_citations) AS num_citations
+    FROM faculty
+    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+    JOIN publication ON publication.id = fp.publication_Id
+    JOIN Publication_Keyword pk ON publication.id = pk.publication_id
+    JOIN keyword k ON k.id = pk.keyword_id
+    WHERE k.name = %s
+    GROUP BY faculty.name
+    ORDER BY value DESC, num_citations DESC
+    LIMIT %s OFFSET %s
+    """
+}
+
+
+def _ids(df, column):
+    if df.empty:
+        return np.array([], dtype=np.int64)
+    return df[column].fillna(-1).to_numpy(np.int64)
+
+
+def _dense_ids(ids, refs):
+    """
+    Map foreign key values in refs to positions in the id array ids, -1 where there is no match.
+    """
+    if len(ids) == 0:
+        return np.full(len(refs), -1, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    pos = np.clip(np.searchsorted(sorted_ids, refs), 0, len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == refs, order[pos], -1)
+
+
+def _incidence(rows, cols, shape, binary=True):
+    keep = (rows >= 0) & (cols >= 0)
+    m = sparse.csr_matrix((np.ones(int(keep.sum()), dtype=np.int32), (rows[keep], cols[keep])), shape=shape)
+    m.sum_duplicates()
+    if binary:
+        # duplicate link rows collapse to a single 0/1 entry
+        m.data[:] = 1
+    return m
+
+
+def _binary(m):
+    m = m.tocsr(copy=True)
+    m.data[:] = 1
+    return m
+
+
+def top_k(scores, k, offset=0, names=None):
+    """
+    Indices of the entries ranked offset..offset+k by descending score (ties by name),
+    selected with argpartition so only the candidates are sorted.
+    """
+    n = len(scores)
+    want = min(offset + k, n)
+    if want <= 0:
+        return np.array([], dtype=np.int64)
+    if want < n:
+        # include every entry tied with the cutoff so ties are broken consistently
+        cutoff = scores[np.argpartition(-scores, want - 1)[want - 1]]
+        candidates = np.flatnonzero(scores >= cutoff)
+    else:
+        candidates = np.arange(n)
+    if names is not None:
+        order = np.lexsort((names[candidates], -scores[candidates]))
+    else:
+        order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order][offset:want]
+
+
+class AnalyticsEngine:
+    def __init__(self, fetch=None, parity=False, snapshot=None):
+        """
+        In memory copy of the relational data behind the dashboard's aggregate widgets.
+
+        Tables are loaded once into integer id arrays and sparse incidence matrices
+        (faculty x publication, publication x keyword) and every aggregate is answered with
+        vectorized NumPy/SciPy operations. MySQL stays the source of truth: refresh() reloads
+        when the tables change, and with parity=True every answer is checked against SQL.
+
+        It exposes the same lookups as UniversityRollups and KeywordIndex so app.py can use
+        it in their place.
+
+        :param fetch: query function with the same signature as mysql_utils.fetch_data
+        :param parity: compare each result with the equivalent SQL query and report mismatches
+        :param snapshot: optional .npz file the first refresh starts from when it exists,
+                         and that is written after every load from MySQL
+        """
+        self.fetch = fetch or sqlDB.fetch_data
+        self.parity = parity
+        self.snapshot = snapshot
+        self.parity_mismatches = 0
+        self._lock = threading.Lock()
+        self.fingerprint = None
+        self.arrays = None
+        self.state = None
+
+    @property
+    def ready(self):
+        return self.arrays is not None
+
+    # loading
+
+    def _fingerprint(self):
+        df = self.fetch(FINGERPRINT_QUERY, cache=False)
+        if df.empty:
+            return None
+        return tuple(int(value) for value in df.iloc[0])
+
+    def load_from_db(self):
+        # taken before the loads, a change made while they run leaves an older fingerprint
+        # behind and the next refresh reloads instead of missing it
+        fingerprint = self._fingerprint()
+        # the table loads are independent, run them side by side
+        tasks = {table: (lambda query=query: self.fetch(query, cache=False)) for table, query in TABLE_QUERIES.items()}
+        loaded = fan_out(tasks, timeout=None, pool='bulk-load')
+        if not loaded.complete:
+            return False
+        frames = {table: loaded[table] for table in TABLE_QUERIES}
+        if any(df.empty for table, df in frames.items() if table in ('university', 'faculty', 'publication')):
+            return False
+        university = frames['university']
+        faculty = frames['faculty']
+        publication = frames['publication']
+        keyword = frames['keyword']
+        fp = frames['faculty_publication']
+        pk = frames['publication_keyword']
+
+        university_ids = _ids(university, 'id')
+        faculty_ids = _ids(faculty, 'id')
+        publication_ids = _ids(publication, 'id')
+        keyword_ids = _ids(keyword, 'id')
+        arrays = {
+            'university_ids': university_ids,
+            'university_names': university['name'].to_numpy(str),
+            'faculty_ids': faculty_ids,
+            'faculty_names': faculty['name'].to_numpy(str),
+            'faculty_university': _dense_ids(university_ids, _ids(faculty, 'university_id')),
+            'publication_ids': publication_ids,
+            'citations': publication['num_citations'].fillna(0).to_numpy(np.int64),
+            'keyword_ids': keyword_ids,
+            'keyword_names': keyword['name'].to_numpy(str) if not keyword.empty else np.array([], dtype=str),
+            'fp_faculty': _dense_ids(faculty_ids, _ids(fp, 'faculty_id')),
+            'fp_publication': _dense_ids(publication_ids, _ids(fp, 'publication_id')),
+            'pk_publication': _dense_ids(publication_ids, _ids(pk, 'publication_id')),
+            'pk_keyword': _dense_ids(keyword_ids, _ids(pk, 'keyword_id')),
+        }
+        self._install(arrays, fingerprint)
+        return True
+
+    def save_snapshot(self, path):
+        np.savez_compressed(path, fingerprint=np.array(self.fingerprint or (), dtype=np.int64), **self.arrays)
+
+    def load_snapshot(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files if name != 'fingerprint'}
+            fingerprint = tuple(int(v) for v in data['fingerprint']) or None
+        self._install(arrays, fingerprint)
+
+    def _install(self, arrays, fingerprint):
+        self._publish(self._derive(arrays), arrays, fingerprint)
+
+    def _derive(self, arrays):
+        n_university = len(arrays['university_ids'])
+        n_faculty = len(arrays['faculty_ids'])
+        n_publication = len(arrays['publication_ids'])
+        n_keyword = len(arrays['keyword_ids'])
+        fu = arrays['faculty_university']
+        with_university = np.flatnonzero(fu >= 0)
+
+        FP = _incidence(arrays['fp_faculty'], arrays['fp_publication'], (n_faculty, n_publication))
+        PK = _incidence(arrays['pk_publication'], arrays['pk_keyword'], (n_publication, n_keyword))
+        UF = _incidence(fu[with_university], with_university, (n_university, n_faculty))
+        # university x publication link counts, the citation rollup counts one row per faculty link
+        UP_links = (UF @ FP).tocsr()
+        UP = _binary(UP_links)
+
+        # the SQL groups by name, so aggregates are folded onto name groups
+        university_groups, university_group = np.unique(arrays['university_names'], return_inverse=True)
+        faculty_groups, faculty_group = np.unique(arrays['faculty_names'], return_inverse=True)
+        G_university = _incidence(university_group, np.arange(n_university), (len(university_groups), n_university))
+        G_faculty = _incidence(faculty_group, np.arange(n_faculty), (len(faculty_groups), n_faculty))
+        G_UP = _binary(G_university @ UP)
+        G_FP_links = (G_faculty @ FP).tocsr()
+        citations = arrays['citations'].astype(np.float64)
+
+        return {
+            'FP': FP,
+            'PK': PK,
+            'PK_csc': PK.tocsc(),
+            'G_UP': G_UP,
+            'G_FP': _binary(G_FP_links),
+            'G_FP_links': G_FP_links,
+            'G_faculty': G_faculty,
+            'faculty_to_university_group': np.where(fu >= 0, university_group[np.maximum(fu, 0)], -1),
+            'university_groups': university_groups,
+            'faculty_groups': faculty_groups,
+            'total_publications': np.asarray(G_UP.sum(axis=1)).ravel(),
+            'total_citations': np.asarray((G_university @ UP_links) @ citations).ravel(),
+            'citations': citations,
+        }
+
+    def _publish(self, state, arrays, fingerprint):
+        # the name lookups are the only part every process builds for itself
+        state = dict(state, arrays=arrays,
+                     university_lookup={name: i for i, name in enumerate(state['university_groups'].tolist())},
+                     faculty_lookup={name: i for i, name in enumerate(state['faculty_groups'].tolist())},
+                     keyword_lookup={name: i for i, name in enumerate(arrays['keyword_names'].tolist())})
+        with self._lock:
+            self.state = state
+            self.arrays = arrays
+            self.fingerprint = fingerprint
+
+    def export_state(self):
+        state = self.state
+        if state is None:
+            return {}, None
+        exported = dict(state['arrays'])
+        for name in DERIVED_MATRICES:
+            exported.update(sparse_arrays(f"derived.{name}", state[name]))
+        exported.update({f"derived.{name}": state[name] for name in DERIVED_VECTORS})
+        return exported, {'fingerprint': self.fingerprint}
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        raw = {name: array for name, array in arrays.items() if not name.startswith('derived.')}
+        # the derived matrices are used in place from the mapping, not rebuilt per worker
+        state = {name: sparse_from(arrays, f"derived.{name}", fmt) for name, fmt in DERIVED_MATRICES.items()}
+        state.update({name: arrays[f"derived.{name}"] for name in DERIVED_VECTORS})
+        self._publish(state, raw, tuple(document['fingerprint'] or ()) or None)
+
+    def refresh(self):
+        # concurrent refreshes share one fingerprint check and load
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if not self.ready and self.snapshot and os.path.exists(self.snapshot):
+            # the next refresh compares the snapshot's fingerprint with the tables
+            self.load_snapshot(self.snapshot)
+            return 'loaded'
+        if self.ready and self.fingerprint is not None and self._fingerprint() == self.fingerprint:
+            return 'unchanged'
+        if not self.load_from_db():
+            return 'failed'
+        if self.snapshot:
+            self.save_snapshot(self.snapshot)
+        return 'built'
+
+    def _state(self):
+        if not self.ready:
+            self.refresh()
+        return self.state
+
+    # aggregates
+
+    def _keyword_column(self, state, keyword):
+        k = state['keyword_lookup'].get(keyword)
+        if k is None:
+            return None
+        PK_csc = state['PK_csc']
+        column = np.zeros(PK_csc.shape[0])
+        column[PK_csc.indices[PK_csc.indptr[k]:PK_csc.indptr[k + 1]]] = 1
+        return column
+
+    def top(self, metric, start, end):
+        """
+        [(university_name, value)] for ranks start..end of total_publications or total_citations.
+        """
+        state = self._state()
+        if state is None:
+            return []
+        scores = state[metric]
+        # universities without any publication do not appear in the joined query
+        present = np.flatnonzero(state['total_publications'] > 0)
+        idx = present[top_k(scores[present], end - start + 1, start - 1, state['university_groups'][present])]
+        result = [(str(state['university_groups'][i]), int(scores[i])) for i in idx]
+        self._check(metric, result, (end - start + 1, start - 1))
+        return result
+
+    def university_research_areas(self, university, page=1, page_size=10):
+        state = self._state()
+        if state is None:
+            return []
+        u = state['university_lookup'].get(university)
+        if u is None:
+            return []
+        # distinct publications of the university times publication x keyword
+        counts = (state['G_UP'][u] @ state['PK']).toarray().ravel()
+        present = np.flatnonzero(counts > 0)
+        offset = (max(int(page or 1), 1) - 1) * page_size
+        names = state['arrays']['keyword_names']
+        idx = present[top_k(counts[present], page_size, offset, names[present])]
+        result = [(str(names[i]), int(counts[i])) for i in idx]
+        self._check('research_areas', result, (university, page_size, offset))
+        return result
+
+    def top_universities(self, keyword, page=1, page_size=10):
+        """
+        [(university, num_faculty, num_publications)] for a keyword.
+        """
+        state = self._state()
+        if state is None:
+            return []
+        column = self._keyword_column(state, keyword)
+        if column is None:
+            return []
+        num_publications = np.asarray(state['G_UP'] @ column).ravel()
+        faculty_hits = np.asarray(state['FP'] @ column).ravel() > 0
+        groups = state['faculty_to_university_group'][faculty_hits & (state['faculty_to_university_group'] >= 0)]
+        num_faculty = np.bincount(groups, minlength=len(state['university_groups']))
+        present = np.flatnonzero(num_publications > 0)
+        # num_faculty is at most the number of faculty, so it fits below the publication count
+        score = num_publications[present] * (len(state['arrays']['faculty_ids']) + 1) + num_faculty[present]
+        offset = (max(int(page or 1), 1) - 1) * page_size
+        idx = present[top_k(score, page_size, offset, state['university_groups'][present])]
+        result = [(str(state['university_groups'][i]), int(num_faculty[i]), int(num_publications[i])) for i in idx]
+        self._check('keyword_universities', [(name, p) for name, _, p in result], (keyword, page_size, offset))
+        return result
+
+    def top_faculty(self, keyword, page=1, page_size=10):
+        """
+        [(faculty, num_publications, num_citations)] for a keyword.
+        """
+        state = self._state()
+        if state is None:
+            return []
+        column = self._keyword_column(state, keyword)
+        if column is None:
+            return []
+        num_publications = np.asarray(state['G_FP'] @ column).ravel()
+        # the SQL sums citations over every faculty link, so duplicate names count each link
+        num_citations = np.asarray(state['G_FP_links'] @ (column * state['citations'])).ravel()
+        present = np.flatnonzero(num_publications > 0)
+        score = num_publications[present] * (num_citations.max(initial=0) + 1) + num_citations[present]
+        offset = (max(int(page or 1), 1) - 1) * page_size
+        idx = present[top_k(score, page_size, offset, state['faculty_groups'][present])]
+        result = [(str(state['faculty_groups'][i]), int(num_publications[i]), int(num_citations[i])) for i in idx]
+        self._check('keyword_faculty', [(name, p) for name, p, _ in result], (keyword, page_size, offset))
+        return result
+
+    def faculty_interests(self, faculty_name):
+        state = self._state()
+        if state is None:
+            return []
+        g = state['faculty_lookup'].get(faculty_name)
+        if g is None:
+            return []
+        publications = state['G_FP'][g].indices
+        keywords = np.unique(state['PK'][publications].indices)
+        return [str(name) for name in state['arrays']['keyword_names'][keywords]]
+
+    # parity
+
+    def _check(self, name, result, params):
+        """
+        Compare (name, value) pairs with the SQL answer. Names may legitimately differ on ties,
+        so only the ranked values are required to match.
+        """
+        if not self.parity:
+            return
+        df = self.fetch(PARITY_QUERIES[name], params=params)
+        expected = [int(v) for v in df['value']] if not df.empty else []
+        got = [value for _, value in result]
+        if expected != got:
+            self.parity_mismatches += 1
+            print(f"Parity mismatch for {name}{params}: engine={result} sql={list(zip(df.get('name', []), expected))}")
+
+
+def load_engine(snapshot=None, parity=False):
+    """
+    Start the engine from a snapshot file when one exists, otherwise load it from MySQL
+    and write the snapshot for the next start.
+    """
+    engine = AnalyticsEngine(parity=parity, snapshot=snapshot)
+    engine.refresh()
+    return engine
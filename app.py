@@ -1,12 +1,71 @@
+import json
+import os
+import time
+import startup_utils
 import dash
+import flask
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 import mysql_utils as sqlDB
 import neo4j_utils as neo4jDB
 import mongodb_utils as mongoClass
-
-# intialize the mongoDB connection... neo4j and SQL connections are initialized on query
-mongoDB = mongoClass.MongoDBClient()
+import rollup_utils
+import keyword_utils
+import search_utils
+import scheduler_utils
+import contact_utils
+import recommend_utils
+import graph_utils
+import trend_utils
+import snapshot_utils
+from fanout_utils import fan_out
+from cache_utils import query_cache
+from metrics_utils import metrics, current_widget
+from flight_utils import single_flight, request_tracker, limits, current_request, Superseded
+
+# set by serve.py: with a shared snapshot file one publisher process loads and refreshes everything
+# and writes the file (DASHBOARD_SHARED_ROLE=publish), the serving workers only map it (read)
+SHARED_SNAPSHOT = os.environ.get('DASHBOARD_SHARED_SNAPSHOT')
+SHARED_READER = SHARED_SNAPSHOT is not None and os.environ.get('DASHBOARD_SHARED_ROLE') == 'read'
+# DASHBOARD_PERF_TAB=1 adds a Performance tab with per widget latency histograms and the slow queries
+PERF_TAB = os.environ.get('DASHBOARD_PERF_TAB') == '1'
+
+# DASHBOARD_LOCAL_DATA=dir serves every read widget from the files written by python columnar_utils.py dir,
+# through an embedded engine over the memory mapped files, without any database server; updates are refused
+LOCAL_DATA = os.environ.get('DASHBOARD_LOCAL_DATA')
+
+localData = None
+if LOCAL_DATA:
+    import columnar_utils
+    localData = columnar_utils.LocalData(LOCAL_DATA)
+    localData.install()
+    mongoDB = localData.mongo
+else:
+    # intialize the mongoDB connection... neo4j and SQL connections are initialized on query
+    mongoDB = mongoClass.MongoDBClient()
+if os.environ.get('DASHBOARD_ENGINE') == 'numpy':
+    # answer every aggregate widget from the in memory NumPy engine, optionally checked against SQL
+    import analytics_utils
+    # loaded by the first precompute run in the background like the other stores (from
+    # DASHBOARD_SNAPSHOT when it exists), shared snapshot readers get the arrays from the publisher
+    analyticsEngine = analytics_utils.AnalyticsEngine(
+        parity=os.environ.get('DASHBOARD_PARITY') == '1',
+        snapshot=None if SHARED_READER else os.environ.get('DASHBOARD_SNAPSHOT')
+    )
+    universityRollups = keywordIndex = analyticsEngine
+else:
+    # precomputed university rankings for the top universities graphs, built on first use
+    universityRollups = rollup_utils.UniversityRollups()
+    # keyword centric inverted indexes for the research interest and research area widgets
+    keywordIndex = keyword_utils.KeywordIndex()
+# faculty similarity by keyword profile for the collaborator widget, DASHBOARD_COLLABORATOR_ANN=1/0
+# forces the approximate index on or off (by default it is used above ANN_THRESHOLD faculty)
+collaboratorAnn = os.environ.get('DASHBOARD_COLLABORATOR_ANN')
+collaboratorIndex = recommend_utils.CollaboratorIndex(ann=None if collaboratorAnn is None else collaboratorAnn == '1')
+# in memory co-authorship graph projected from Neo4j for the collaboration path and centrality widgets
+coauthorGraph = graph_utils.CoauthorGraph()
+# year x keyword x university counts for the research trends widgets, grown as publications are added
+trendCube = trend_utils.TrendCube()
 # commonly used query functions from various databases
 def get_universities():
     query = "SELECT DISTINCT name FROM university"
@@ -30,17 +89,19 @@ def get_faculty_names():
     result = neo4jDB.run_query(query)
     return [record['name'] for record in result]
 
-def get_publication_titles():
+# the listing helpers stream with a server side projection and stop after limit documents
+# generators, the documents are fetched batch by batch as the caller iterates
+def get_publication_titles(limit=None):
     query = {}
     projection = {"_id": 0, "title": 1}
-    result = mongoDB.find("academicworld", "publications", query, projection)
-    return [record["title"] for record in result]
+    for record in mongoDB.stream("academicworld", "publications", query, projection, limit=limit or 0):
+        yield record["title"]
 
-def get_faculty_names_mongo():
+def get_faculty_names_mongo(limit=None):
     query = {}
     projection = {"_id": 0, "name": 1}
-    result = mongoDB.find("academicworld", "faculty", query, projection)
-    return [record['name'] for record in result]
+    for record in mongoDB.stream("academicworld", "faculty", query, projection, limit=limit or 0):
+        yield record['name']
 
 def get_keywords():
     pipeline = [
@@ -51,142 +112,405 @@ def get_keywords():
     keywords = [record["_id"] for record in result]
     return keywords
 
-# Initialize the Dash app
-app = dash.Dash(__name__)
-
-# App layout
-app.layout = html.Div([
-    html.H1("Explore Research Impact", style={'textAlign': 'center'}),
-    dcc.Interval(
-        id='interval-component',
-        interval=60*60*1000,  # in milliseconds, update every hour
-        n_intervals=0
-    ),
-    html.Div([
+# bulk contact updates optionally follow up with the same changes in the MongoDB faculty collection
+mongoWriteBehind = contact_utils.MongoWriteBehind(mongoDB)
+
+# Initialize the Dash app... every browser tab tags its callback requests with its own client id
+app = dash.Dash(__name__, hooks={
+    'request_pre': """function(payload) {
+        window.dashboardClientId = window.dashboardClientId || Math.random().toString(36).slice(2);
+        payload.client = window.dashboardClientId;
+    }"""
+})
+
+# every callback request is timed, and the queries it runs are attributed to its output widget
+@app.server.before_request
+def start_callback_timer():
+    if flask.request.path.endswith('/_dash-update-component'):
+        body = flask.request.get_json(silent=True) or {}
+        outputs = body.get('outputs') or []
+        outputs = outputs if isinstance(outputs, list) else [outputs]
+        flask.g.widget = ','.join(str(o.get('id')) for o in outputs)
+        flask.g.widget_token = current_widget.set(flask.g.widget)
+        if body.get('client'):
+            # a newer request from the same tab for the same widget makes this one stale
+            flask.g.flight = request_tracker.begin(body['client'], flask.g.widget)
+            flask.g.flight_token = current_request.set(flask.g.flight)
+        flask.g.callback_start = time.perf_counter()
+
+@app.server.after_request
+def stop_callback_timer(response):
+    if 'callback_start' in flask.g:
+        metrics.record_callback(flask.g.widget, time.perf_counter() - flask.g.callback_start)
+    return response
+
+@app.server.teardown_request
+def end_callback(exc):
+    if 'flight' in flask.g:
+        request_tracker.end(flask.g.flight)
+        current_request.reset(flask.g.flight_token)
+    if 'widget_token' in flask.g:
+        current_widget.reset(flask.g.widget_token)
+
+# a superseded callback is dropped, 204 tells the browser there is nothing to update
+@app.server.errorhandler(Superseded)
+def drop_superseded(e):
+    return flask.Response(status=204)
+
+def metrics_extra():
+    return {
+        'mysql_pool': sqlDB.pool_stats(),
+        'neo4j_pool': neo4jDB.pool_stats(),
+        'cache': query_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'requests': request_tracker.stats(),
+        'limits': limits.stats(),
+        'precompute': precompute.stats(),
+        'mongo_write_behind': mongoWriteBehind.stats(),
+        'shared_snapshot': sharedSnapshot.stats() if sharedSnapshot is not None else {},
+        'local_data': localData.stats() if localData is not None else {}
+    }
+
+# current snapshot for other consumers, with an ETag so an unchanged snapshot is a 304
+@app.server.route('/snapshot')
+def snapshot_endpoint():
+    snapshot = precompute.current
+    if snapshot is None:
+        return flask.Response(status=503)
+    etag = str(snapshot.version)
+    if flask.request.if_none_match.contains(etag):
+        return flask.Response(status=304)
+    response = flask.Response(snapshot.to_json(), mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+# Prometheus scrape endpoint, ?format=json returns the full snapshot including the slow queries
+@app.server.route('/metrics')
+def metrics_endpoint():
+    if flask.request.args.get('format') == 'json':
+        return flask.Response(json.dumps(dict(metrics.snapshot(), **metrics_extra()), default=str),
+                              mimetype='application/json')
+    return flask.Response(metrics.prometheus(metrics_extra()), mimetype='text/plain; version=0.0.4')
+
+# option lists for the dropdowns, fetched concurrently in the background so the server can bind right away
+optionLists = startup_utils.OptionLists({
+    'universities': get_universities,
+    'research_interests': get_research_interests,
+    'faculty_names': get_faculty_names,
+    'keywords': get_keywords
+}, snapshot=os.environ.get('DASHBOARD_OPTIONS_SNAPSHOT'))
+
+def top_universities_rankings():
+    rankings = {}
+    for metric in ('total_publications', 'total_citations'):
+        top = universityRollups.top(metric, 1, 20)
+        rankings[metric] = {'names': [name for name, _ in top], 'values': [int(value) for _, value in top]}
+    return rankings
+
+# the server refreshes the rollups and indexes and publishes the rankings as versioned snapshots,
+# so the database load does not grow with the number of open tabs
+precompute = scheduler_utils.PrecomputeScheduler(
+    {'top_universities': top_universities_rankings},
+    # failed option lists are retried (with backoff) on the same schedule
+    refreshers=[optionLists.retry] + list({id(store): store.refresh for store in (universityRollups, keywordIndex, collaboratorIndex, coauthorGraph, trendCube)}.values())
+               + [lambda: keyword_utils.refresh_mongo_top_publications(mongoDB)],
+    interval=int(os.environ.get('DASHBOARD_REFRESH_INTERVAL', 300))
+)
+sharedSnapshot = None
+if SHARED_SNAPSHOT:
+    sharedSnapshot = snapshot_utils.SharedSnapshot(SHARED_SNAPSHOT, {
+        'options': optionLists,
+        'precompute': precompute,
+        'keywords': keywordIndex,
+        'collaborators': collaboratorIndex,
+        'graph': coauthorGraph,
+        'trends': trendCube
+    })
+if SHARED_READER:
+    # nothing is loaded here, the stores take their state from the newest published snapshot
+    precompute.follow(sharedSnapshot.sync)
+    sharedSnapshot.attach()
+else:
+    # the first precompute (rollup and index builds) happens in the same pool instead of on the first click
+    optionLists.start(
+        warmers=[precompute.run_once],
+        # the publisher writes its first snapshot once everything is loaded
+        background=os.environ.get('DASHBOARD_STARTUP') != 'blocking' and sharedSnapshot is None
+    )
+    if sharedSnapshot is not None:
+        sharedSnapshot.publish()
+        precompute.listeners.append(sharedSnapshot.publish)
+    precompute.start()
+
+# server side typeahead indexes behind the dropdowns, built from the option lists once they are warm
+searchIndexes = {}
+
+def search_index(name):
+    if name not in searchIndexes and optionLists.warm:
+        searchIndexes[name] = search_utils.SearchIndex(
+            optionLists.get(name), loader=optionLists.loaders[name], max_age=60*60
+        )
+    return searchIndexes.get(name)
+
+def options_for(values):
+    return [{'label': value, 'value': value} for value in values]
+
+# App layout, built per page load so it picks up the option lists once they are warm
+def serve_layout():
+    universities = optionLists.get('universities')
+    dashboard = html.Div([
+        html.H1("Explore Research Impact", style={'textAlign': 'center'}),
+        html.Div("" if optionLists.warm else f"Loading data ({optionLists.status})...", id='warmup-status', style={'textAlign': 'center'}),
+        dcc.Interval(id='warmup-interval', interval=1000, disabled=optionLists.warm),
+        dcc.Interval(
+            id='interval-component',
+            interval=int(os.environ.get('DASHBOARD_POLL_INTERVAL', 30))*1000,  # in milliseconds, a version check only
+            n_intervals=0
+        ),
+        # the top 20 rankings of the current snapshot, sliced in the browser by the range slider,
+        # and their version, the only part the poll sends back
+        dcc.Store(id='top-universities-store'),
+        dcc.Store(id='top-universities-version'),
         html.Div([
-            html.Label('Select Range for Top Universities:', style={'fontWeight': 'bold'}),
-            dcc.RangeSlider(
-                id='range-slider',
-                min=1,
-                max=20,
-                step=1,
-                marks={1: '1', 5: '5', 10: '10', 15: '15', 20: '20'},
-                value=[1, 10]
-            )], style={'width': '60%', 'display': 'inline-block'}),
-        html.Div([            
-            html.Label('Select University:', style={'fontWeight': 'bold'}),
-            dcc.Dropdown(
-                id='university-dropdown',
-                options=[{'label': name, 'value': name} for name in get_universities()],
-                value=get_universities()[0],
-                style={'width': '100%'}
-            )], style={'width': '30%', 'display': 'inline-block'})
-    ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}), 
-    html.Div([
+            html.Div([
+                html.Label('Select Range for Top Universities:', style={'fontWeight': 'bold'}),
+                dcc.RangeSlider(
+                    id='range-slider',
+                    min=1,
+                    max=20,
+                    step=1,
+                    marks={1: '1', 5: '5', 10: '10', 15: '15', 20: '20'},
+                    value=[1, 10]
+                )], style={'width': '60%', 'display': 'inline-block'}),
+            html.Div([            
+                html.Label('Select University:', style={'fontWeight': 'bold'}),
+                dcc.Dropdown(
+                    id='university-dropdown',
+                    options=options_for(universities[:1]),
+                    value=universities[0] if universities else None,
+                    style={'width': '100%'}
+                )], style={'width': '30%', 'display': 'inline-block'})
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}), 
         html.Div([
-            dcc.Graph(id='top-universities-publications-graph', style={'width': '100%'})],
-            style={'width': '30%', 'display': 'inline-block'}),
-        html.Div([    
-            dcc.Graph(id='top-universities-citations-graph', style={'width': '100%'})], 
-            style={'width': '30%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='top-universities-publications-graph', style={'width': '100%'})],
+                style={'width': '30%', 'display': 'inline-block'}),
+            html.Div([    
+                dcc.Graph(id='top-universities-citations-graph', style={'width': '100%'})], 
+                style={'width': '30%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='top-research-areas-pie', style={'marginTop': 20, 'height': 400})
+            ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top'})
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
         html.Div([
-            dcc.Graph(id='top-research-areas-pie', style={'marginTop': 20, 'height': 400})
-        ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top'})
-    ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
-    html.Div([
         
-        html.Div([
-            html.H2("Explore What's Your Research Interest?", style={'textAlign': 'center'}),
-            dcc.Dropdown(
-                id='research-interest-input',
-                options=[{'label': name, 'value': name} for name in get_research_interests()],
-                placeholder='Enter or select research interest...',
-                #style={'width': '80%', 'marginRight': 10},
-                searchable=True
-            ),
-            html.Button('Search', id='research-interest-button', n_clicks=0)
-        ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                html.H2("Explore What's Your Research Interest?", style={'textAlign': 'center'}),
+                dcc.Dropdown(
+                    id='research-interest-input',
+                    options=[],
+                    placeholder='Type to search research interests...',
+                    #style={'width': '80%', 'marginRight': 10},
+                    searchable=True
+                ),
+                html.Button('Search', id='research-interest-button', n_clicks=0),
+                html.Label(' Page: '),
+                dcc.Input(id='research-interest-page', type='number', min=1, step=1, value=1, style={'width': '60px'})
+            ], style={'width': '50%', 'display': 'inline-block'}),
 
         
+            html.Div([
+                html.H2("Search Faculty Contact Information", style={'textAlign': 'center'}),
+                dcc.Dropdown(
+                    id='faculty-name-input',
+                    options=[],
+                    placeholder='Type to search faculty names...',
+                    #style={'width': '80%', 'marginRight': 10},
+                    searchable=True
+                ),
+                html.Button('Search', id='faculty-search-button', n_clicks=0)
+            ], style={'width': '30%', 'display': 'inline-block'}),
+
+
+
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
         html.Div([
-            html.H2("Search Faculty Contact Information", style={'textAlign': 'center'}),
+            html.Div([
+                html.Div([
+                    html.H3("Top Universities"),
+                    html.Table(id='top-universities-table')
+                ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top', 'paddingRight':'50px'}),
+                html.Div([
+                    html.H3("Top Faculty Members"),
+                    html.Table(id='top-faculty-table')
+                ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top'})
+            ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div(id='faculty-contact-info', style={'width': '30%', 'display': 'inline-block'})
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
+        html.Div([
+            html.H2("Find Potential Collaborators", style={'textAlign': 'center'}),
             dcc.Dropdown(
-                id='faculty-name-input',
-                options=[{'label': name, 'value': name} for name in get_faculty_names()],
-                placeholder='Select or search for faculty name...',
-                #style={'width': '80%', 'marginRight': 10},
+                id='collaborator-dropdown',
+                options=[],
+                placeholder='Type to search faculty names...',
                 searchable=True
             ),
-            html.Button('Search', id='faculty-search-button', n_clicks=0)
-        ], style={'width': '30%', 'display': 'inline-block'}),
-
-
-
-    ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
-    html.Div([
+            html.Table(id='collaborator-table')
+        ], style={'width': '50%', 'marginBottom': 20}),
         html.Div([
             html.Div([
-                html.H3("Top Universities"),
-                html.Table(id='top-universities-table')
-            ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top', 'paddingRight':'50px'}),
+                html.H2("Collaboration Path", style={'textAlign': 'center'}),
+                dcc.Dropdown(id='path-source-dropdown', options=[], placeholder='From faculty member...', searchable=True),
+                dcc.Dropdown(id='path-target-dropdown', options=[], placeholder='To faculty member (optional)...', searchable=True),
+                html.Div(id='collaboration-path'),
+                html.Table(id='coauthor-table')
+            ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top'}),
             html.Div([
-                html.H3("Top Faculty Members"),
-                html.Table(id='top-faculty-table')
+                html.H2("Most Central Faculty by Keyword", style={'textAlign': 'center'}),
+                dcc.Dropdown(id='centrality-keyword-dropdown', options=[], placeholder='Type to search keywords...', searchable=True),
+                html.Table(id='centrality-table')
             ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top'})
-        ], style={'width': '50%', 'display': 'inline-block'}),
-        html.Div(id='faculty-contact-info', style={'width': '30%', 'display': 'inline-block'})
-    ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
-
-    # mongo db widgets
-    html.Div([
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
+        html.Div([
             html.Div([
-                html.H1("Top Publications by Keyword", style={'textAlign': 'center'}),
-                dcc.Dropdown(
-                    id='keyword-dropdown',
-                    options=[{'label': keyword, 'value': keyword} for keyword in get_keywords()],
-                    placeholder='Select a keyword...',
-                    style={'width': '80%', 'marginRight': 10},
-                    searchable=True
-                ),
-                html.Button('Search', id='keyword-search-button', n_clicks=0),
-                html.Div(id='top-publications-by-keyword', style={'textAlign': 'center'})],
-            style={'width' : '30%', 'display' : 'inline-block'}),
-
+                html.H2("Research Trends", style={'textAlign': 'center'}),
+                dcc.Dropdown(id='trend-keyword-dropdown', options=[], placeholder='Type to search keywords...', searchable=True),
+                dcc.Dropdown(id='trend-university-dropdown', options=[], placeholder='All universities (or type to pick one)...', searchable=True),
+                html.Label(' From year: '),
+                dcc.Input(id='trend-start-year', type='number', step=1, style={'width': '80px'}),
+                html.Label(' To year: '),
+                dcc.Input(id='trend-end-year', type='number', step=1, style={'width': '80px'}),
+                dcc.Graph(id='trend-graph')
+            ], style={'width': '60%', 'display': 'inline-block', 'verticalAlign': 'top'}),
             html.Div([
-                html.H2("Update Faculty Contact Information", style={'textAlign': 'center'}),
+                html.H3("Fastest Growing Topics"),
+                html.Table(id='growth-table')
+            ], style={'width': '35%', 'display': 'inline-block', 'verticalAlign': 'top'})
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
+
+        # mongo db widgets
+        html.Div([
                 html.Div([
+                    html.H1("Top Publications by Keyword", style={'textAlign': 'center'}),
                     dcc.Dropdown(
-                        id='faculty-dropdown',
-                        options=[{'label': name, 'value': name} for name in get_faculty_names()],
-                        placeholder='Select a faculty member...',
-                        style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'},
+                        id='keyword-dropdown',
+                        options=[],
+                        placeholder='Type to search keywords...',
+                        style={'width': '80%', 'marginRight': 10},
                         searchable=True
                     ),
-                    html.Button('Select', id='faculty-select-button', n_clicks=0)
-                ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
-                #html.Div(id='faculty-contact-info', style={'textAlign': 'center'}),
-                
-            ], style={'width' : '30%', 'display' : 'inline-block'}),
-            html.Div([
-                html.H2("Update Faculty Email", style={'textAlign': 'center'}),
+                    html.Button('Search', id='keyword-search-button', n_clicks=0),
+                    html.Label(' Page: '),
+                    dcc.Input(id='keyword-page', type='number', min=1, step=1, value=1, style={'width': '60px'}),
+                    html.Div(id='top-publications-by-keyword', style={'textAlign': 'center'})],
+                style={'width' : '30%', 'display' : 'inline-block'}),
+
                 html.Div([
-                    html.Label('New Email:', style={'fontWeight': 'bold'}),
-                    dcc.Input(id='email-input', type='email', style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'}),
-                    html.Button('Update Email', id='email-update-button', n_clicks=0)
-                ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
-                html.Div(id='email-update-status', style={'textAlign': 'center'}),
-                html.H2("Update Faculty Phone", style={'textAlign': 'center'}),
+                    html.H2("Update Faculty Contact Information", style={'textAlign': 'center'}),
+                    html.Div([
+                        dcc.Dropdown(
+                            id='faculty-dropdown',
+                            options=[],
+                            placeholder='Type to search faculty members...',
+                            style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'},
+                            searchable=True
+                        ),
+                        html.Button('Select', id='faculty-select-button', n_clicks=0)
+                    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
+                    #html.Div(id='faculty-contact-info', style={'textAlign': 'center'}),
+                
+                ], style={'width' : '30%', 'display' : 'inline-block'}),
                 html.Div([
-                    html.Label('New Phone:', style={'fontWeight': 'bold'}),
-                    dcc.Input(id='phone-input', type='text', style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'}),
-                    html.Button('Update Phone', id='phone-update-button', n_clicks=0)
-                ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
-                html.Div(id='phone-update-status', style={'textAlign': 'center'})
-            ], style={'width' : '30%', 'display' : 'inline-block'})
-
-    ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20})
+                    html.H2("Update Faculty Email", style={'textAlign': 'center'}),
+                    html.Div([
+                        html.Label('New Email:', style={'fontWeight': 'bold'}),
+                        dcc.Input(id='email-input', type='email', style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'}),
+                        html.Button('Update Email', id='email-update-button', n_clicks=0)
+                    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
+                    html.Div(id='email-update-status', style={'textAlign': 'center'}),
+                    html.H2("Update Faculty Phone", style={'textAlign': 'center'}),
+                    html.Div([
+                        html.Label('New Phone:', style={'fontWeight': 'bold'}),
+                        dcc.Input(id='phone-input', type='text', style={'width': '80%', 'marginRight': '10px', 'paddingRight': '20px'}),
+                        html.Button('Update Phone', id='phone-update-button', n_clicks=0)
+                    ], style={'display': 'flex', 'justifyContent': 'center', 'marginBottom': 20}),
+                    html.Div(id='phone-update-status', style={'textAlign': 'center'})
+                ], style={'width' : '30%', 'display' : 'inline-block'})
+
+        ], style={'display': 'flex', 'justify-content': 'space-between', 'marginBottom': 20}),
+        html.Div([
+            html.H2("Bulk Update Faculty Contacts", style={'textAlign': 'center'}),
+            dcc.Upload(
+                id='contact-upload',
+                children=html.Div(["Drop or select a CSV or JSON file with name, email and phone columns"]),
+                style={'borderWidth': '1px', 'borderStyle': 'dashed', 'padding': '20px', 'textAlign': 'center'}
+            ),
+            dcc.Checklist(id='contact-upload-options', options=[{'label': ' Also update MongoDB', 'value': 'mongo'}], value=[]),
+            html.Div(id='contact-upload-status', style={'textAlign': 'center'})
+        ], style={'marginBottom': 20})
+
+    ])
+    if not PERF_TAB:
+        return dashboard
+    return dcc.Tabs([
+        dcc.Tab(dashboard, label='Dashboard'),
+        dcc.Tab(html.Div([
+            dcc.Interval(id='perf-interval', interval=5000),
+            dcc.Graph(id='perf-widget-latency'),
+            html.H3("Query Latency by Database"),
+            html.Table(id='perf-backend-table'),
+            html.H3("Slow Queries"),
+            html.Table(id='perf-slow-queries')
+        ]), label='Performance')
+    ])
+
+app.layout = serve_layout
+
+# while warming the page polls until the option lists are in and then selects the first university
+@app.callback(
+    Output('university-dropdown', 'value'),
+    Output('warmup-status', 'children'),
+    Output('warmup-interval', 'disabled'),
+    Input('warmup-interval', 'n_intervals'),
+    State('university-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def finish_warmup(n, selected_university):
+    if not optionLists.warm:
+        return dash.no_update, f"Loading data ({optionLists.status})...", False
+    universities = optionLists.get('universities')
+    return selected_university or (universities[0] if universities else None), "", True
+
+# dropdowns only receive the ranked matches for what the user has typed, not the full lists
+def register_typeahead(dropdown_id, name, limit=20):
+    @app.callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        Input(dropdown_id, 'value')
+    )
+    def update_options(search_value, value):
+        index = search_index(name)
+        matches = index.search(search_value, limit) if index is not None and search_value else []
+        if value and value not in matches:
+            # keep the current selection displayable
+            matches = [value] + matches
+        return options_for(matches)
+
+for dropdown_id, name in [
+    ('university-dropdown', 'universities'),
+    ('research-interest-input', 'research_interests'),
+    ('faculty-name-input', 'faculty_names'),
+    ('keyword-dropdown', 'keywords'),
+    ('faculty-dropdown', 'faculty_names'),
+    ('collaborator-dropdown', 'faculty_names'),
+    ('path-source-dropdown', 'faculty_names'),
+    ('path-target-dropdown', 'faculty_names'),
+    ('centrality-keyword-dropdown', 'keywords'),
+    ('trend-keyword-dropdown', 'keywords'),
+    ('trend-university-dropdown', 'universities')
+]:
+    register_typeahead(dropdown_id, name)
 
-])
 # Neo4j widgets 
 # Callback to update faculty email
 @app.callback(
@@ -231,23 +555,50 @@ def update_faculty_phone(n_clicks, faculty_name, new_phone):
         else:
             return html.P("Failed to update phone.")
     return html.Div()
+# Callback to apply an uploaded file of contact updates
+@app.callback(
+    Output('contact-upload-status', 'children'),
+    Input('contact-upload', 'contents'),
+    State('contact-upload', 'filename'),
+    State('contact-upload-options', 'value')
+)
+def bulk_update_contacts(contents, filename, options):
+    if not contents:
+        return html.Div()
+    try:
+        rows = contact_utils.parse_rows(contact_utils.decode_upload(contents), contact_utils.format_for(filename))
+    except (ValueError, UnicodeDecodeError) as e:
+        return html.P(f"Could not read {filename}: {e}")
+    report, summary = contact_utils.apply_updates(rows, write_behind=mongoWriteBehind if 'mongo' in (options or []) else None)
+    problems = [entry for entry in report if entry['status'] != 'updated']
+    return html.Div([
+        html.P(f"{filename}: " + ', '.join(f"{count} {status.replace('_', ' ')}" for status, count in summary.items())),
+        html.Table([
+            html.Tr([html.Th("Row"), html.Th("Name"), html.Th("Status"), html.Th("Error")])
+        ] + [
+            html.Tr([html.Td(entry['row']), html.Td(entry['name']), html.Td(entry['status']), html.Td(entry['error'] or '')])
+            for entry in problems[:50]
+        ]) if problems else html.Div()
+    ])
+
+# paged lists that stop after limit entries say so on their last page
+def top_k_note(page, page_size, limit, what):
+    if limit is not None and max(int(page or 1), 1) * page_size >= limit:
+        return f"Only the top {limit} {what} are listed, there are no further pages."
+    return None
+
 # MongoDB Widgets
 @app.callback(
     Output('top-publications-by-keyword', 'children'),
     Input('keyword-search-button', 'n_clicks'),
+    Input('keyword-page', 'value'),
     State('keyword-dropdown', 'value')
 )
-def display_top_publications_by_keyword(n_clicks, keyword):
+def display_top_publications_by_keyword(n_clicks, page, keyword):
     if n_clicks > 0 and keyword:
-        pipeline = [
-            {"$match": {"keywords.name": keyword}},
-            {"$unwind": "$keywords"},
-            {"$match": {"keywords.name": keyword}},
-            {"$sort": {"numCitations": -1}},
-            {"$limit": 5},
-            {"$project": {"title": 1, "numCitations": 1}}
-        ]
-        results = mongoDB.aggregate("academicworld", "publications", pipeline)
+        # single lookup in the materialized per keyword collection
+        results = keyword_utils.mongo_top_publications(mongoDB, keyword, page=page, page_size=5)
+        note = top_k_note(page, 5, keyword_utils.TOP_K, 'publications per keyword')
         if results:
             return html.Div([
                 html.Table([
@@ -256,111 +607,77 @@ def display_top_publications_by_keyword(n_clicks, keyword):
                     html.Tr([html.Td(pub['title']), html.Td(pub['numCitations'])])
                     for pub in results
                 ])
-            ])
+            ] + ([html.P(note)] if note else []))
         else:
-            return html.P("No publications found for the selected keyword.")
+            return html.P(note or "No publications found for the selected keyword.")
     return html.Div()
 
 
 @app.callback(
-    Output('top-universities-publications-graph', 'figure'),
-    Output('top-universities-citations-graph', 'figure'),
+    Output('top-universities-store', 'data'),
+    Output('top-universities-version', 'data'),
     Input('interval-component', 'n_intervals'),
-    Input('range-slider', 'value')
+    State('top-universities-version', 'data')
 )
-def update_top_universities(n, range_values):
-    start, end = range_values
-
-    # Query for top universities by publications
-    query_publications = """
-    SELECT * FROM TopUniversitiesByPublications
-    LIMIT %s OFFSET %s
-    """
-    df_publications = sqlDB.fetch_data(query_publications, params=(end - start + 1, start - 1))
-
-    # Query for top universities by citations
-    query_citations = """
-    SELECT university.name, SUM(publication.num_citations) as total_citations 
-    FROM university 
-    JOIN faculty ON university.id = faculty.university_id 
-    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id 
-    JOIN publication ON publication.id =  fp.publication_Id
-    GROUP BY university.name 
-    ORDER BY total_citations DESC
-    LIMIT %s OFFSET %s
+def update_top_universities(n, version):
+    # polling only compares versions, the rankings are sent when a new snapshot was published;
+    # until the scheduler has published the first one there is nothing to send
+    snapshot = precompute.current
+    if snapshot is None or version == snapshot.version:
+        raise dash.exceptions.PreventUpdate
+    return snapshot.get('top_universities'), snapshot.version
+
+app.clientside_callback(
     """
-    df_citations = sqlDB.fetch_data(query_citations, params=(end - start + 1, start - 1))
-
-    fig_publications = {
-        'data': [
-            {
-                'x': df_publications['total_publications'], 
-                'y': df_publications['university_name'], 
-                'type': 'bar', 
-                'orientation': 'h',
-                'name': 'Total Publications',
-                'marker': {'color': '#1f77b4'},
-                'hoverinfo': 'x+y'
-            }
-        ],
-        'layout': {
-            'title': 'Top Universities by Publications',
-            'xaxis': {'title': 'Total Publications'},
-            'yaxis': {'title': 'University', 'automargin': True, 'tickfont': {'size': 10}},
-            'hovermode': 'closest',
-            'margin': {'l': 150, 'r': 10, 't': 50, 'b': 50},
-            'height': 400
+    function(rankings, range) {
+        if (!rankings) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
         }
-    }
-
-    fig_citations = {
-        'data': [
-            {
-                'x': df_citations['total_citations'], 
-                'y': df_citations['name'], 
-                'type': 'bar', 
-                'orientation': 'h',
-                'name': 'Total Citations',
-                'marker': {'color': '#ff7f0e'},
-                'hoverinfo': 'x+y'
-            }
-        ],
-        'layout': {
-            'title': 'Top Universities by Citations',
-            'xaxis': {'title': 'Total Citations'},
-            'yaxis': {'title': 'University', 'automargin': True, 'tickfont': {'size': 10}},
-            'hovermode': 'closest',
-            'margin': {'l': 150, 'r': 10, 't': 50, 'b': 50},
-            'height': 400
+        function figure(metric, title, axis, color) {
+            var ranking = rankings[metric];
+            return {
+                'data': [{
+                    'x': ranking.values.slice(range[0] - 1, range[1]),
+                    'y': ranking.names.slice(range[0] - 1, range[1]),
+                    'type': 'bar',
+                    'orientation': 'h',
+                    'name': axis,
+                    'marker': {'color': color},
+                    'hoverinfo': 'x+y'
+                }],
+                'layout': {
+                    'title': title,
+                    'xaxis': {'title': axis},
+                    'yaxis': {'title': 'University', 'automargin': true, 'tickfont': {'size': 10}},
+                    'hovermode': 'closest',
+                    'margin': {'l': 150, 'r': 10, 't': 50, 'b': 50},
+                    'height': 400
+                }
+            };
         }
+        return [
+            figure('total_publications', 'Top Universities by Publications', 'Total Publications', '#1f77b4'),
+            figure('total_citations', 'Top Universities by Citations', 'Total Citations', '#ff7f0e')
+        ];
     }
-
-    return fig_publications, fig_citations
+    """,
+    Output('top-universities-publications-graph', 'figure'),
+    Output('top-universities-citations-graph', 'figure'),
+    Input('top-universities-store', 'data'),
+    Input('range-slider', 'value')
+)
 
 @app.callback(
     Output('top-research-areas-pie', 'figure'),
     Input('university-dropdown', 'value')
 )
 def update_top_research_areas(selected_university):
-    query = """
-    SELECT k.name as research_area, COUNT(DISTINCT fp.publication_Id) as publication_count
-    FROM university 
-    JOIN faculty ON university.id = faculty.university_id 
-    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id 
-    JOIN publication ON publication.id =  fp.publication_Id
-    JOIN Publication_Keyword pk ON publication.id = pk.publication_id
-    JOIN keyword k ON k.id = pk.keyword_id
-    WHERE university.name = %s
-    GROUP BY k.name
-    ORDER BY publication_count DESC
-    LIMIT 10
-    """
-    df = sqlDB.fetch_data(query, params=(selected_university,))
+    research_areas = keywordIndex.university_research_areas(selected_university, page_size=10)
     fig = {
         'data': [
             {
-                'labels': df['research_area'],
-                'values': df['publication_count'],
+                'labels': [area for area, _ in research_areas],
+                'values': [count for _, count in research_areas],
                 'type': 'pie',
                 'hoverinfo': 'label+percent+value',
                 'textinfo': 'percent',
@@ -385,72 +702,41 @@ def update_top_research_areas(selected_university):
     Output('top-universities-table', 'children'),
     Output('top-faculty-table', 'children'),
     Input('research-interest-button', 'n_clicks'),
+    Input('research-interest-page', 'value'),
     State('research-interest-input', 'value')
 )
-def update_research_interest(n_clicks, research_interest):
+def update_research_interest(n_clicks, page, research_interest):
     if n_clicks > 0 and research_interest:
-        # Query for top universities for the research interest
-        query_universities = """
-        SELECT university.name, COUNT(DISTINCT faculty.id) as num_faculty, COUNT(DISTINCT publication.id) as num_publications
-        FROM university
-        JOIN faculty ON university.id = faculty.university_id
-        JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
-        JOIN publication ON publication.id = fp.publication_Id
-        JOIN Publication_Keyword pk ON publication.id = pk.publication_id
-        JOIN keyword k ON k.id = pk.keyword_id
-        WHERE k.name = %s
-        GROUP BY university.name
-        ORDER BY num_publications DESC, num_faculty DESC
-        LIMIT 10
-        """
-        df_universities = sqlDB.fetch_data(query_universities, params=(research_interest,))
+        # both are dictionary lookups in the in memory keyword index
+        universities = keywordIndex.top_universities(research_interest, page=page)
+        faculty = keywordIndex.top_faculty(research_interest, page=page)
 
-        # Create the top universities table
+        # Top universities for the research interest
         university_table = [
             html.Tr([html.Th("University"), html.Th("Number of Faculty"), html.Th("Number of Publications")])
         ] + [
-            html.Tr([html.Td(row['name']), html.Td(row['num_faculty']), html.Td(row['num_publications'])])
-            for _, row in df_universities.iterrows()
+            html.Tr([html.Td(name), html.Td(num_faculty), html.Td(num_publications)])
+            for name, num_faculty, num_publications in universities
         ]
 
-        # Query for top faculty members for the research interest
-        query_faculty = """
-        SELECT faculty.name, COUNT(DISTINCT publication.id) as num_publications, SUM(publication.num_citations) as num_citations
-        FROM faculty
-        JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
-        JOIN publication ON publication.id = fp.publication_Id
-        JOIN Publication_Keyword pk ON publication.id = pk.publication_id
-        JOIN keyword k ON k.id = pk.keyword_id
-        WHERE k.name = %s
-        GROUP BY faculty.name
-        ORDER BY num_publications DESC, num_citations DESC
-        LIMIT 10
-        """
-        df_faculty = sqlDB.fetch_data(query_faculty, params=(research_interest,))
-
-        # Create the top faculty table
+        # Top faculty members for the research interest
         faculty_table = [
             html.Tr([html.Th("Faculty Member"), html.Th("Number of Publications"), html.Th("Number of Citations")])
         ] + [
-            html.Tr([html.Td(row['name']), html.Td(row['num_publications']), html.Td(row['num_citations'])])
-            for _, row in df_faculty.iterrows()
+            html.Tr([html.Td(name), html.Td(num_publications), html.Td(num_citations)])
+            for name, num_publications, num_citations in faculty
         ]
+        # the keyword index keeps the top TOP_K of each list, the numpy engine ranks all of them
+        note = top_k_note(page, 10, getattr(keywordIndex, 'top_k', None), 'universities and faculty members')
+        if note:
+            university_table.append(html.Tr([html.Td(note)]))
+            faculty_table.append(html.Tr([html.Td(note)]))
 
         return university_table, faculty_table
     return [], []
 
 def fetch_faculty_interests(faculty_name):
-    query = """
-    SELECT DISTINCT k.name as interest
-    FROM faculty
-    JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
-    JOIN publication ON publication.id = fp.publication_Id
-    JOIN Publication_Keyword pk ON publication.id = pk.publication_id
-    JOIN keyword k ON k.id = pk.keyword_id
-    WHERE faculty.name = %s
-    """
-    df_interests = sqlDB.fetch_data(query, params=(faculty_name,))
-    return df_interests['interest'].tolist()
+    return keywordIndex.faculty_interests(faculty_name)
 
 @app.callback(
     Output('faculty-contact-info', 'children'),
@@ -459,24 +745,169 @@ def fetch_faculty_interests(faculty_name):
 )
 def fetch_faculty_contact_info(n_clicks, faculty_name):
     if n_clicks > 0 and faculty_name:
-        query = """
-        MATCH (f:Faculty {name: $name})-[:AFFILIATION_WITH]->(i:Institute)
-        RETURN f.name AS name, f.email AS email, f.phone AS phone, i.name AS institute
-        """
-        result = neo4jDB.run_query(query, {'name': faculty_name})
+        # contact info from Neo4j and research interests from MySQL are fetched concurrently
+        lookups = fan_out({
+            'contact': lambda: neo4jDB.run_query(contact_utils.CONTACT_QUERY, {'name': faculty_name}),
+            'interests': lambda: fetch_faculty_interests(faculty_name)
+        }, defaults={'interests': []})
+        result = lookups['contact']
 
         if result:
             info = result[0]
+            interests = lookups['interests']
             return html.Div([
                 html.P(f"Name: {info['name']}"),
                 html.P(f"Email: {info.get('email', 'N/A')}"),
                 html.P(f"Phone: {info.get('phone', 'N/A')}"),
-                html.P(f"Institute: {info['institute']}")
+                html.P(f"Institute: {info['institute']}"),
+                html.P(f"Research Interests: {', '.join(interests[:10]) if interests else 'N/A'}")
             ])
         else:
             return html.P("No contact information found for the specified faculty member.")
     return html.Div()
 
+# faculty with the most similar research profiles to the selected faculty member
+@app.callback(
+    Output('collaborator-table', 'children'),
+    Input('collaborator-dropdown', 'value')
+)
+def update_collaborators(faculty_name):
+    if not faculty_name:
+        return []
+    similar = collaboratorIndex.similar(faculty_name, k=10)
+    if not similar:
+        return [html.Tr([html.Td("No faculty with overlapping research interests found.")])]
+    return [
+        html.Tr([html.Th("Faculty Member"), html.Th("Similarity"), html.Th("Shared Interests")])
+    ] + [
+        html.Tr([html.Td(name), html.Td(f"{score:.2f}"), html.Td(', '.join(shared))])
+        for name, score, shared in similar
+    ]
+
+# shortest co-authorship chain between two faculty, and the co-authors of the first one
+@app.callback(
+    Output('collaboration-path', 'children'),
+    Output('coauthor-table', 'children'),
+    Input('path-source-dropdown', 'value'),
+    Input('path-target-dropdown', 'value')
+)
+def update_collaboration_path(source, target):
+    if not source:
+        return html.Div(), []
+    path = html.Div()
+    if target:
+        hops = coauthorGraph.shortest_path(source, target)
+        if hops:
+            steps = [hops[0][0]] + [f" \u2192 ({shared} shared) \u2192 {name}" for name, shared in hops[1:]]
+            path = html.P(f"{len(hops) - 1} hop(s): " + ''.join(steps))
+        else:
+            path = html.P(f"No collaboration path within {graph_utils.MAX_DEPTH} hops.")
+    coauthors = coauthorGraph.neighborhood(source, hops=1, limit=20)
+    table = [
+        html.Tr([html.Th("Co-author"), html.Th("Shared Publications")])
+    ] + [
+        html.Tr([html.Td(name), html.Td(shared)]) for name, _, shared in coauthors
+    ]
+    return path, table
+
+@app.callback(
+    Output('centrality-table', 'children'),
+    Input('centrality-keyword-dropdown', 'value')
+)
+def update_keyword_centrality(keyword):
+    if not keyword:
+        return []
+    return [
+        html.Tr([html.Th("Faculty Member"), html.Th("Centrality"), html.Th("Publications")])
+    ] + [
+        html.Tr([html.Td(name), html.Td(f"{score:.4f}"), html.Td(count)])
+        for name, score, count in coauthorGraph.central_faculty(keyword, k=10)
+    ]
+
+# publications and citations per year for a keyword, answered from the trend cube
+@app.callback(
+    Output('trend-graph', 'figure'),
+    Input('trend-keyword-dropdown', 'value'),
+    Input('trend-university-dropdown', 'value'),
+    Input('trend-start-year', 'value'),
+    Input('trend-end-year', 'value')
+)
+def update_trend_graph(keyword, university, start_year, end_year):
+    series = trendCube.series(keyword, university, start_year, end_year) if keyword else []
+    years = [year for year, _, _ in series]
+    return {
+        'data': [
+            {'x': years, 'y': [publications for _, publications, _ in series], 'type': 'bar', 'name': 'Publications'},
+            {'x': years, 'y': [citations for _, _, citations in series], 'type': 'scatter', 'mode': 'lines+markers',
+             'name': 'Citations', 'yaxis': 'y2'}
+        ],
+        'layout': {
+            'title': f"{keyword} at {university or 'all universities'}" if keyword else 'Select a keyword',
+            'xaxis': {'title': 'Year'},
+            'yaxis': {'title': 'Publications'},
+            'yaxis2': {'title': 'Citations', 'overlaying': 'y', 'side': 'right'},
+            'height': 400
+        }
+    }
+
+@app.callback(
+    Output('growth-table', 'children'),
+    Input('trend-university-dropdown', 'value'),
+    Input('trend-end-year', 'value')
+)
+def update_growth_table(university, end_year):
+    growth = trendCube.top_growth(end_year, span=3, university=university, k=10)
+    return [
+        html.Tr([html.Th("Keyword"), html.Th("Previous 3 Years"), html.Th("Last 3 Years"), html.Th("Growth")])
+    ] + [
+        html.Tr([html.Td(keyword), html.Td(previous), html.Td(recent), html.Td(f"{ratio:.1f}x")])
+        for keyword, previous, recent, ratio in growth
+    ]
+
+if PERF_TAB:
+    @app.callback(
+        Output('perf-widget-latency', 'figure'),
+        Output('perf-backend-table', 'children'),
+        Output('perf-slow-queries', 'children'),
+        Input('perf-interval', 'n_intervals')
+    )
+    def update_performance(n):
+        snapshot = metrics.snapshot()
+        fig = {
+            'data': [
+                {
+                    'x': list(summary['buckets']),
+                    'y': list(summary['buckets'].values()),
+                    'type': 'bar',
+                    'name': widget
+                }
+                for widget, summary in snapshot['widgets'].items()
+            ],
+            'layout': {
+                'title': 'Callback Latency by Widget',
+                'xaxis': {'title': 'Latency (ms, bucket upper bound)', 'type': 'category'},
+                'yaxis': {'title': 'Callbacks'},
+                'barmode': 'group',
+                'height': 400
+            }
+        }
+        backend_table = [
+            html.Tr([html.Th("Database"), html.Th("Queries"), html.Th("p50 (ms)"), html.Th("p95 (ms)"), html.Th("p99 (ms)")])
+        ] + [
+            html.Tr([html.Td(backend), html.Td(s['count']), html.Td(f"{s['p50_ms']:.1f}"),
+                     html.Td(f"{s['p95_ms']:.1f}"), html.Td(f"{s['p99_ms']:.1f}")])
+            for backend, s in snapshot['backends'].items()
+        ]
+        slow_table = [
+            html.Tr([html.Th("Database"), html.Th("Widget"), html.Th("Time (ms)"), html.Th("Rows"), html.Th("Query")])
+        ] + [
+            html.Tr([html.Td(q['backend']), html.Td(q['widget'] or ''), html.Td(f"{q['connect_ms'] + q['exec_ms']:.1f}"),
+                     html.Td(q['rows']), html.Td(q['query'][:200])])
+            for q in reversed(snapshot['slow'][-20:])
+        ]
+        return fig, backend_table, slow_table
+
 # Run the Dash app
 if __name__ == '__main__':
-    app.run_server(debug=True, host='0.0.0.0', port=8050)
+    # development server, python serve.py runs the multi worker production mode
+    app.run(debug=True, host='0.0.0.0', port=8050)
@@ -0,0 +1,656 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import re
+import resource
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+# dataset sizes the benchmark runs at, pick with --scales
+SCALES = {
+    'small': {'universities': 20, 'faculty': 500, 'publications': 5000, 'keywords': 300},
+    'medium': {'universities': 100, 'faculty': 3000, 'publications': 50000, 'keywords': 2000},
+    'large': {'universities': 200, 'faculty': 6000, 'publications': 200000, 'keywords': 5000},
+}
+# a p95 this much slower than the compared run is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+# read only callbacks answered from the shared snapshot, the mix the multi worker load test sends
+SERVE_SCENARIOS = ('update_top_universities.interval', 'update_top_research_areas', 'update_research_interest',
+                   'update_collaborators', 'update_collaboration_path', 'update_keyword_centrality',
+                   'update_trend_graph', 'update_growth_table', 'typeahead.faculty', 'typeahead.keyword')
+
+FIRST_NAMES = ['Wei', 'Maria', 'John', 'Priya', 'Ahmed', 'Sara', 'Chen', 'David', 'Elena', 'Kofi',
+               'Yuki', 'Omar', 'Laura', 'Ravi', 'Anna', 'Jose', 'Mei', 'Peter', 'Fatima', 'Lars']
+LAST_NAMES = ['Zhang', 'Garcia', 'Smith', 'Patel', 'Khan', 'Cohen', 'Li', 'Brown', 'Ivanova', 'Mensah',
+              'Tanaka', 'Haddad', 'Rossi', 'Kumar', 'Novak', 'Silva', 'Wang', 'Muller', 'Ali', 'Berg']
+TOPIC_WORDS = ['learning', 'graph', 'network', 'data', 'vision', 'language', 'security', 'systems',
+               'optimization', 'robotics', 'quantum', 'database', 'compiler', 'privacy', 'sensor', 'cloud']
+
+
+def _zipf_weights(n, a=1.1, rng=None):
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    if rng is not None:
+        rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def generate_data(universities, faculty, publications, keywords, seed=0):
+    """
+    Synthetic academicworld dataset with skewed (Zipf) faculty per university, authors per
+    publication and keyword popularity. Returns the MySQL tables as DataFrames plus the
+    MongoDB documents and Neo4j faculty nodes built from the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    university = pd.DataFrame({
+        'id': np.arange(1, universities + 1),
+        'name': [f"University {i:04d}" for i in range(1, universities + 1)],
+    })
+    first = rng.integers(0, len(FIRST_NAMES), faculty)
+    last = rng.integers(0, len(LAST_NAMES), faculty)
+    faculty_df = pd.DataFrame({
+        'id': np.arange(1, faculty + 1),
+        'name': [f"{FIRST_NAMES[a]} {LAST_NAMES[b]} {i}" for i, (a, b) in enumerate(zip(first, last))],
+        'position': 'Professor',
+        'email': [f"faculty{i}@example.edu" for i in range(1, faculty + 1)],
+        'phone': [f"555-{i:07d}" for i in range(1, faculty + 1)],
+        'university_id': rng.choice(university['id'], size=faculty, p=_zipf_weights(universities, rng=rng)),
+    })
+    keyword = pd.DataFrame({
+        'id': np.arange(1, keywords + 1),
+        'name': [f"{TOPIC_WORDS[i % len(TOPIC_WORDS)]} {TOPIC_WORDS[(i // len(TOPIC_WORDS)) % len(TOPIC_WORDS)]} {i}"
+                 for i in range(keywords)],
+    })
+    publication = pd.DataFrame({
+        'id': np.arange(1, publications + 1),
+        'title': [f"Publication {i}" for i in range(1, publications + 1)],
+        'venue': rng.choice(['KDD', 'VLDB', 'SIGMOD', 'NeurIPS', 'ICML', 'CVPR', 'ACL'], size=publications),
+        'year': rng.integers(1990, 2024, publications),
+        'num_citations': np.minimum(rng.lognormal(2.5, 1.5, publications), 50000).astype(int),
+    })
+
+    faculty_weights = _zipf_weights(faculty, a=0.8, rng=rng)
+    authors = rng.integers(1, 5, publications)
+    fp = pd.DataFrame({
+        'faculty_Id': rng.choice(faculty_df['id'], size=int(authors.sum()), p=faculty_weights),
+        'publication_Id': np.repeat(publication['id'].to_numpy(), authors),
+    }).drop_duplicates()
+    keyword_weights = _zipf_weights(keywords, rng=rng)
+    per_publication = rng.integers(1, 6, publications)
+    pk = pd.DataFrame({
+        'publication_id': np.repeat(publication['id'].to_numpy(), per_publication),
+        'keyword_id': rng.choice(keyword['id'], size=int(per_publication.sum()), p=keyword_weights),
+    }).drop_duplicates(['publication_id', 'keyword_id'])
+    pk['score'] = rng.random(len(pk)).round(4)
+
+    tables = {
+        'university': university,
+        'faculty': faculty_df,
+        'keyword': keyword,
+        'publication': publication,
+        'faculty_publication': fp,
+        'Publication_Keyword': pk,
+    }
+    return {'tables': tables, 'mongo': _mongo_documents(tables), 'graph': _graph_nodes(tables)}
+
+
+def _mongo_documents(tables):
+    keyword_names = tables['keyword'].set_index('id')['name']
+    pk = tables['Publication_Keyword'].assign(name=lambda df: keyword_names.loc[df['keyword_id']].to_numpy())
+    keywords_by_publication = {
+        pid: [{'name': n, 'score': s} for n, s in zip(group['name'], group['score'])]
+        for pid, group in pk.groupby('publication_id')
+    }
+    publications = [
+        {'id': int(row.id), 'title': row.title, 'venue': row.venue, 'year': int(row.year),
+         'numCitations': int(row.num_citations), 'keywords': keywords_by_publication.get(row.id, [])}
+        for row in tables['publication'].itertuples(index=False)
+    ]
+    university_names = tables['university'].set_index('id')['name']
+    publications_by_faculty = tables['faculty_publication'].groupby('faculty_Id')['publication_Id'].apply(list)
+    faculty = [
+        {'id': int(row.id), 'name': row.name, 'position': row.position, 'email': row.email, 'phone': row.phone,
+         'affiliation': {'id': int(row.university_id), 'name': university_names.loc[row.university_id]},
+         'publications': [int(p) for p in publications_by_faculty.get(row.id, [])]}
+        for row in tables['faculty'].itertuples(index=False)
+    ]
+    return {'publications': publications, 'faculty': faculty}
+
+
+def _graph_nodes(tables):
+    university_names = tables['university'].set_index('id')['name']
+    return {
+        'faculty': [
+            {'id': int(row.id), 'name': row.name, 'email': row.email, 'phone': row.phone,
+             'institute': university_names.loc[row.university_id]}
+            for row in tables['faculty'].itertuples(index=False)
+        ],
+        'faculty_publication': tables['faculty_publication'],
+        'publication_keyword': tables['Publication_Keyword'].merge(
+            tables['keyword'], left_on='keyword_id', right_on='id')[['publication_id', 'name']],
+    }
+
+
+# local stand-ins for the three database servers
+
+class SQLiteStandIn:
+    def __init__(self, tables, path):
+        """
+        The MySQL schema in a SQLite file. Queries keep their MySQL %s placeholders and
+        the CRC32/CONCAT functions the fingerprint queries use are registered in SQLite.
+        """
+        self.path = path
+        self._local = threading.local()
+        cnx = sqlite3.connect(path)
+        for name, df in tables.items():
+            df.to_sql(name, cnx, index=False, if_exists='replace')
+        for table, column in [('faculty', 'university_id'), ('faculty_publication', 'faculty_Id'),
+                              ('faculty_publication', 'publication_Id'), ('Publication_Keyword', 'publication_id'),
+                              ('Publication_Keyword', 'keyword_id'), ('keyword', 'name'), ('university', 'name'),
+                              ('faculty', 'name'), ('publication', 'id'), ('faculty', 'id'), ('university', 'id'),
+                              ('keyword', 'id')]:
+            cnx.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})")
+        cnx.commit()
+        cnx.close()
+
+    def connection(self):
+        cnx = getattr(self._local, 'cnx', None)
+        if cnx is None:
+            cnx = sqlite3.connect(self.path)
+            cnx.create_function('CRC32', 1, lambda s: zlib.crc32(str(s).encode()))
+            cnx.create_function('CONCAT', -1, lambda *a: None if None in a else ''.join(str(v) for v in a))
+            self._local.cnx = cnx
+        return cnx
+
+    def read(self, query, params=None):
+        return pd.read_sql(query.replace('%s', '?'), self.connection(), params=params)
+
+    def stream(self, query, params=None, batch_size=1000):
+        # a connection of its own, closed when the stream ends or is abandoned
+        cnx = sqlite3.connect(self.path)
+        try:
+            cursor = cnx.cursor()
+            cursor.execute(query.replace('%s', '?'), params or ())
+            columns = [c[0] for c in cursor.description]
+            while batch := cursor.fetchmany(batch_size):
+                yield columns, batch
+        finally:
+            cnx.close()
+
+
+class FakeGraph:
+    def __init__(self, graph):
+        """
+        In memory answers for the Cypher statements the app runs. handlers maps a regex over
+        the whitespace normalized query to a function(match, parameters).
+        """
+        self.by_name = {}
+        for node in graph['faculty']:
+            self.by_name.setdefault(node['name'], []).append(dict(node))
+        self.published = graph['faculty_publication']
+        self.labels = graph['publication_keyword']
+        self._lock = threading.Lock()
+        self.handlers = [
+            (r"^MATCH \(f:Faculty\) RETURN f\.id AS id, f\.name AS name$", self._nodes),
+            (r"^MATCH \(f:Faculty\)-\[:PUBLISH\]->\(p:Publication\) RETURN", self._published),
+            (r"^MATCH \(p:Publication\)-\[:LABEL_BY\]->\(k:KEYWORD\) RETURN", self._labels),
+            (r"^CALL \{ MATCH \(\)-\[r:PUBLISH\]->\(\) RETURN count\(r\) AS publish \}", self._counts),
+            (r"^MATCH \(f:Faculty\) RETURN f\.name AS name$", self._names),
+            (r"^MATCH \(f:Faculty \{name: \$name\}\)-\[:AFFILIATION_WITH\]->\(i:Institute\) RETURN", self._contact),
+            (r"^MATCH \(f:Faculty\) OPTIONAL MATCH \(f\)-\[:AFFILIATION_WITH\]->\(i:Institute\) RETURN", self._contacts),
+            (r"^MATCH \(f:Faculty \{name: \$name\}\) SET f\.(\w+) = \$(\w+) RETURN", self._set_property),
+        ]
+
+    def _names(self, match, parameters):
+        return [{'name': node['name']} for nodes in self.by_name.values() for node in nodes]
+
+    def _nodes(self, match, parameters):
+        return [{'id': node['id'], 'name': node['name']} for nodes in self.by_name.values() for node in nodes]
+
+    def _published(self, match, parameters):
+        return [{'faculty': int(f), 'publication': int(p)}
+                for f, p in zip(self.published['faculty_Id'], self.published['publication_Id'])]
+
+    def _labels(self, match, parameters):
+        return [{'publication': int(p), 'keyword': k}
+                for p, k in zip(self.labels['publication_id'], self.labels['name'])]
+
+    def _counts(self, match, parameters):
+        return [{'publish': len(self.published), 'labels': len(self.labels)}]
+
+    def _contact(self, match, parameters):
+        return [{'name': n['name'], 'email': n['email'], 'phone': n['phone'], 'institute': n['institute']}
+                for n in self.by_name.get(parameters['name'], [])]
+
+    def _contacts(self, match, parameters):
+        return [{'name': n['name'], 'email': n['email'], 'phone': n['phone'], 'institute': n['institute']}
+                for nodes in self.by_name.values() for n in nodes]
+
+    def _set_property(self, match, parameters):
+        prop, param = match.group(1), match.group(2)
+        with self._lock:
+            nodes = self.by_name.get(parameters['name'], [])
+            for node in nodes:
+                node[prop] = parameters[param]
+        return [{'name': n['name'], prop: n[prop]} for n in nodes]
+
+    def run(self, query, parameters=None, database=None):
+        q = ' '.join(query.split())
+        for pattern, handler in self.handlers:
+            match = re.search(pattern, q)
+            if match:
+                return handler(match, parameters or {})
+        raise NotImplementedError(f"FakeGraph has no handler for: {q}")
+
+    def stream(self, query, parameters=None, database=None, batch_size=None, limit=None):
+        yield from (self.run(query, parameters, database) or [])[:limit]
+
+
+class _CollectionStandIn:
+    def __init__(self, collection, db):
+        self._collection = collection
+        self._db = db
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def aggregate(self, pipeline, **kwargs):
+        # mongomock does not implement $merge, apply it by hand
+        if pipeline and '$merge' in pipeline[-1]:
+            merge = pipeline[-1]['$merge']
+            target = self._db[merge['into']]
+            for doc in self._collection.aggregate(pipeline[:-1]):
+                target.replace_one({'_id': doc['_id']}, doc, upsert=True)
+            return iter([])
+        return self._collection.aggregate(pipeline)
+
+
+class _DatabaseStandIn:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _CollectionStandIn(self._db[name], self._db)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class MongoStandIn:
+    def __init__(self, documents):
+        if mongomock is None:
+            raise RuntimeError("the benchmark needs mongomock for its MongoDB stand-in: pip install mongomock")
+        self.client = mongomock.MongoClient()
+        db = self.client['academicworld']
+        for collection, docs in documents.items():
+            if docs:
+                db[collection].insert_many([dict(d) for d in docs])
+
+    def __call__(self, uri=None, **kwargs):
+        return {'academicworld': _DatabaseStandIn(self.client['academicworld'])}
+
+
+def install_stand_ins(data, workdir):
+    """
+    Point mysql_utils, neo4j_utils and mongodb_utils at the local stand-ins. Must run
+    before app is imported.
+    """
+    import mysql_utils
+    import neo4j_utils
+    import mongodb_utils
+    sql = SQLiteStandIn(data['tables'], os.path.join(workdir, 'academicworld.sqlite'))
+    graph = FakeGraph(data['graph'])
+    mysql_utils._read_sql = sql.read
+    mysql_utils._stream = sql.stream
+    neo4j_utils._run = graph.run
+    neo4j_utils.stream_query = graph.stream
+    mongodb_utils.MongoClient = MongoStandIn(data['mongo'])
+    return sql, graph
+
+
+# timing
+
+def callback_payload(callback_map, output, inputs, state=(), changed=None):
+    """
+    The body Dash's renderer posts to /_dash-update-component for the callback producing
+    output. callback_map is app.callback_map, or the /_dash-dependencies list keyed by output.
+    """
+    key = next(key for key in callback_map if output in key.strip('.').split('...'))
+    spec = callback_map[key]
+    parts = [p.rsplit('.', 1) for p in key.strip('.').split('...')]
+    outputs = [{'id': i, 'property': p} for i, p in parts]
+    return {
+        'output': key,
+        'outputs': outputs if key.startswith('..') else outputs[0],
+        'inputs': [dict(s, value=v) for s, v in zip(spec['inputs'], inputs)],
+        'state': [dict(s, value=v) for s, v in zip(spec['state'], state)],
+        'changedPropIds': changed or [f"{spec['inputs'][0]['id']}.{spec['inputs'][0]['property']}"],
+    }
+
+
+class CallbackRunner:
+    def __init__(self, app):
+        """
+        Calls Dash callbacks through the server's real dispatch endpoint, so timings include
+        request parsing and JSON serialization of the figures and tables.
+        """
+        self.app = app
+        self.client = app.server.test_client()
+        self.client.get('/')
+
+    def output_key(self, output):
+        for key in self.app.callback_map:
+            if output in key.strip('.').split('...'):
+                return key
+        raise KeyError(output)
+
+    def call(self, output, inputs, state=(), changed=None):
+        payload = callback_payload(self.app.callback_map, output, inputs, state, changed)
+        response = self.client.post('/_dash-update-component', json=payload)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{output} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+
+def _scenarios(data, rng):
+    tables = data['tables']
+    universities = tables['university']['name'].tolist()
+    keywords = tables['keyword']['name'].tolist()
+    faculty = tables['faculty']['name'].tolist()
+    pick = lambda values: values[int(rng.integers(len(values)))]
+
+    return {
+        # slider moves are sliced in the browser, only the interval refresh reaches the server
+        'update_top_universities.interval': ('top-universities-store.data', lambda: ([int(rng.integers(1, 1000))], [None], None)),
+        'update_top_universities.not_modified': ('top-universities-store.data',
+                                                 lambda: ([int(rng.integers(1, 1000))], [1], None)),
+        'update_top_research_areas': ('top-research-areas-pie.figure', lambda: ([pick(universities)], [], None)),
+        'update_research_interest': ('top-universities-table.children', lambda: ([1, 1], [pick(keywords)], None)),
+        'display_top_publications_by_keyword': ('top-publications-by-keyword.children', lambda: ([1, 1], [pick(keywords)], None)),
+        'fetch_faculty_contact_info': ('faculty-contact-info.children', lambda: ([1], [pick(faculty)], None)),
+        'update_collaborators': ('collaborator-table.children', lambda: ([pick(faculty)], [], None)),
+        'update_collaboration_path': ('collaboration-path.children', lambda: ([pick(faculty), pick(faculty)], [], None)),
+        'update_keyword_centrality': ('centrality-table.children', lambda: ([pick(keywords)], [], None)),
+        'update_trend_graph': ('trend-graph.figure', lambda: ([pick(keywords), pick(universities), 2000, None], [], None)),
+        'update_growth_table': ('growth-table.children', lambda: ([pick(universities), None], [], None)),
+        'update_faculty_email': ('email-update-status.children',
+                                 lambda: ([1], [pick(faculty), f"new{int(rng.integers(1e6))}@example.edu"], None)),
+        'update_faculty_phone': ('phone-update-status.children',
+                                 lambda: ([1], [pick(faculty), f"555-{int(rng.integers(1e7)):07d}"], None)),
+        'typeahead.faculty': ('faculty-name-input.options', lambda: ([pick(faculty)[:int(rng.integers(2, 8))], None], [], None)),
+        'typeahead.keyword': ('keyword-dropdown.options', lambda: ([pick(keywords)[:int(rng.integers(2, 8))], None], [], None)),
+    }
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _summary(latencies):
+    values = np.array(latencies) * 1000
+    return {
+        'n': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+
+def run_scale(scale, repeat=50, warmup=3, seed=0, local=False):
+    params = SCALES[scale]
+    start = time.monotonic()
+    data = generate_data(seed=seed, **params)
+    generated = time.monotonic() - start
+    # the stand-in databases and the export are removed when the run is over
+    with tempfile.TemporaryDirectory(prefix=f'bench-{scale}-', ignore_cleanup_errors=True) as workdir:
+        start = time.monotonic()
+        install_stand_ins(data, workdir)
+        loaded = time.monotonic() - start
+        exported = None
+        if local:
+            # the stand-ins are exported and the app serves the files, as with DASHBOARD_LOCAL_DATA
+            import columnar_utils
+            import mongodb_utils
+            start = time.monotonic()
+            columnar_utils.export(os.path.join(workdir, 'export'), mongo_client=mongodb_utils.MongoDBClient())
+            exported = time.monotonic() - start
+            os.environ['DASHBOARD_LOCAL_DATA'] = os.path.join(workdir, 'export')
+
+        rss_before_app = _rss_mb()
+        start = time.monotonic()
+        import app as dashboard
+        imported = time.monotonic() - start
+        dashboard.optionLists.wait()
+        warm = time.monotonic() - start
+        # the stores and the Mongo top publications are built by the first precompute run
+        dashboard.precompute.run_once()
+
+        runner = CallbackRunner(dashboard.app)
+        rng = np.random.default_rng(seed)
+        callbacks = {}
+        for name, (output, make_args) in _scenarios(data, rng).items():
+            if local and name in ('update_faculty_email', 'update_faculty_phone'):
+                # the exported data is read only
+                continue
+            for _ in range(warmup):
+                runner.call(output, *make_args())
+            latencies = []
+            rss = _rss_mb()
+            for _ in range(repeat):
+                inputs, state, changed = make_args()
+                t = time.perf_counter()
+                runner.call(output, inputs, state, changed)
+                latencies.append(time.perf_counter() - t)
+            callbacks[name] = dict(_summary(latencies), peak_rss_growth_mb=_rss_mb() - rss)
+            print(f"  {scale} {name}: p50 {callbacks[name]['p50_ms']:.2f}ms p95 {callbacks[name]['p95_ms']:.2f}ms")
+        # nothing may read the stand-ins once the directory is removed
+        dashboard.precompute.stop()
+
+        return {
+            'params': params,
+            'generate_s': generated,
+            'load_stand_ins_s': loaded,
+            'export_s': exported,
+            'app_import_s': imported,
+            'cold_start_s': warm,
+            'app_rss_mb': _rss_mb() - rss_before_app,
+            'peak_rss_mb': _rss_mb(),
+            'callbacks': callbacks,
+        }
+
+
+# multi worker load test: serve.py in a child process, load from several client processes
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(port, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request('GET', '/_dash-dependencies')
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            if response.status == 200:
+                return json.loads(body)
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server on port {port} did not come up in {timeout}s")
+
+
+def _drive(args):
+    # one client process: a keep-alive connection sending the request bodies in turn
+    port, bodies, duration, offset = args
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies = []
+    errors = 0
+    i = offset
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        body = bodies[i % len(bodies)]
+        i += 1
+        t = time.perf_counter()
+        try:
+            conn.request('POST', '/_dash-update-component', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        if response.status not in (200, 204):
+            errors += 1
+        latencies.append(time.perf_counter() - t)
+    conn.close()
+    return latencies, errors
+
+
+def run_serve_load(scale, worker_counts, clients, duration, warmup=3, seed=0):
+    """
+    Start serve.py with each number of workers (the publisher reads the stand-ins, the
+    workers only the shared snapshot), drive it with clients concurrent client processes
+    for duration seconds and report throughput and latency per worker count.
+    """
+    import serve
+    data = generate_data(seed=seed, **SCALES[scale])
+    # holds the stand-ins and the snapshots, removed once every worker count has run
+    with tempfile.TemporaryDirectory(prefix=f'serve-{scale}-', ignore_cleanup_errors=True) as workdir:
+        results = {}
+        for workers in worker_counts:
+            port = _free_port()
+            snapshot = os.path.join(workdir, f'snapshot-{workers}')
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    serve.serve(workers, '127.0.0.1', port, snapshot,
+                                setup=lambda role: install_stand_ins(data, workdir) if role == 'publish' else None)
+                finally:
+                    os._exit(0)
+            try:
+                callback_map = {spec['output']: spec for spec in _wait_for_server(port)}
+                rng = np.random.default_rng(seed)
+                scenarios = _scenarios(data, rng)
+                bodies = [json.dumps(callback_payload(callback_map, output, *make_args())).encode()
+                          for _ in range(50) for output, make_args in (scenarios[name] for name in SERVE_SCENARIOS)]
+                with multiprocessing.get_context('fork').Pool(clients) as pool:
+                    # the first requests also wait for the workers that are still starting
+                    pool.map(_drive, [(port, bodies, warmup, i * 7) for i in range(clients)])
+                    runs = pool.map(_drive, [(port, bodies, duration, i * 7) for i in range(clients)])
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            latencies = [latency for run, _ in runs for latency in run]
+            result = dict(_summary(latencies), workers=workers, clients=clients,
+                          requests_per_s=len(latencies) / duration, errors=sum(errors for _, errors in runs))
+            results[str(workers)] = result
+            base = results[str(worker_counts[0])]['requests_per_s']
+            print(f"  {scale} {workers} workers: {result['requests_per_s']:.0f} req/s "
+                  f"({result['requests_per_s'] / base:.2f}x) p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms "
+                  f"errors {result['errors']}")
+    return {'scale': scale, 'cpus': os.cpu_count(), 'duration_s': duration, 'workers': results}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, previous, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for scale, result in current['scales'].items():
+        before = previous.get('scales', {}).get(scale)
+        if not before:
+            continue
+        for name, stats in result['callbacks'].items():
+            old = before['callbacks'].get(name)
+            if old and old['p95_ms'] > 0 and stats['p95_ms'] > old['p95_ms'] * (1 + threshold):
+                regressions.append(f"{scale} {name}: p95 {old['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every dashboard callback against local stand-ins.")
+    parser.add_argument('--scales', default='small,medium', help="comma separated, from: " + ', '.join(SCALES))
+    parser.add_argument('--repeat', type=int, default=50, help="timed calls per callback")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="earlier results file to check for p95 regressions")
+    parser.add_argument('--local', action='store_true', help="export the stand-ins and serve the app from the files")
+    parser.add_argument('--serve-workers', help="comma separated worker counts for the serve.py load test, e.g. 1,2,4")
+    parser.add_argument('--serve-scale', default='small', help="dataset for the load test")
+    parser.add_argument('--serve-clients', type=int, default=8, help="concurrent client processes")
+    parser.add_argument('--serve-duration', type=float, default=10, help="seconds of load per worker count")
+    parser.add_argument('--run-scale', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_workers:
+        worker_counts = [int(n) for n in args.serve_workers.split(',')]
+        if max(worker_counts) > (os.cpu_count() or 1):
+            print(f"Only {os.cpu_count()} CPUs, worker counts above that cannot scale")
+        result = run_serve_load(args.serve_scale, worker_counts, args.serve_clients, args.serve_duration, seed=args.seed)
+        with open(args.output, 'w') as f:
+            json.dump({'revision': _git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'serve': result},
+                      f, indent=2)
+        print(f"Results written to {args.output}")
+        return 0
+
+    if args.run_scale:
+        # child process: one scale per process so every run starts cold
+        result = run_scale(args.run_scale, repeat=args.repeat, seed=args.seed, local=args.local)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return 0
+
+    results = {'revision': _git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': sys.version.split()[0], 'repeat': args.repeat, 'seed': args.seed, 'local': args.local,
+               'scales': {}}
+    for scale in args.scales.split(','):
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            out = tmp.name
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scale', scale, '--repeat', str(args.repeat),
+                        '--seed', str(args.seed), '--output', out] + (['--local'] if args.local else []), check=True)
+        with open(out) as f:
+            results['scales'][scale] = json.load(f)
+        os.remove(out)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
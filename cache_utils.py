@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from flight_utils import single_flight
+
+# defaults for the shared query cache, DASHBOARD_CACHE=0 turns it off
+CACHE_ENABLED = os.environ.get('DASHBOARD_CACHE', '1') != '0'
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 2048
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# results bigger than this (bulk loads of whole tables) are not worth caching
+CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+# optional directory shared by several worker processes
+CACHE_DIR = os.environ.get('DASHBOARD_CACHE_DIR')
+
+SQL_WRITE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|ALTER|CREATE|DROP|TRUNCATE)\b', re.IGNORECASE)
+SQL_TABLES = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+`?(\w+)`?', re.IGNORECASE)
+CYPHER_WRITE = re.compile(r'\b(SET|CREATE|MERGE|DELETE|REMOVE)\b', re.IGNORECASE)
+CYPHER_NODE = re.compile(r'\((\w*)\s*:\s*(\w+)\s*(\{[^}]*\})?\s*\)')
+CYPHER_KEY = re.compile(r'(\w+)\s*:\s*\$(\w+)')
+CYPHER_SET_PROPERTY = re.compile(r'\b(?:SET|REMOVE)\s+\w+\.(\w+)|,\s*\w+\.(\w+)\s*=', re.IGNORECASE)
+
+
+def normalize(query):
+    return ' '.join(query.split())
+
+
+def make_key(backend, query, params=None):
+    text = query if isinstance(query, str) else json.dumps(query, sort_keys=True, default=str)
+    payload = json.dumps([backend, normalize(text), params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_sql_write(query):
+    return bool(SQL_WRITE.match(query))
+
+
+def sql_tags(query):
+    return {('sql', table.lower()) for table in SQL_TABLES.findall(query)}
+
+
+def is_cypher_write(query):
+    return bool(CYPHER_WRITE.search(query))
+
+
+def cypher_tags(query, parameters=None):
+    """
+    Tags for the nodes a Cypher query touches. A node pattern keyed on a parameter,
+    (f:Faculty {name: $name}), gives ('neo4j', 'Faculty', 'name', value); any other
+    pattern gives ('neo4j', 'Faculty', '*').
+    """
+    parameters = parameters or {}
+    tags = set()
+    for _, label, properties in CYPHER_NODE.findall(query):
+        keys = CYPHER_KEY.findall(properties or '')
+        if keys:
+            for prop, param in keys:
+                tags.add(('neo4j', label, prop, str(parameters.get(param))))
+        else:
+            tags.add(('neo4j', label, '*'))
+    return tags
+
+
+def cypher_set_properties(query):
+    return {a or b for a, b in CYPHER_SET_PROPERTY.findall(query)}
+
+
+def mongo_tags(collection):
+    return {('mongo', collection)}
+
+
+def _affects(entry_tags, entry_query, tags, properties):
+    """
+    Whether a write with the given tags and written properties changes a cached read.
+    Keyed tags must match exactly; an unkeyed read of the same label is only affected
+    when it references one of the written properties.
+    """
+    if entry_tags & tags:
+        return True
+    for tag in tags:
+        if tag[0] == 'neo4j' and ('neo4j', tag[1], '*') in entry_tags:
+            if not properties or any(f'.{prop}' in entry_query for prop in properties):
+                return True
+    return False
+
+
+class _Entry:
+    __slots__ = ('blob', 'tags', 'query', 'created', 'expires')
+
+    def __init__(self, blob, tags, query, created, expires):
+        self.blob = blob
+        self.tags = tags
+        self.query = query
+        self.created = created
+        self.expires = expires
+
+
+class QueryCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 max_entry_bytes=CACHE_MAX_ENTRY_BYTES, directory=CACHE_DIR, enabled=CACHE_ENABLED):
+        """
+        Two level cache for query results: an in process LRU bounded by entry count and bytes,
+        and an optional on disk tier shared by every worker pointing at the same directory.
+
+        Entries carry tags describing what they read (tables, collections, graph nodes) so
+        writes invalidate only the entries they affect. Invalidations are appended to a log in
+        the shared directory so other workers drop their in memory copies too.
+
+        :param ttl: seconds an entry stays valid
+        :param max_entries: maximum number of in memory entries
+        :param max_bytes: maximum pickled size of the in memory entries
+        :param max_entry_bytes: results larger than this are not cached
+        :param directory: shared directory for the disk tier, None for memory only
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._log_offset = 0
+        self._invalidations = []
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                         'invalidations': 0, 'uncacheable': 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # replay recent invalidations so disk entries written before them are not served
+            self._sync()
+
+    def _count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['disk_hits'] + self.counters['misses']
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes,
+                        hit_rate=(self.counters['hits'] + self.counters['disk_hits']) / lookups if lookups else 0.0)
+
+    # memory tier
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.blob)
+
+    def _store(self, key, entry):
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(entry.blob)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._count('evictions')
+
+    # disk tier
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _log_path(self):
+        return os.path.join(self.directory, 'invalidations.log')
+
+    def _disk_get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+        if entry.expires < time.time() or self._invalidated_since(entry):
+            self._disk_remove(key)
+            return None
+        return entry
+
+    def _disk_put(self, key, entry):
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"Cache write failed: {e}")
+
+    def _disk_remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _sync(self):
+        """
+        Apply invalidations other workers appended to the shared log since the last check.
+        """
+        if not self.directory:
+            return
+        log = self._log_path()
+        try:
+            size = os.path.getsize(log)
+        except OSError:
+            return
+        if size <= self._log_offset:
+            return
+        with open(log, 'r') as f:
+            f.seek(self._log_offset)
+            lines = f.readlines()
+            self._log_offset = f.tell()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            tags = {tuple(tag) for tag in record['tags']}
+            self._invalidate_local(tags, set(record['properties']), record['time'])
+
+    def _invalidate_local(self, tags, properties, when):
+        cutoff = time.time() - self.ttl
+        self._invalidations = [inv for inv in self._invalidations if inv[0] > cutoff]
+        if when > cutoff:
+            self._invalidations.append((when, tags, properties))
+        stale = [k for k, e in self._entries.items() if e.created < when and _affects(e.tags, e.query, tags, properties)]
+        for key in stale:
+            self._remove(key)
+            self._count('invalidations')
+
+    # public api
+
+    def get(self, key):
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires >= time.time():
+                    self._entries.move_to_end(key)
+                    self._count('hits')
+                    return True, pickle.loads(entry.blob)
+                self._remove(key)
+                self._count('expirations')
+            if self.directory:
+                entry = self._disk_get(key)
+                if entry is not None:
+                    self._store(key, entry)
+                    self._count('disk_hits')
+                    return True, pickle.loads(entry.blob)
+            self._count('misses')
+            return False, None
+
+    def _invalidated_since(self, entry):
+        return any(when > entry.created and _affects(entry.tags, entry.query, tags, props)
+                   for when, tags, props in self._invalidations)
+
+    def set(self, key, value, tags=(), query='', started=None):
+        """
+        :param started: time the value was read, a write that landed after it keeps the value out of the cache
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_entry_bytes:
+            with self._lock:
+                self._count('uncacheable')
+            return
+        created = started or time.time()
+        entry = _Entry(blob, frozenset(tags), normalize(query) if isinstance(query, str) else '', created, created + self.ttl)
+        with self._lock:
+            self._sync()
+            if self._invalidated_since(entry):
+                return
+            self._store(key, entry)
+            if self.directory:
+                self._disk_put(key, entry)
+
+    def cached(self, key, loader, tags=(), query=''):
+        """
+        Return the cached value for key, or call loader() and cache its result.
+        None results and exceptions are never cached. Concurrent misses for the same key
+        share one loader() call.
+        """
+        if not self.enabled:
+            return single_flight.do(key, loader)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        return single_flight.do(key, lambda: self._load(key, loader, tags, query))
+
+    def _load(self, key, loader, tags, query):
+        started = time.time()
+        value = loader()
+        if value is not None:
+            self.set(key, value, tags, query, started)
+        return value
+
+    def invalidate(self, tags, properties=()):
+        tags = set(tags)
+        properties = set(properties)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            self._invalidate_local(tags, properties, now)
+            if self.directory:
+                # replaying our own record later is harmless, it only drops entries older than it
+                record = json.dumps({'time': now, 'tags': sorted(tags), 'properties': sorted(properties)})
+                with open(self._log_path(), 'a') as f:
+                    f.write(record + '\n')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+query_cache = QueryCache()
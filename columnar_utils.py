@@ -0,0 +1,576 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+import pandas as pd
+import mysql_utils as sqlDB
+import neo4j_utils as neo4jDB
+import graph_utils
+import contact_utils
+from keyword_utils import MONGO_TOP_PUBLICATIONS, MONGO_FINGERPRINT_ID, MONGO_FINGERPRINT_PIPELINE, TOP_K
+from cache_utils import query_cache, make_key, is_cypher_write, mongo_tags
+from metrics_utils import metrics
+from pool_utils import ConnectionPool, PoolTimeout
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+# the MySQL tables the dashboard reads, exported whole
+MYSQL_TABLES = ('university', 'faculty', 'publication', 'keyword', 'faculty_publication', 'Publication_Keyword')
+# the MongoDB collections and the fields kept of their documents
+MONGO_FIELDS = {
+    'publications': ('id', 'title', 'venue', 'year', 'numCitations', 'keywords'),
+    'faculty': ('id', 'name', 'position', 'email', 'phone', 'affiliation', 'publications'),
+}
+# rows per Arrow record batch in the written files
+BATCH_SIZE = 65536
+# a string column is dictionary encoded when at most this share of its values are distinct
+DICTIONARY_RATIO = 0.5
+ID_COLUMN = re.compile(r'(^|_)id$', re.IGNORECASE)
+# DuckDB cursors kept with every table registered, queries beyond this many wait for one
+LOCAL_CURSORS = int(os.environ.get('DASHBOARD_LOCAL_CURSORS', 8))
+
+# contact properties of every faculty node, the same ones CONTACT_QUERY returns
+CONTACTS_QUERY = """
+MATCH (f:Faculty)
+OPTIONAL MATCH (f)-[:AFFILIATION_WITH]->(i:Institute)
+RETURN f.name AS name, f.email AS email, f.phone AS phone, i.name AS institute
+"""
+
+FACULTY_NAMES_QUERY = "MATCH (f:Faculty) RETURN f.name AS name"
+KEYWORDS_PIPELINE = [{"$unwind": "$keywords"}, {"$group": {"_id": "$keywords.name"}}]
+
+
+def _mongo_schemas():
+    keyword = pa.struct([('name', pa.string()), ('score', pa.float64())])
+    return {
+        'publications': pa.schema([('id', pa.int64()), ('title', pa.string()), ('venue', pa.string()),
+                                   ('year', pa.int32()), ('numCitations', pa.int64()),
+                                   ('keywords', pa.list_(keyword))]),
+        'faculty': pa.schema([('id', pa.int64()), ('name', pa.string()), ('position', pa.string()),
+                              ('email', pa.string()), ('phone', pa.string()),
+                              ('affiliation', pa.struct([('id', pa.int64()), ('name', pa.string())])),
+                              ('publications', pa.list_(pa.int64()))]),
+    }
+
+
+def _plan(column, name=''):
+    """
+    How to compact one column, decided over all of its rows: repetitive strings (also inside
+    lists and structs) get one dictionary shared by every batch, id columns the narrowest
+    integer type that holds them. None leaves the column as it is.
+    """
+    kind = column.type
+    if pa.types.is_string(kind) or pa.types.is_large_string(kind):
+        if len(column) and pc.count_distinct(column).as_py() <= DICTIONARY_RATIO * len(column):
+            return pc.drop_null(pc.unique(column))
+        return None
+    if pa.types.is_list(kind):
+        return _plan(pc.list_flatten(column), name)
+    if pa.types.is_struct(kind):
+        children = [_plan(pc.struct_field(column, [i]), kind.field(i).name) for i in range(kind.num_fields)]
+        return children if any(child is not None for child in children) else None
+    if ID_COLUMN.search(name) and (pa.types.is_integer(kind) or pa.types.is_floating(kind)):
+        # NULLs turn MySQL integer columns into floats in pandas, the ids themselves are whole
+        bounds = pc.min_max(column)
+        low, high = bounds['min'].as_py(), bounds['max'].as_py()
+        target = pa.int32() if low is None or (low >= -2 ** 31 and high < 2 ** 31) else pa.int64()
+        try:
+            column.cast(target)
+        except pa.ArrowInvalid:
+            return None
+        return target
+    return None
+
+
+def _encode(array, plan):
+    """
+    Compact one batch of a column as planned by _plan.
+    """
+    if plan is None:
+        return array
+    kind = array.type
+    if pa.types.is_string(kind) or pa.types.is_large_string(kind):
+        return pa.DictionaryArray.from_arrays(pc.index_in(array, value_set=plan), plan)
+    if pa.types.is_list(kind):
+        # the batch may be a slice, its values start at the first offset
+        first, last = array.offsets[0].as_py(), array.offsets[-1].as_py()
+        offsets = pc.subtract(array.offsets, pa.scalar(first, pa.int32()))
+        return pa.ListArray.from_arrays(offsets, _encode(array.values.slice(first, last - first), plan),
+                                        mask=array.is_null() if array.null_count else None)
+    if pa.types.is_struct(kind):
+        fields = [kind.field(i) for i in range(kind.num_fields)]
+        return pa.StructArray.from_arrays([_encode(child, p) for child, p in zip(array.flatten(), plan)],
+                                          names=[f.name for f in fields],
+                                          mask=array.is_null() if array.null_count else None)
+    return array.cast(plan)
+
+
+def _encode_batch(batch, plans):
+    return pa.RecordBatch.from_arrays([_encode(column, plans[name]) for name, column in zip(batch.schema.names, batch.columns)],
+                                      names=batch.schema.names)
+
+
+def _spill(prefix, batches, schema=None):
+    """
+    Write the batches to plain Arrow files as they arrive, starting a new file when their
+    types change (pandas infers them per chunk: a column that is all NULL in one chunk, ids
+    that turn into floats in another). Returns the file names.
+    """
+    paths = []
+    sink = writer = current = None
+    try:
+        for batch in batches:
+            if writer is None or batch.schema != current:
+                if writer is not None:
+                    writer.close()
+                    sink.close()
+                paths.append(f"{prefix}.{len(paths)}.raw")
+                current = batch.schema
+                sink = pa.OSFile(paths[-1], 'wb')
+                writer = pa.ipc.new_file(sink, current)
+            writer.write_batch(batch)
+        if writer is None and schema is not None:
+            paths.append(f"{prefix}.0.raw")
+            sink = pa.OSFile(paths[-1], 'wb')
+            writer = pa.ipc.new_file(sink, schema)
+    except BaseException:
+        for path in paths:
+            _remove(path)
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+            sink.close()
+    return paths
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _compact(path, spilled):
+    """
+    Write the spilled files, mapped, as one compacted file at path. Returns its row count and schema.
+    """
+    tables = [pa.ipc.open_file(pa.memory_map(raw, 'r')).read_all() for raw in spilled]
+    table = pa.concat_tables(tables, promote_options='permissive') if len(tables) > 1 else tables[0]
+    plans = {column: _plan(table[column], column) for column in table.column_names}
+    empty = pa.RecordBatch.from_arrays([pa.array([], type=field.type) for field in table.schema], schema=table.schema)
+    schema = _encode_batch(empty, plans).schema
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_SIZE):
+            writer.write_batch(_encode_batch(batch, plans))
+    return table.num_rows, schema
+
+
+def _write(directory, name, batches, schema=None):
+    """
+    Write the record batches as an uncompressed Arrow IPC file, which readers can map and use
+    in place. The batches are spilled to plain files as they arrive, so only one of them is
+    held in memory; those are then mapped and compacted batch by batch into the target,
+    written next to it and renamed over it. Returns None when there were no batches and no schema.
+    """
+    path = os.path.join(directory, f"{name}.arrow")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    spilled = _spill(tmp, batches, schema)
+    if not spilled:
+        return None
+    try:
+        rows, schema = _compact(tmp, spilled)
+    finally:
+        for raw in spilled:
+            _remove(raw)
+    os.replace(tmp, path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {'file': os.path.basename(path), 'rows': rows, 'bytes': os.path.getsize(path),
+            'sha256': digest.hexdigest(), 'schema': [f"{field.name}: {field.type}" for field in schema]}
+
+
+def _batches(rows, schema, chunksize):
+    # dicts grouped into record batches of chunksize rows
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunksize:
+            yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+            chunk = []
+    if chunk:
+        yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+
+
+def _mysql_table(table, chunksize):
+    for chunk in sqlDB.iter_chunks(f"SELECT * FROM {table}", chunksize=chunksize):
+        yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+
+def _mongo_collection(mongo_client, collection, schema, chunksize, database="academicworld"):
+    projection = dict({"_id": 0}, **{field: 1 for field in MONGO_FIELDS[collection]})
+    return _batches(mongo_client.stream(database, collection, {}, projection, batch_size=chunksize), schema, chunksize)
+
+
+def export(directory, mongo_client=None, chunksize=sqlDB.BATCH_SIZE, sources=('mysql', 'mongo', 'neo4j')):
+    """
+    Export everything the dashboard reads into Arrow IPC files under directory, one file per
+    table: the MySQL tables, the MongoDB publications and faculty collections (as
+    mongo_<collection>) and the Neo4j faculty contacts (neo4j_contacts), plus a
+    manifest with row counts and checksums. Rows are streamed from the databases
+    chunksize at a time and written out as they arrive.
+
+    :return: the manifest
+    """
+    if pa is None:
+        raise RuntimeError("exporting needs pyarrow: pip install pyarrow")
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'format': FORMAT_VERSION, 'created_at': time.time(), 'tables': {}}
+    start = time.monotonic()
+    if 'mysql' in sources:
+        for table in MYSQL_TABLES:
+            written = _write(directory, table, _mysql_table(table, chunksize))
+            if written is None:
+                raise RuntimeError(f"could not read the MySQL table {table}")
+            manifest['tables'][table] = written
+    if 'mongo' in sources:
+        if mongo_client is None:
+            import mongodb_utils
+            mongo_client = mongodb_utils.MongoDBClient()
+        for collection, schema in _mongo_schemas().items():
+            manifest['tables'][f"mongo_{collection}"] = _write(
+                directory, f"mongo_{collection}", _mongo_collection(mongo_client, collection, schema, chunksize), schema)
+    if 'neo4j' in sources:
+        schema = pa.schema([(field, pa.string()) for field in ('name', 'email', 'phone', 'institute')])
+        contacts = _batches(neo4jDB.stream_query(CONTACTS_QUERY, batch_size=chunksize), schema, chunksize)
+        manifest['tables']['neo4j_contacts'] = _write(directory, 'neo4j_contacts', contacts, schema)
+    manifest['export_s'] = time.monotonic() - start
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _crc32(value):
+    return zlib.crc32(str(value).encode())
+
+
+def _plain(df):
+    # dictionary encoded columns come back as categoricals, the stores expect plain values
+    for column in df.select_dtypes('category').columns:
+        df[column] = df[column].astype(object)
+    return df
+
+
+class LocalData:
+    def __init__(self, directory):
+        """
+        An export directory served read only through an embedded DuckDB database.
+
+        Every Arrow file is memory mapped and registered as a table of the same name, so
+        queries scan the mapped pages in place: startup only maps the files, and several
+        processes serving the same export share them in the page cache. install() answers
+        the MySQL reads, the Cypher reads the dashboard runs and (through mongo) its
+        MongoDB reads from those tables. Writes are refused.
+
+        :param directory: written by export()
+        """
+        if pa is None or duckdb is None:
+            raise RuntimeError("serving exported data needs pyarrow and duckdb: pip install pyarrow duckdb")
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{directory} holds export format {self.manifest.get('format')}, expected {FORMAT_VERSION}")
+        self.tables = {}
+        for name, spec in self.manifest['tables'].items():
+            source = pa.memory_map(os.path.join(directory, spec['file']), 'r')
+            self.tables[name] = pa.ipc.open_file(source).read_all()
+        self._db = duckdb.connect()
+        self._db.create_function('CRC32', _crc32, ['VARCHAR'], 'BIGINT')
+        # DuckDB connections are not shared between threads, and the server runs a thread per
+        # request, so queries check a cursor out of a bounded pool instead of keeping one per thread
+        self._pool = ConnectionPool(self._connect, size=LOCAL_CURSORS, recycle=None)
+        self.graph = LocalGraph(self)
+        self.mongo = LocalMongo(self)
+
+    def _connect(self):
+        cursor = self._db.cursor()
+        # registering wraps the mapped table, nothing is copied
+        for name, table in self.tables.items():
+            cursor.register(name, table)
+        return cursor
+
+    def _cursor(self):
+        # a cursor is discarded if the block raises, e.g. with a transaction left open
+        return self._pool.connection()
+
+    def _explain(self, sql, params):
+        with self._cursor() as cursor:
+            return cursor.execute('EXPLAIN ' + sql, params).fetchall()
+
+    def query(self, query, params=None, backend='mysql'):
+        start = time.perf_counter()
+        sql = query.replace('%s', '?')
+        with self._cursor() as cursor:
+            checked_out = time.perf_counter()
+            df = _plain(cursor.execute(sql, params).df())
+        metrics.record(backend, query, len(df), checked_out - start, time.perf_counter() - checked_out,
+                       explain=lambda: self._explain(sql, params))
+        return df
+
+    def read_sql(self, query, params=None):
+        try:
+            return self.query(query, params)
+        except duckdb.Error as e:
+            # reported by fetch_data like any failed MySQL query
+            raise sqlDB.mysql.connector.Error(msg=str(e))
+
+    def stream(self, query, params=None, batch_size=sqlDB.BATCH_SIZE):
+        start = time.perf_counter()
+        try:
+            # checked out until the stream ends, so other queries can run while this one is being read
+            conn = self._pool.acquire()
+        except PoolTimeout as e:
+            print(f"Error: {e}")
+            return
+        checked_out = time.perf_counter()
+        rows = 0
+        broken = True
+        try:
+            cursor = conn.raw
+            cursor.execute(query.replace('%s', '?'), params)
+            columns = [c[0] for c in cursor.description]
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows += len(batch)
+                yield columns, batch
+            broken = False
+        except duckdb.Error as e:
+            print(f"Error: {e}")
+        except GeneratorExit:
+            # the caller stopped early, the next execute discards the rest of the result
+            broken = False
+            raise
+        finally:
+            self._pool.release(conn, broken=broken)
+            metrics.record('mysql', query, rows, checked_out - start, time.perf_counter() - checked_out)
+
+    def install(self):
+        """
+        Route the dashboard's database reads to the exported tables. Must run before the
+        stores are built, i.e. before app creates them.
+        """
+        sqlDB._read_sql = self.read_sql
+        sqlDB._stream = self.stream
+        neo4jDB._run = self.graph.run
+        neo4jDB.stream_query = self.graph.stream
+        neo4jDB.write_transaction = self.graph.write_transaction
+
+    def stats(self):
+        cursors = self._pool.stats.snapshot()
+        return {'tables': len(self.tables), 'rows': sum(table.num_rows for table in self.tables.values()),
+                'mapped_bytes': sum(spec['bytes'] for spec in self.manifest['tables'].values()),
+                'exported_at': self.manifest['created_at'],
+                'cursors': cursors['created'], 'cursors_in_use': cursors['in_use'], 'cursor_wait_ms': cursors['avg_wait_ms']}
+
+    def close(self):
+        self._pool.close_all()
+        self._db.close()
+
+
+def _normalize(query):
+    return ' '.join(query.split())
+
+
+class LocalGraph:
+    def __init__(self, data):
+        """
+        Answers the Cypher reads the dashboard runs with SQL over the exported tables. The
+        co-authorship projection comes from the MySQL link tables, the contacts from the
+        exported faculty nodes; any other statement fails like a query the server rejected.
+        """
+        self.data = data
+        self.statements = {_normalize(cypher): sql for cypher, sql in [
+            (FACULTY_NAMES_QUERY, "SELECT name FROM neo4j_contacts"),
+            (contact_utils.CONTACT_QUERY,
+             "SELECT name, email, phone, institute FROM neo4j_contacts WHERE name = $name AND institute IS NOT NULL"),
+            (graph_utils.FACULTY_QUERY, "SELECT id, name FROM faculty"),
+            (graph_utils.PUBLISH_QUERY, "SELECT faculty_Id AS faculty, publication_Id AS publication FROM faculty_publication"),
+            (graph_utils.LABEL_QUERY, "SELECT pk.publication_id AS publication, k.name AS keyword "
+                                      "FROM Publication_Keyword pk JOIN keyword k ON k.id = pk.keyword_id"),
+            (graph_utils.FINGERPRINT_QUERY, "SELECT (SELECT COUNT(*) FROM faculty_publication) AS publish, "
+                                            "(SELECT COUNT(*) FROM Publication_Keyword) AS labels"),
+        ]}
+
+    def run(self, query, parameters=None, database="academicworld"):
+        if is_cypher_write(query):
+            print("Query failed: the local data is read only")
+            return None
+        sql = self.statements.get(_normalize(query))
+        if sql is None:
+            print(f"Query failed: not available in local mode: {_normalize(query)[:80]}")
+            return None
+        try:
+            return self.data.query(sql, parameters or None, backend='neo4j').to_dict('records')
+        except (duckdb.Error, PoolTimeout) as e:
+            print(f"Query failed: {e}")
+            return None
+
+    def stream(self, query, parameters=None, database="academicworld", batch_size=None, limit=None):
+        records = self.run(query, parameters, database) or []
+        yield from records[:limit]
+
+    def write_transaction(self, query, parameters=None, database="academicworld", tags=None):
+        raise RuntimeError("the local data is read only")
+
+
+class LocalMongo:
+    def __init__(self, data):
+        """
+        The part of MongoDBClient the dashboard uses, over the exported collections. The
+        keyword_top_publications collection is not exported, the $out that builds it
+        creates a table in the embedded database instead, and its fingerprint document is
+        kept here.
+        """
+        self.data = data
+        self.fingerprints = {}
+
+    def _sql(self, sql, params=None):
+        try:
+            return self.data.query(sql, params, backend='mongo')
+        except (duckdb.Error, PoolTimeout) as e:
+            print(f"Query failed: {e}")
+            return pd.DataFrame()
+
+    def stream(self, database, collection, query, projection=None, batch_size=None, limit=0):
+        if collection == MONGO_TOP_PUBLICATIONS and query == {"_id": MONGO_FINGERPRINT_ID}:
+            if collection in self.fingerprints:
+                yield {"fingerprint": self.fingerprints[collection]}
+            return
+        if query:
+            print(f"Query failed: only unfiltered reads of {collection} are available in local mode")
+            return
+        fields = [field for field, keep in (projection or {}).items() if keep and field != '_id']
+        columns = ', '.join(f'"{field}"' for field in fields) or '*'
+        df = self._sql(f"SELECT {columns} FROM mongo_{collection}" + (f" LIMIT {int(limit)}" if limit else ""))
+        yield from df.to_dict('records')
+
+    def stream_aggregate(self, database, collection, pipeline, batch_size=None, **kwargs):
+        if collection != 'publications' or pipeline != MONGO_FINGERPRINT_PIPELINE:
+            print(f"Query failed: this {collection} pipeline is not available in local mode")
+            return iter([])
+        df = self._sql("""
+            SELECT COUNT(*) AS publications, COALESCE(SUM(numCitations), 0) AS citations,
+                COALESCE(SUM(len(keywords)), 0) AS keywords, MAX(id) AS max_id
+            FROM mongo_publications
+        """)
+        return iter([{key: int(value) if pd.notna(value) else None for key, value in row.items()}
+                     for row in df.to_dict('records')])
+
+    def find(self, database, collection, query, projection=None):
+        if collection != MONGO_TOP_PUBLICATIONS or set(query) != {'_id'}:
+            print(f"Query failed: {collection} lookups are not available in local mode")
+            return []
+        skip, size = (projection or {}).get('publications', {}).get('$slice', [0, TOP_K])
+        key = make_key('mongo:find', [collection, query, projection])
+        df = query_cache.cached(key, lambda: self._sql(f"""
+            SELECT title, numCitations FROM {MONGO_TOP_PUBLICATIONS}
+            WHERE keyword = ? AND rank > ? AND rank <= ?
+            ORDER BY rank
+        """, [query['_id'], skip, skip + size]), mongo_tags(collection))
+        return [{'publications': df.to_dict('records')}] if not df.empty else []
+
+    def aggregate(self, database, collection, pipeline, **kwargs):
+        target = pipeline[-1].get("$out") if pipeline else None
+        if isinstance(target, str) and target.startswith(MONGO_TOP_PUBLICATIONS):
+            # materialized as a table of the embedded database, the top TOP_K per keyword
+            self._sql(f"""
+                CREATE OR REPLACE TABLE {target} AS
+                SELECT * FROM (
+                    SELECT k.name::VARCHAR AS keyword, p.title::VARCHAR AS title, p.numCitations AS numCitations,
+                        row_number() OVER (PARTITION BY k.name ORDER BY p.numCitations DESC, p.id) AS rank
+                    FROM mongo_publications p, UNNEST(p.keywords) AS u(k)
+                ) WHERE rank <= {TOP_K}
+                ORDER BY keyword, rank
+            """)
+            self.fingerprints.pop(target, None)
+            return []
+        if collection == 'publications' and pipeline == KEYWORDS_PIPELINE:
+            df = self._sql("SELECT DISTINCT k.name AS _id FROM mongo_publications p, UNNEST(p.keywords) AS u(k)")
+            return df.to_dict('records')
+        print(f"Query failed: this {collection} pipeline is not available in local mode")
+        return []
+
+    def replace_one(self, database, collection, query, document, upsert=True):
+        # only the fingerprint of the derived collection is written, the exported data stays read only
+        if not collection.startswith(MONGO_TOP_PUBLICATIONS) or query != {"_id": MONGO_FINGERPRINT_ID}:
+            raise RuntimeError("the local data is read only")
+        self.fingerprints[collection] = document.get("fingerprint")
+
+    def rename(self, database, collection, target):
+        with self.data._cursor() as cursor:
+            cursor.execute("BEGIN")
+            cursor.execute(f"DROP TABLE IF EXISTS {target}")
+            cursor.execute(f"ALTER TABLE {collection} RENAME TO {target}")
+            cursor.execute("COMMIT")
+        if collection in self.fingerprints:
+            self.fingerprints[target] = self.fingerprints.pop(collection)
+        query_cache.invalidate(mongo_tags(collection) | mongo_tags(target))
+
+    def drop(self, database, collection):
+        if not collection.startswith(MONGO_TOP_PUBLICATIONS):
+            raise RuntimeError("the local data is read only")
+        self._sql(f"DROP TABLE IF EXISTS {collection}")
+        self.fingerprints.pop(collection, None)
+
+    def count(self, database, collection):
+        table = self.data.tables.get(f"mongo_{collection}")
+        return table.num_rows if table is not None else 0
+
+    def bulk_write(self, database, collection, operations, ordered=False):
+        raise RuntimeError("the local data is read only")
+
+    def update_one(self, database, collection, query, new_values):
+        raise RuntimeError("the local data is read only")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the dashboard's MySQL tables, MongoDB collections and Neo4j "
+                                                 "contacts to Arrow IPC files, for DASHBOARD_LOCAL_DATA.")
+    parser.add_argument('directory')
+    parser.add_argument('--chunksize', type=int, default=10000, help="rows fetched per round trip")
+    parser.add_argument('--sources', default='mysql,mongo,neo4j', help="comma separated, from: mysql, mongo, neo4j")
+    args = parser.parse_args(argv)
+    try:
+        manifest = export(args.directory, chunksize=args.chunksize, sources=args.sources.split(','))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    for name, spec in manifest['tables'].items():
+        print(f"{name}: {spec['rows']} rows, {spec['bytes'] / 1e6:.1f} MB")
+    print(f"Exported to {args.directory} in {manifest['export_s']:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
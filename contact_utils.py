@@ -0,0 +1,227 @@
+import argparse
+import base64
+import csv
+import io
+import json
+import queue
+import re
+import sys
+import threading
+from pymongo import UpdateMany
+import neo4j_utils as neo4jDB
+
+FIELDS = ('email', 'phone')
+# rows per UNWIND transaction and per MongoDB bulk write
+BATCH_SIZE = 500
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+PHONE = re.compile(r'^\+?[0-9 ().\-/x]+$')
+
+CONTACT_QUERY = """
+MATCH (f:Faculty {name: $name})-[:AFFILIATION_WITH]->(i:Institute)
+RETURN f.name AS name, f.email AS email, f.phone AS phone, i.name AS institute
+"""
+
+UPDATE_QUERY = """
+UNWIND $rows AS row
+MATCH (f:Faculty {name: row.name})
+SET f.email = coalesce(row.email, f.email), f.phone = coalesce(row.phone, f.phone)
+RETURN row.row AS row, count(f) AS matched
+"""
+
+
+def parse_rows(text, fmt):
+    """
+    Read contact updates from CSV (a header with name and email and/or phone) or JSON
+    (a list of objects, or {"rows": [...]}). Keys are lower cased, blank values become None.
+
+    :return: list of dicts with row (1 based position in the upload), name, email, phone
+    """
+    if fmt == 'json':
+        data = json.loads(text)
+        records = data.get('rows', []) if isinstance(data, dict) else data
+    elif fmt == 'csv':
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError(f"unknown format {fmt}, expected csv or json")
+    if not isinstance(records, list):
+        raise ValueError("expected a list of objects")
+    rows = []
+    for i, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            record = {}
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        row = {'row': i}
+        for key in ('name',) + FIELDS:
+            value = record.get(key)
+            value = str(value).strip() if value is not None else ''
+            row[key] = value or None
+        rows.append(row)
+    return rows
+
+
+def format_for(filename):
+    return 'json' if filename and filename.lower().endswith('.json') else 'csv'
+
+
+def validate(rows):
+    """
+    Split rows into the valid ones and report entries for the invalid ones.
+    """
+    valid = []
+    report = []
+    for row in rows:
+        error = None
+        if not row['name']:
+            error = "missing name"
+        elif not any(row[field] for field in FIELDS):
+            error = "nothing to update, give an email or a phone"
+        elif row['email'] and not EMAIL.match(row['email']):
+            error = f"invalid email {row['email']}"
+        elif row['phone'] and (not PHONE.match(row['phone']) or sum(c.isdigit() for c in row['phone']) < 7):
+            error = f"invalid phone {row['phone']}"
+        if error:
+            report.append({'row': row['row'], 'name': row['name'], 'status': 'invalid', 'error': error})
+        else:
+            valid.append(row)
+    return valid, report
+
+
+class MongoWriteBehind:
+    def __init__(self, mongo_client, batch_size=BATCH_SIZE, database="academicworld", collection="faculty"):
+        """
+        Propagates contact updates to the MongoDB faculty collection in the background,
+        batch_size updates per unordered bulk write. flush() waits until everything
+        submitted so far is written.
+        """
+        self.mongo_client = mongo_client
+        self.batch_size = batch_size
+        self.database = database
+        self.collection = collection
+        self.queue = queue.Queue()
+        self.written = 0
+        self.failed = 0
+        self.last_error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, rows):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='mongo-write-behind', daemon=True)
+                self._thread.start()
+        for row in rows:
+            self.queue.put(row)
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        # rows for the same name are merged in upload order, so the last value of each field
+        # wins no matter in which order the unordered bulk write applies the updates
+        updates = {}
+        for row in batch:
+            updates.setdefault(row['name'], {}).update({field: row[field] for field in FIELDS if row[field]})
+        operations = [UpdateMany({'name': name}, {'$set': fields}) for name, fields in updates.items()]
+        try:
+            self.mongo_client.bulk_write(self.database, self.collection, operations, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            self.last_error = str(e)
+            print(f"MongoDB write-behind failed for {len(batch)} updates: {e}")
+
+    def flush(self):
+        self.queue.join()
+
+    def stats(self):
+        return {'pending': self.queue.qsize(), 'written': self.written, 'failed': self.failed}
+
+
+def apply_updates(rows, batch_size=BATCH_SIZE, write_behind=None, database="academicworld"):
+    """
+    Validate rows and apply the valid ones to Neo4j in UNWIND batches, one transaction per
+    batch. A failed batch marks all of its rows failed and the other batches still run.
+
+    :param rows: rows from parse_rows
+    :param write_behind: optional MongoWriteBehind the updated rows are also sent to
+    :return: (report, summary), report has one entry per row with its status:
+             updated, not_found, invalid or failed
+    """
+    valid, report = validate(rows)
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        # only the cached reads of the faculty in this batch are dropped
+        tags = {('neo4j', 'Faculty', 'name', row['name']) for row in batch}
+        try:
+            records = neo4jDB.write_transaction(UPDATE_QUERY, {'rows': batch}, database, tags=tags)
+        except Exception as e:
+            report.extend({'row': row['row'], 'name': row['name'], 'status': 'failed', 'error': str(e)} for row in batch)
+            continue
+        matched = {record['row'] for record in records if record['matched']}
+        for row in batch:
+            status = 'updated' if row['row'] in matched else 'not_found'
+            report.append({'row': row['row'], 'name': row['name'], 'status': status, 'error': None})
+        if write_behind is not None:
+            write_behind.submit([row for row in batch if row['row'] in matched])
+    report.sort(key=lambda entry: entry['row'])
+    summary = {status: 0 for status in ('updated', 'not_found', 'invalid', 'failed')}
+    for entry in report:
+        summary[entry['status']] += 1
+    return report, summary
+
+
+def decode_upload(contents):
+    """
+    Text of a dcc.Upload contents string ("data:<type>;base64,<data>").
+    """
+    _, data = contents.split(',', 1)
+    return base64.b64decode(data).decode('utf-8-sig')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply faculty email and phone updates from a CSV or JSON file.")
+    parser.add_argument('path', help="CSV with a header (name, email, phone) or JSON list of objects")
+    parser.add_argument('--format', choices=('csv', 'json'), help="defaults to the file extension")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument('--mongo', action='store_true', help="also update the MongoDB faculty collection")
+    parser.add_argument('--dry-run', action='store_true', help="only validate the rows")
+    parser.add_argument('--report', help="write the per row report to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.path, encoding='utf-8-sig') as f:
+        rows = parse_rows(f.read(), args.format or format_for(args.path))
+    if args.dry_run:
+        valid, report = validate(rows)
+        summary = {'valid': len(valid), 'invalid': len(report)}
+    else:
+        write_behind = None
+        if args.mongo:
+            import mongodb_utils
+            write_behind = MongoWriteBehind(mongodb_utils.MongoDBClient())
+        report, summary = apply_updates(rows, args.batch_size, write_behind)
+        if write_behind is not None:
+            write_behind.flush()
+            summary['mongo_failed'] = write_behind.failed
+    for entry in report:
+        if entry['status'] != 'updated':
+            print(f"row {entry['row']} ({entry['name']}): {entry['status']}{': ' + entry['error'] if entry['error'] else ''}")
+    print(', '.join(f"{status}: {count}" for status, count in summary.items()))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'summary': summary, 'rows': report}, f, indent=2)
+    return 1 if summary.get('invalid') or summary.get('failed') or summary.get('mongo_failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
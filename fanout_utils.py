@@ -0,0 +1,101 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flight_utils import Superseded
+
+# seconds a single query may take before the callback gives up on it
+DEFAULT_TIMEOUT = 10
+MAX_WORKERS = 16
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(name='fanout', max_workers=MAX_WORKERS):
+    """
+    Shared thread pools by name. Work that itself fans out (index builds) uses its own
+    pool so it can never wait on a slot held by the callback that triggered it.
+    """
+    if name not in _executors:
+        with _executor_lock:
+            if name not in _executors:
+                _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+    return _executors[name]
+
+
+class FanOutResult:
+    def __init__(self, results, timed_out, errors, elapsed):
+        self.results = results
+        self.timed_out = timed_out
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return set(self.timed_out) | set(self.errors)
+
+    @property
+    def complete(self):
+        return not self.failed
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+
+def fan_out(tasks, timeout=DEFAULT_TIMEOUT, defaults=None, pool='fanout'):
+    """
+    Run independent queries concurrently and wait for all of them, each up to its own timeout.
+
+    Queries that time out or fail get their default value (None unless given in defaults)
+    so the caller can render partial results. A timed out query keeps running in the
+    background, its result is discarded.
+
+    :param tasks: dict of name -> callable, or name -> (callable, timeout in seconds or None)
+    :param timeout: timeout for tasks that do not give their own, None to wait indefinitely
+    :param defaults: dict of name -> value used for timed out or failed tasks
+    :param pool: name of the shared thread pool to run in
+    :return: FanOutResult with results, timed_out and errors
+    """
+    defaults = defaults or {}
+    start = time.monotonic()
+    executor = get_executor(pool)
+    futures = {}
+    deadlines = {}
+    for name, task in tasks.items():
+        fn, task_timeout = task if isinstance(task, tuple) else (task, timeout)
+        # each task runs in a copy of the caller's context so query metrics keep the originating callback
+        futures[name] = executor.submit(contextvars.copy_context().run, fn)
+        deadlines[name] = None if task_timeout is None else start + task_timeout
+
+    results = {}
+    errors = {}
+    timed_out = set()
+    pending = dict(futures)
+    while pending:
+        now = time.monotonic()
+        # anything past its deadline is given up on
+        for name in [n for n in pending if deadlines[n] is not None and deadlines[n] <= now]:
+            pending.pop(name).cancel()
+            timed_out.add(name)
+        if not pending:
+            break
+        next_deadline = min((deadlines[n] for n in pending if deadlines[n] is not None), default=None)
+        done, _ = wait(list(pending.values()), timeout=None if next_deadline is None else max(next_deadline - now, 0),
+                       return_when=FIRST_COMPLETED)
+        for name in [n for n, f in pending.items() if f in done]:
+            future = pending.pop(name)
+            try:
+                results[name] = future.result()
+            except Superseded:
+                # the whole callback is stale, there is nothing to render
+                raise
+            except Exception as e:
+                errors[name] = e
+                print(f"Query {name} failed: {e}")
+
+    for name in timed_out:
+        print(f"Query {name} timed out")
+    for name in list(timed_out) + list(errors):
+        results[name] = defaults.get(name)
+    return FanOutResult(results, timed_out, errors, time.monotonic() - start)
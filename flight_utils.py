@@ -0,0 +1,172 @@
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from pool_utils import PoolTimeout
+
+# queries each database may run at the same time, the rest wait up to QUEUE_TIMEOUT seconds for a slot
+MAX_CONCURRENT = {
+    'mysql': int(os.environ.get('DASHBOARD_MAX_MYSQL_QUERIES', 5)),
+    'neo4j': int(os.environ.get('DASHBOARD_MAX_NEO4J_QUERIES', 16)),
+    'mongo': int(os.environ.get('DASHBOARD_MAX_MONGO_QUERIES', 16)),
+}
+QUEUE_TIMEOUT = 10
+
+# (client, widget, generation) of the callback request being served, None outside a request
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class Superseded(Exception):
+    """
+    The callback request was replaced by a newer one from the same client for the same widget.
+    """
+
+
+class Overloaded(PoolTimeout):
+    """
+    No query slot for the backend freed up within the queue timeout.
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Concurrent calls with the same key share one execution: the first caller runs the
+        function, the others wait for it and get the same result (or exception).
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, Superseded):
+                # the leader's own request went stale, that says nothing about ours
+                return self.do(key, fn)
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._calls)}
+
+
+class RequestTracker:
+    def __init__(self):
+        """
+        Latest callback request per (client, widget). A request that is no longer the latest
+        is stale, and check() stops it before its next query.
+        """
+        self._lock = threading.Lock()
+        self._latest = {}
+        self.superseded = 0
+
+    def begin(self, client, widget):
+        key = (client, widget)
+        with self._lock:
+            generation = self._latest.get(key, 0) + 1
+            self._latest[key] = generation
+        return key + (generation,)
+
+    def end(self, request):
+        client, widget, generation = request
+        with self._lock:
+            # forget finished requests so the table only holds clients that are active
+            if self._latest.get((client, widget)) == generation:
+                del self._latest[(client, widget)]
+
+    def is_current(self, request):
+        client, widget, generation = request
+        with self._lock:
+            return self._latest.get((client, widget), generation) == generation
+
+    def check(self):
+        request = current_request.get()
+        if request is not None and not self.is_current(request):
+            with self._lock:
+                self.superseded += 1
+            raise Superseded(f"{request[1]} was superseded by a newer request")
+
+    def stats(self):
+        with self._lock:
+            return {'active': len(self._latest), 'superseded': self.superseded}
+
+
+class BackendLimits:
+    def __init__(self, limits=None, timeout=QUEUE_TIMEOUT):
+        """
+        Caps the number of concurrent queries per backend so a burst of callbacks queues
+        in the app instead of piling onto the databases.
+        """
+        self.limits = dict(limits or MAX_CONCURRENT)
+        self.timeout = timeout
+        self._semaphores = {name: threading.BoundedSemaphore(n) for name, n in self.limits.items()}
+        self._lock = threading.Lock()
+        self.running = {name: 0 for name in self.limits}
+        self.waiting = {name: 0 for name in self.limits}
+        self.rejected = {name: 0 for name in self.limits}
+
+    @contextmanager
+    def slot(self, backend):
+        # stale requests are dropped before they wait for a slot and again once they have one
+        request_tracker.check()
+        semaphore = self._semaphores[backend]
+        with self._lock:
+            self.waiting[backend] += 1
+        acquired = semaphore.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting[backend] -= 1
+            if not acquired:
+                self.rejected[backend] += 1
+        if not acquired:
+            raise Overloaded(f"no {backend} query slot after {self.timeout}s ({self.limits[backend]} running)")
+        try:
+            request_tracker.check()
+            with self._lock:
+                self.running[backend] += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.running[backend] -= 1
+        finally:
+            semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {f"{stat}_{name}": values[name] for stat, values in
+                    (('running', self.running), ('waiting', self.waiting), ('rejected', self.rejected))
+                    for name in self.limits}
+
+
+single_flight = SingleFlight()
+request_tracker = RequestTracker()
+limits = BackendLimits()
@@ -0,0 +1,267 @@
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import neo4j_utils as neo4jDB
+from flight_utils import single_flight
+from snapshot_utils import sparse_arrays, sparse_from
+
+# bulk exports the projection is built from, streamed BATCH_SIZE records at a time
+FACULTY_QUERY = """
+MATCH (f:Faculty)
+RETURN f.id AS id, f.name AS name
+"""
+
+PUBLISH_QUERY = """
+MATCH (f:Faculty)-[:PUBLISH]->(p:Publication)
+RETURN f.id AS faculty, p.id AS publication
+"""
+
+LABEL_QUERY = """
+MATCH (p:Publication)-[:LABEL_BY]->(k:KEYWORD)
+RETURN p.id AS publication, k.name AS keyword
+"""
+
+# relationship counts come from the count store, a cheap way to tell whether the graph changed;
+# each count is its own subquery so one of them being empty still returns a row
+FINGERPRINT_QUERY = """
+CALL { MATCH ()-[r:PUBLISH]->() RETURN count(r) AS publish }
+CALL { MATCH ()-[l:LABEL_BY]->() RETURN count(l) AS labels }
+RETURN publish, labels
+"""
+
+# hops searched for a collaboration path before giving up
+MAX_DEPTH = 6
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_ITERATIONS = 100
+# keyword centrality rankings kept per snapshot
+CENTRALITY_CACHE = 256
+
+
+def _frame(query, columns):
+    return pd.DataFrame(list(neo4jDB.stream_query(query)), columns=columns)
+
+
+def pagerank(A, damping=PAGERANK_DAMPING, tol=PAGERANK_TOLERANCE, max_iter=PAGERANK_ITERATIONS):
+    """
+    Weighted PageRank by power iteration over a symmetric CSR adjacency matrix. Rank of
+    nodes without edges is spread evenly over all nodes.
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    dangling = strength == 0
+    # column stochastic transition, applied as a product with the transpose of the scaled rows
+    P = (sparse.diags(np.where(dangling, 0, 1 / np.maximum(strength, 1e-12))) @ A).T.tocsr()
+    rank = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        spread = rank[dangling].sum() / n
+        updated = damping * (P @ rank + spread) + (1 - damping) / n
+        done = np.abs(updated - rank).sum() < tol
+        rank = updated
+        if done:
+            break
+    return rank
+
+
+class CoauthorGraph:
+    def __init__(self):
+        """
+        In memory projection of the Neo4j faculty-publication-faculty graph for path,
+        neighborhood and centrality lookups.
+
+        The PUBLISH and LABEL_BY relationships are exported in bulk and turned into a faculty
+        x faculty co-authorship matrix in CSR form (indptr, indices and data arrays, the
+        weight of an edge is the number of shared publications) and a faculty x keyword
+        matrix of publication counts. Breadth first search and PageRank run over those arrays
+        a whole frontier or iteration at a time, instead of as variable length Cypher
+        traversals per request.
+        """
+        self._lock = threading.Lock()
+        self.fingerprint = None
+        self.state = None
+
+    @property
+    def ready(self):
+        return self.state is not None
+
+    def _fingerprint(self):
+        rows = list(neo4jDB.stream_query(FINGERPRINT_QUERY, limit=1))
+        if not rows:
+            return None
+        return tuple(int(value or 0) for value in rows[0].values())
+
+    def build(self):
+        fingerprint = self._fingerprint()
+        faculty = _frame(FACULTY_QUERY, ['id', 'name']).dropna().drop_duplicates('id')
+        if fingerprint is None or faculty.empty:
+            return False
+        published = _frame(PUBLISH_QUERY, ['faculty', 'publication']).dropna().drop_duplicates()
+        labels = _frame(LABEL_QUERY, ['publication', 'keyword']).dropna().drop_duplicates()
+
+        names = faculty['name'].to_numpy(str)
+        rows = pd.Index(faculty['id']).get_indexer(published['faculty'])
+        published = published[rows >= 0]
+        rows = rows[rows >= 0]
+        publications, cols = np.unique(published['publication'].to_numpy(), return_inverse=True)
+        # faculty x publication incidence, co-authors share a column
+        B = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                              shape=(len(names), len(publications)))
+        A = (B @ B.T).tocsr()
+        A.setdiag(0)
+        A.eliminate_zeros()
+
+        label_rows = pd.Index(publications).get_indexer(labels['publication'])
+        labels = labels[label_rows >= 0]
+        label_rows = label_rows[label_rows >= 0]
+        keywords, label_cols = np.unique(labels['keyword'].to_numpy(str), return_inverse=True)
+        L = sparse.csr_matrix((np.ones(len(label_rows), dtype=np.float32), (label_rows, label_cols)),
+                              shape=(len(publications), len(keywords)))
+        state = {
+            'A': A,
+            'names': names,
+            # the first node wins when two faculty share a name
+            'lookup': {name: i for i, name in reversed(list(enumerate(names)))},
+            # publications per faculty and keyword, column access for the keyword rankings
+            'faculty_keywords': (B @ L).tocsc(),
+            'keywords': {keyword: j for j, keyword in enumerate(keywords)},
+            'centrality': {},
+        }
+        with self._lock:
+            self.state = state
+            self.fingerprint = fingerprint
+        return True
+
+    def export_state(self):
+        state = self.state
+        if state is None:
+            return {}, None
+        keywords = np.array(sorted(state['keywords'], key=state['keywords'].get), dtype=str)
+        arrays = dict(sparse_arrays('A', state['A']), **sparse_arrays('faculty_keywords', state['faculty_keywords']),
+                      names=state['names'], keywords=keywords)
+        return arrays, {'fingerprint': self.fingerprint}
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        names = arrays['names']
+        state = {
+            'A': sparse_from(arrays, 'A'),
+            'names': names,
+            'lookup': {name: i for i, name in reversed(list(enumerate(names.tolist())))},
+            'faculty_keywords': sparse_from(arrays, 'faculty_keywords', 'csc'),
+            'keywords': {keyword: j for j, keyword in enumerate(arrays['keywords'].tolist())},
+            'centrality': {},
+        }
+        with self._lock:
+            self.state = state
+            self.fingerprint = tuple(document['fingerprint'])
+
+    def refresh(self):
+        # concurrent refreshes share one fingerprint check and build
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if self.ready and self.fingerprint is not None and self._fingerprint() == self.fingerprint:
+            return 'unchanged'
+        return 'built' if self.build() else 'failed'
+
+    def _state(self):
+        if not self.ready:
+            self.refresh()
+        return self.state
+
+    def _levels(self, A, source, max_depth, target=None):
+        """
+        Breadth first search from source, one frontier per step. Yields (frontier, parents of
+        the frontier, edge weights from the previous frontier) and stops at target.
+        """
+        parent = np.full(A.shape[0], -1)
+        parent[source] = source
+        frontier = np.array([source])
+        for _ in range(max_depth):
+            sub = A[frontier]
+            if not sub.nnz:
+                return
+            owners = np.repeat(frontier, np.diff(sub.indptr))
+            fresh = parent[sub.indices] == -1
+            reached, first = np.unique(sub.indices[fresh], return_index=True)
+            if not len(reached):
+                return
+            parent[reached] = owners[fresh][first]
+            weights = np.bincount(sub.indices[fresh], weights=sub.data[fresh], minlength=A.shape[0])[reached]
+            yield reached, parent, weights
+            if target is not None and parent[target] != -1:
+                return
+            frontier = reached
+
+    def shortest_path(self, source_name, target_name, max_depth=MAX_DEPTH):
+        """
+        Fewest co-authorship hops from source_name to target_name.
+
+        :return: list of (faculty, publications shared with the previous faculty), starting with
+                 (source_name, 0), or [] when they are not connected within max_depth hops
+        """
+        state = self._state()
+        if state is None or source_name not in state['lookup'] or target_name not in state['lookup']:
+            return []
+        source, target = state['lookup'][source_name], state['lookup'][target_name]
+        if source == target:
+            return [(source_name, 0)]
+        A = state['A']
+        for _, parent, _ in self._levels(A, source, max_depth, target):
+            if parent[target] == -1:
+                continue
+            path = [target]
+            while path[-1] != source:
+                path.append(parent[path[-1]])
+            path.reverse()
+            return [(str(state['names'][path[0]]), 0)] + [
+                (str(state['names'][b]), int(A[a, b])) for a, b in zip(path, path[1:])
+            ]
+        return []
+
+    def neighborhood(self, faculty_name, hops=1, limit=50):
+        """
+        Faculty within hops co-authorship steps of faculty_name, nearest first.
+
+        :return: list of (faculty, distance, publications linking them to the previous ring),
+                 for distance 1 that is the number of publications shared with faculty_name
+        """
+        state = self._state()
+        if state is None or faculty_name not in state['lookup']:
+            return []
+        results = []
+        for distance, (reached, _, weights) in enumerate(
+                self._levels(state['A'], state['lookup'][faculty_name], hops), start=1):
+            order = np.lexsort((state['names'][reached], -weights))
+            results.extend((str(state['names'][reached[i]]), distance, int(weights[i])) for i in order)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def central_faculty(self, keyword, k=10):
+        """
+        The k most central faculty within keyword: PageRank over the co-authorship graph of the
+        faculty with publications labeled keyword.
+
+        :return: list of (faculty, score, publications with the keyword), best first
+        """
+        state = self._state()
+        if state is None or keyword not in state['keywords']:
+            return []
+        ranking = state['centrality'].get(keyword)
+        if ranking is None:
+            column = state['faculty_keywords'][:, state['keywords'][keyword]]
+            members, counts = column.indices, column.data
+            rank = pagerank(state['A'][members][:, members])
+            # ties (e.g. faculty without co-authors in the keyword) go to the more prolific one
+            order = np.lexsort((state['names'][members], -counts, -np.round(rank, 12)))
+            ranking = [(str(state['names'][members[i]]), float(rank[i]), int(counts[i])) for i in order]
+            with self._lock:
+                if len(state['centrality']) >= CENTRALITY_CACHE:
+                    state['centrality'].clear()
+                state['centrality'][keyword] = ranking
+        return ranking[:k]
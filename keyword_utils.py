@@ -0,0 +1,302 @@
+import os
+import threading
+import time
+import uuid
+import mysql_utils as sqlDB
+from flight_utils import single_flight
+from fanout_utils import fan_out
+from snapshot_utils import GroupedRows, grouped_arrays, grouped_from
+
+# number of entries kept per keyword in the top-k lists
+TOP_K = 100
+# seconds before the index checks whether the underlying tables changed
+MAX_AGE = 3600
+MONGO_TOP_PUBLICATIONS = "keyword_top_publications"
+# the document of the materialized collection recording which publications it was built from
+MONGO_FINGERPRINT_ID = "__fingerprint__"
+MONGO_FINGERPRINT_PIPELINE = [
+    {"$group": {
+        "_id": None,
+        "publications": {"$sum": 1},
+        "citations": {"$sum": "$numCitations"},
+        "keywords": {"$sum": {"$size": {"$ifNull": ["$keywords", []]}}},
+        "max_id": {"$max": "$id"}
+    }}
+]
+
+KEYWORD_UNIVERSITY_QUERY = """
+SELECT k.name AS keyword, university.name AS name,
+    COUNT(DISTINCT faculty.id) AS num_faculty, COUNT(DISTINCT publication.id) AS num_publications
+FROM university
+JOIN faculty ON university.id = faculty.university_id
+JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+JOIN publication ON publication.id = fp.publication_Id
+JOIN Publication_Keyword pk ON publication.id = pk.publication_id
+JOIN keyword k ON k.id = pk.keyword_id
+GROUP BY k.name, university.name
+"""
+
+KEYWORD_FACULTY_QUERY = """
+SELECT k.name AS keyword, faculty.name AS name,
+    COUNT(DISTINCT publication.id) AS num_publications, SUM(publication.num_citations) AS num_citations
+FROM faculty
+JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+JOIN publication ON publication.id = fp.publication_Id
+JOIN Publication_Keyword pk ON publication.id = pk.publication_id
+JOIN keyword k ON k.id = pk.keyword_id
+GROUP BY k.name, faculty.name
+"""
+
+FINGERPRINT_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM Publication_Keyword) AS publication_keywords,
+    (SELECT COUNT(*) FROM faculty_publication) AS faculty_publications,
+    (SELECT COALESCE(SUM(num_citations), 0) FROM publication) AS citations,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name, ':', COALESCE(university_id, '')))), 0) FROM faculty) AS faculty_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0) FROM keyword) AS keyword_checksum
+"""
+
+
+# the lookups of the index, in the order _install takes them
+GROUPS = ('keyword_universities', 'keyword_faculty', 'university_keywords', 'faculty_keywords')
+
+
+def paginate(grouped, key, page=1, page_size=10):
+    page = max(int(page or 1), 1)
+    return grouped.rows(key, (page - 1) * page_size, page * page_size)
+
+
+class KeywordIndex:
+    def __init__(self, fetch=None, top_k=TOP_K, max_age=MAX_AGE):
+        """
+        Inverted indexes over the keyword <-> publication <-> faculty <-> university joins.
+
+        Two grouped queries over the whole corpus produce every list the keyword widgets need:
+        per keyword top universities and top faculty, per university keyword histograms and
+        per faculty interests. Lookups are then dictionary reads into flat arrays
+        (snapshot_utils.GroupedRows), which shared snapshot readers map instead of copying.
+
+        :param fetch: query function with the same signature as mysql_utils.fetch_data
+        :param top_k: entries kept per keyword for the top universities and faculty lists
+        :param max_age: seconds between checks of whether the tables changed
+        """
+        self.fetch = fetch or sqlDB.fetch_data
+        self.top_k = top_k
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.built_at = None
+        self.fingerprint = None
+        self.keyword_universities = GroupedRows.from_dict({}, 3)
+        self.keyword_faculty = GroupedRows.from_dict({}, 3)
+        self.university_keywords = GroupedRows.from_dict({}, 2)
+        self.faculty_keywords = GroupedRows.from_dict({}, 1)
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def _fingerprint(self):
+        df = self.fetch(FINGERPRINT_QUERY, cache=False)
+        if df.empty:
+            return None
+        return tuple(int(value) for value in df.iloc[0])
+
+    def build(self, fingerprint=None):
+        # taken before the loads, a change made while they run leaves an older fingerprint
+        # behind and the next refresh rebuilds instead of missing it
+        if fingerprint is None:
+            fingerprint = self._fingerprint()
+        if fingerprint is None:
+            return False
+        loaded = fan_out({
+            'universities': lambda: self.fetch(KEYWORD_UNIVERSITY_QUERY, cache=False),
+            'faculty': lambda: self.fetch(KEYWORD_FACULTY_QUERY, cache=False)
+        }, timeout=None, pool='bulk-load')
+        if not loaded.complete:
+            return False
+        df_universities, df_faculty = loaded['universities'], loaded['faculty']
+        if df_universities.empty:
+            return False
+
+        keyword_universities = {}
+        university_keywords = {}
+        for keyword, name, num_faculty, num_publications in df_universities.itertuples(index=False):
+            keyword_universities.setdefault(keyword, []).append((name, int(num_faculty), int(num_publications)))
+            university_keywords.setdefault(name, []).append((keyword, int(num_publications)))
+
+        keyword_faculty = {}
+        faculty_keywords = {}
+        for keyword, name, num_publications, num_citations in df_faculty.itertuples(index=False):
+            keyword_faculty.setdefault(keyword, []).append((name, int(num_publications), int(num_citations or 0)))
+            faculty_keywords.setdefault(name, []).append(keyword)
+
+        # same orderings as the queries the widgets used to run
+        for keyword, rows in keyword_universities.items():
+            rows.sort(key=lambda r: (-r[2], -r[1], r[0]))
+            keyword_universities[keyword] = rows[:self.top_k]
+        for keyword, rows in keyword_faculty.items():
+            rows.sort(key=lambda r: (-r[1], -r[2], r[0]))
+            keyword_faculty[keyword] = rows[:self.top_k]
+        for rows in university_keywords.values():
+            rows.sort(key=lambda r: (-r[1], r[0]))
+
+        self._install(GroupedRows.from_dict(keyword_universities, 3), GroupedRows.from_dict(keyword_faculty, 3),
+                      GroupedRows.from_dict(university_keywords, 2), GroupedRows.from_dict(faculty_keywords, 1),
+                      fingerprint)
+        return True
+
+    def _install(self, keyword_universities, keyword_faculty, university_keywords, faculty_keywords, fingerprint):
+        with self._lock:
+            self.keyword_universities = keyword_universities
+            self.keyword_faculty = keyword_faculty
+            self.university_keywords = university_keywords
+            self.faculty_keywords = faculty_keywords
+            self.fingerprint = fingerprint
+            self.built_at = time.monotonic()
+
+    def export_state(self):
+        if not self.ready:
+            return {}, None
+        arrays = {}
+        for name in GROUPS:
+            arrays.update(grouped_arrays(name, getattr(self, name)))
+        return arrays, {'fingerprint': self.fingerprint}
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        self._install(*(grouped_from(arrays, name) for name in GROUPS), tuple(document['fingerprint']))
+
+    def refresh(self):
+        # concurrent refreshes share one fingerprint check and build
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if not self.ready:
+            return self.build()
+        fingerprint = self._fingerprint()
+        if fingerprint != self.fingerprint:
+            return self.build(fingerprint)
+        self.built_at = time.monotonic()
+        return True
+
+    def _ensure_fresh(self):
+        if not self.ready or time.monotonic() - self.built_at > self.max_age:
+            self.refresh()
+
+    def top_universities(self, keyword, page=1, page_size=10):
+        """
+        [(university, num_faculty, num_publications)] for a keyword.
+        """
+        self._ensure_fresh()
+        return paginate(self.keyword_universities, keyword, page, page_size)
+
+    def top_faculty(self, keyword, page=1, page_size=10):
+        """
+        [(faculty, num_publications, num_citations)] for a keyword.
+        """
+        self._ensure_fresh()
+        return paginate(self.keyword_faculty, keyword, page, page_size)
+
+    def university_research_areas(self, university, page=1, page_size=10):
+        """
+        [(keyword, publication_count)] histogram for a university.
+        """
+        self._ensure_fresh()
+        return paginate(self.university_keywords, university, page, page_size)
+
+    def faculty_interests(self, faculty_name):
+        self._ensure_fresh()
+        return self.faculty_keywords.rows(faculty_name)
+
+
+def mongo_publications_fingerprint(mongo_client, database="academicworld"):
+    """
+    Counts and sums over the publications collection, read uncached. None if it could not be read.
+    """
+    rows = list(mongo_client.stream_aggregate(database, "publications", MONGO_FINGERPRINT_PIPELINE))
+    if not rows:
+        return None
+    return {key: rows[0].get(key) for key in ('publications', 'citations', 'keywords', 'max_id')}
+
+
+def build_mongo_top_publications(mongo_client, top_k=TOP_K, database="academicworld", fingerprint=None):
+    """
+    Materialize the top cited publications of every keyword into their own collection,
+    one document per keyword: {_id: keyword, publications: [...]}, plus a document holding
+    the fingerprint of the publications it was built from. The collection is written to a
+    staging collection of its own with $out and renamed over the old one, so readers never
+    see it half built and keywords that no longer exist are gone.
+    """
+    # unique per build, so two builders (e.g. two app processes) never share a staging collection
+    staging = f"{MONGO_TOP_PUBLICATIONS}_staging_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    pipeline = [
+        {"$unwind": "$keywords"},
+        {"$sort": {"numCitations": -1}},
+        {"$group": {
+            "_id": "$keywords.name",
+            "publications": {"$push": {"title": "$title", "numCitations": "$numCitations"}}
+        }},
+        {"$project": {"publications": {"$slice": ["$publications", top_k]}}},
+        {"$out": staging}
+    ]
+    try:
+        mongo_client.aggregate(database, "publications", pipeline, allowDiskUse=True)
+        mongo_client.replace_one(database, staging, {"_id": MONGO_FINGERPRINT_ID},
+                                 {"_id": MONGO_FINGERPRINT_ID, "fingerprint": fingerprint})
+        mongo_client.rename(database, staging, MONGO_TOP_PUBLICATIONS)
+    except Exception:
+        # the old collection is kept, only the half built staging one is dropped
+        try:
+            mongo_client.drop(database, staging)
+        except Exception as e:
+            print(f"Could not drop {staging}: {e}")
+        raise
+
+
+def _stored_fingerprint(mongo_client, database):
+    documents = list(mongo_client.stream(database, MONGO_TOP_PUBLICATIONS, {"_id": MONGO_FINGERPRINT_ID},
+                                         {"_id": 0, "fingerprint": 1}, limit=1))
+    return documents[0].get("fingerprint") if documents else None
+
+
+_mongo_checked_at = None
+
+
+def _refresh_mongo_top_publications(mongo_client, database):
+    global _mongo_checked_at
+    fingerprint = mongo_publications_fingerprint(mongo_client, database)
+    if fingerprint is None:
+        return 'failed'
+    # a collection left by an earlier run is only reused if it was built from the same publications
+    status = 'unchanged'
+    if _stored_fingerprint(mongo_client, database) != fingerprint:
+        try:
+            build_mongo_top_publications(mongo_client, database=database, fingerprint=fingerprint)
+        except Exception as e:
+            # a failed build keeps the old collection, the next refresh tries again
+            print(f"Query failed: {e}")
+            return 'failed'
+        status = 'built'
+    _mongo_checked_at = time.monotonic()
+    return status
+
+
+def refresh_mongo_top_publications(mongo_client, max_age=MAX_AGE, database="academicworld"):
+    """
+    Check the publications fingerprint, at most every max_age seconds, and rebuild the
+    keyword_top_publications collection if it changed. Run by the precompute scheduler of
+    the process that owns the data (never by the shared snapshot readers), not by the widgets.
+    Returns 'built', 'unchanged', 'fresh' (checked recently) or 'failed'.
+    """
+    if _mongo_checked_at is not None and time.monotonic() - _mongo_checked_at <= max_age:
+        return 'fresh'
+    return single_flight.do(('mongo_top_publications', database), lambda: _refresh_mongo_top_publications(mongo_client, database))
+
+
+def mongo_top_publications(mongo_client, keyword, page=1, page_size=5, database="academicworld"):
+    # only reads, the collection is kept up to date by refresh_mongo_top_publications
+    page = max(int(page or 1), 1)
+    projection = {"_id": 0, "publications": {"$slice": [(page - 1) * page_size, page_size]}}
+    result = mongo_client.find(database, MONGO_TOP_PUBLICATIONS, {"_id": keyword}, projection)
+    return result[0]["publications"] if result else []
@@ -0,0 +1,204 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# queries slower than this are written to the slow query log with their plan
+SLOW_QUERY_MS = float(os.environ.get('DASHBOARD_SLOW_QUERY_MS', 500))
+SLOW_QUERY_LOG = os.environ.get('DASHBOARD_SLOW_QUERY_LOG', 'slow_queries.log')
+# a query shape's plan is captured at most once per this many seconds
+SLOW_PLAN_INTERVAL = float(os.environ.get('DASHBOARD_SLOW_PLAN_INTERVAL', 300))
+# slow queries waiting to be logged beyond this are dropped (and counted)
+SLOW_QUEUE = 100
+# latency histogram bucket bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RECENT_SAMPLES = 1000
+
+# the Dash callback (its output id) the current query runs on behalf of
+current_widget = contextvars.ContextVar('current_widget', default=None)
+
+_NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+
+
+def fingerprint(query):
+    """
+    Short stable id for a query shape: whitespace collapsed and literals replaced by ?.
+    Mongo queries are given as (collection, filter or pipeline) and fingerprinted on their keys only.
+    """
+    if isinstance(query, str):
+        text = _NUMBER.sub('?', _STRING.sub('?', ' '.join(query.split())))
+    else:
+        collection, query = query
+        text = f"{collection} {json.dumps(_shape(query), sort_keys=True)}"
+    return hashlib.md5(text.encode()).hexdigest()[:12], text
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(v) for v in value]
+    return '?'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.n = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, ms):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += ms
+        self.n += 1
+        self.recent.append(ms)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+    def summary(self):
+        return {'count': self.n, 'mean_ms': self.total / self.n if self.n else 0.0,
+                'p50_ms': self.percentile(50), 'p95_ms': self.percentile(95), 'p99_ms': self.percentile(99),
+                'buckets': dict(zip([str(b) for b in BUCKETS_MS] + ['+Inf'], self.counts))}
+
+
+class QueryMetrics:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG, plan_interval=SLOW_PLAN_INTERVAL):
+        """
+        Timing and tracing for every database call made by mysql_utils, neo4j_utils and
+        mongodb_utils, and for every Dash callback.
+
+        Each query record has the originating callback, the query fingerprint, the number of
+        rows returned, the connection (checkout) time and the execution time. Queries slower
+        than slow_query_ms are appended to the slow query log by one background thread, with
+        their EXPLAIN/explain() plan at most once per fingerprint every plan_interval seconds
+        (the plan only, the query is not run again).
+        """
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.plan_interval = plan_interval
+        self.slow_dropped = 0
+        self._explained = {}
+        self._pending = 0
+        self._logger = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-log')
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.slow = deque(maxlen=100)
+        self.queries = {}
+        self.by_backend = {}
+        self.widgets = {}
+
+    def record(self, backend, query, rows, connect_time, exec_time, explain=None):
+        """
+        :param backend: 'mysql', 'neo4j' or 'mongo'
+        :param query: query text, or the Mongo filter/pipeline
+        :param rows: number of rows or documents returned
+        :param connect_time: seconds spent getting a connection
+        :param exec_time: seconds spent running the query and reading the results
+        :param explain: callable returning the query plan, only called for slow queries
+        """
+        key, text = fingerprint(query)
+        widget = current_widget.get()
+        total_ms = (connect_time + exec_time) * 1000
+        entry = {'time': time.time(), 'backend': backend, 'widget': widget, 'fingerprint': key, 'rows': rows,
+                 'connect_ms': connect_time * 1000, 'exec_ms': exec_time * 1000}
+        with self._lock:
+            self.recent.append(entry)
+            self.by_backend.setdefault(backend, Histogram()).observe(total_ms)
+            stats = self.queries.setdefault(key, {'backend': backend, 'query': text, 'histogram': Histogram(),
+                                                  'rows': 0, 'widgets': set()})
+            stats['histogram'].observe(total_ms)
+            stats['rows'] += rows
+            if widget:
+                stats['widgets'].add(widget)
+        if total_ms >= self.slow_query_ms:
+            now = time.monotonic()
+            with self._lock:
+                if self._pending >= SLOW_QUEUE:
+                    self.slow_dropped += 1
+                    return
+                self._pending += 1
+                if explain is not None and now - self._explained.get(key, -self.plan_interval) < self.plan_interval:
+                    explain = None
+                elif explain is not None:
+                    self._explained[key] = now
+            self._logger.submit(self._log_slow, entry, text, explain)
+
+    def _log_slow(self, entry, text, explain):
+        try:
+            self._write_slow(entry, text, explain)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _write_slow(self, entry, text, explain):
+        slow = dict(entry, query=text)
+        if explain is not None:
+            try:
+                slow['plan'] = explain()
+            except Exception as e:
+                slow['plan_error'] = str(e)
+        with self._lock:
+            self.slow.append(slow)
+        if self.slow_query_log:
+            try:
+                with open(self.slow_query_log, 'a') as f:
+                    f.write(json.dumps(slow, default=str) + '\n')
+            except OSError as e:
+                print(f"Could not write slow query log: {e}")
+
+    def record_callback(self, widget, seconds):
+        with self._lock:
+            self.widgets.setdefault(widget, Histogram()).observe(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'backends': {name: h.summary() for name, h in self.by_backend.items()},
+                'widgets': {name: h.summary() for name, h in self.widgets.items()},
+                'queries': {key: {'backend': s['backend'], 'query': s['query'], 'rows': s['rows'],
+                                  'widgets': sorted(s['widgets']), **s['histogram'].summary()}
+                            for key, s in self.queries.items()},
+                'slow': list(self.slow),
+                'slow_dropped': self.slow_dropped,
+            }
+
+    def prometheus(self, extra=None):
+        """
+        Metrics in the Prometheus text exposition format. extra maps a metric name prefix to
+        a flat dict of numbers (pool and cache counters).
+        """
+        lines = []
+        with self._lock:
+            series = [('dashboard_query_latency_ms', 'backend', self.by_backend),
+                      ('dashboard_callback_latency_ms', 'widget', self.widgets)]
+            for metric, label, histograms in series:
+                lines.append(f"# TYPE {metric} histogram")
+                for name, h in histograms.items():
+                    cumulative = 0
+                    for bound, count in zip([str(b) for b in BUCKETS_MS] + ['+Inf'], h.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {h.total}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {h.n}')
+        for prefix, values in (extra or {}).items():
+            for name, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"dashboard_{prefix}_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = QueryMetrics()
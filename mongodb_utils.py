@@ -1,8 +1,14 @@
+import time
 from pymongo import MongoClient
+from cache_utils import query_cache, make_key, mongo_tags
+from metrics_utils import metrics
+from flight_utils import limits
 
 
 # Replace the URI string with your MongoDB deployment's connection string.
 uri = "mongodb://localhost:27017/"
+# documents returned per round trip when streaming
+BATCH_SIZE = 1000
 
 
 class MongoDBClient:
@@ -15,11 +21,98 @@ class MongoDBClient:
         self.client = MongoClient(uri)
         self.db = self.client['academicworld']
 
+    def _timed(self, collection, query, run, explain):
+        with limits.slot('mongo'):
+            start = time.perf_counter()
+            result = list(run())
+        metrics.record('mongo', (collection, query), len(result), 0.0,
+                       time.perf_counter() - start, explain=explain)
+        return result
+
+    def _find(self, collection, query, projection=None):
+        return self._timed(collection, query, lambda: self.db[collection].find(query, projection),
+                           lambda: self.db.command('explain', {'find': collection, 'filter': query,
+                                                               **({'projection': projection} if projection else {})},
+                                                   verbosity='queryPlanner'))
+
+    def _aggregate(self, collection, pipeline, **kwargs):
+        return self._timed(collection, pipeline, lambda: self.db[collection].aggregate(pipeline, **kwargs),
+                           lambda: self.db.command('explain', {'aggregate': collection, 'pipeline': pipeline, 'cursor': {}},
+                                                   verbosity='queryPlanner'))
+
+    def _streamed(self, collection, query, open_cursor):
+        # the driver fetches the next batch inside the iteration, so the slot is held until the
+        # stream is closed; callers bound it with limit or stop early, which closes the cursor
+        with limits.slot('mongo'):
+            start = time.perf_counter()
+            rows = 0
+            cursor = open_cursor()
+            try:
+                for doc in cursor:
+                    rows += 1
+                    yield doc
+            finally:
+                # stopping early kills the server side cursor instead of reading the remaining batches
+                cursor.close()
+                metrics.record('mongo', (collection, query), rows, 0.0, time.perf_counter() - start)
+
+    def stream(self, database, collection, query, projection=None, batch_size=BATCH_SIZE, limit=0):
+        """
+        Iterate over matching documents, uncached. The server applies the projection and limit
+        and returns batch_size documents per round trip, so memory stays bounded.
+        """
+        if limit:
+            batch_size = min(batch_size, limit)
+        return self._streamed(collection, query,
+                              lambda: self.db[collection].find(query, projection, batch_size=batch_size, limit=limit))
+
+    def stream_aggregate(self, database, collection, pipeline, batch_size=BATCH_SIZE, **kwargs):
+        """
+        Iterate over the results of a pipeline, uncached, batch_size documents per round trip.
+        """
+        return self._streamed(collection, pipeline,
+                              lambda: self.db[collection].aggregate(pipeline, batchSize=batch_size, **kwargs))
+
     def find(self, database, collection, query, projection=None):
-        return list(self.db[collection].find(query, projection))
+        key = make_key('mongo:find', [collection, query, projection])
+        return query_cache.cached(key, lambda: self._find(collection, query, projection), mongo_tags(collection))
+
+    def aggregate(self, database, collection, pipeline, **kwargs):
+        # $merge and $out write to another collection, those run uncached and invalidate it
+        target = pipeline[-1].get("$merge", pipeline[-1].get("$out")) if pipeline else None
+        if target is not None:
+            result = self._aggregate(collection, pipeline, **kwargs)
+            into = target.get("into", target.get("coll")) if isinstance(target, dict) else target
+            query_cache.invalidate(mongo_tags(into if isinstance(into, str) else str(into)))
+            return result
+        key = make_key('mongo:aggregate', [collection, pipeline, kwargs])
+        # $lookup stages read other collections too
+        tags = mongo_tags(collection) | {('mongo', stage["$lookup"].get("from")) for stage in pipeline if "$lookup" in stage}
+        return query_cache.cached(key, lambda: self._aggregate(collection, pipeline, **kwargs), tags)
+
+    def count(self, database, collection):
+        return self.db[collection].estimated_document_count()
+
+    def bulk_write(self, database, collection, operations, ordered=False):
+        with limits.slot('mongo'):
+            result = self.db[collection].bulk_write(operations, ordered=ordered)
+        query_cache.invalidate(mongo_tags(collection))
+        return result
+
+    def replace_one(self, database, collection, query, document, upsert=True):
+        with limits.slot('mongo'):
+            self.db[collection].replace_one(query, document, upsert=upsert)
+        query_cache.invalidate(mongo_tags(collection))
+
+    def rename(self, database, collection, target):
+        # replaces target in one step, readers see either the old or the new collection
+        self.db[collection].rename(target, dropTarget=True)
+        query_cache.invalidate(mongo_tags(collection) | mongo_tags(target))
 
-    def aggregate(self, database, collection, pipeline):
-        return list(self.db[collection].aggregate(pipeline))
+    def drop(self, database, collection):
+        self.db[collection].drop()
+        query_cache.invalidate(mongo_tags(collection))
 
     def update_one(self, database, collection, query, new_values):
-        self.db[collection].update_one(query, new_values)
\ No newline at end of file
+        self.db[collection].update_one(query, new_values)
+        query_cache.invalidate(mongo_tags(collection))
@@ -1,21 +1,170 @@
+import atexit
+import json
+import time
+from contextlib import closing
 import mysql.connector
 import pandas as pd
+from pool_utils import ConnectionPool, PoolTimeout
+from cache_utils import query_cache, make_key, is_sql_write, sql_tags
+from metrics_utils import metrics
+from flight_utils import limits, Overloaded
 
+MYSQL_CONFIG = {
+    'user': 'root',
+    'password': 'test_root',  # replace with your actual password
+    'host': '127.0.0.1',
+    'database': 'academicworld'
+}
+# pool settings... size bounds the number of open connections, recycle is in seconds
+POOL_SIZE = 5
+POOL_TIMEOUT = 10
+POOL_RECYCLE = 3600
+# rows fetched per round trip when streaming a result set
+BATCH_SIZE = 1000
 
-def fetch_data(query, params=None):
-    cnx = None
+_pool = None
+
+
+def _is_alive(cnx):
     try:
-        cnx = mysql.connector.connect(
-            user='root',
-            password='test_root',  # replace with your actual password
-            host='127.0.0.1',
-            database='academicworld'
-        )
+        cnx.ping(reconnect=False)
+        return True
+    except mysql.connector.Error:
+        return False
+
+
+def configure_pool(size=POOL_SIZE, timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE):
+    global _pool
+    if _pool is not None:
+        _pool.close_all()
+    _pool = ConnectionPool(
+        lambda: mysql.connector.connect(**MYSQL_CONFIG),
+        size=size,
+        timeout=timeout,
+        recycle=recycle,
+        health_check=_is_alive
+    )
+    return _pool
+
+
+def get_pool():
+    if _pool is None:
+        configure_pool()
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats.snapshot()
+
+
+def explain(query, params=None):
+    with get_pool().connection() as cnx:
+        cursor = cnx.cursor()
+        cursor.execute('EXPLAIN FORMAT=JSON ' + query, params)
+        plan = cursor.fetchone()[0]
+        cursor.close()
+        cnx.rollback()
+        return json.loads(plan)
+
+
+def _read_sql(query, params=None):
+    start = time.perf_counter()
+    with limits.slot('mysql'), get_pool().connection() as cnx:
+        connected = time.perf_counter()
         df = pd.read_sql(query, cnx, params=params)
-        return df
-    except mysql.connector.Error as e:
+        # end the implicit read transaction so the next checkout sees fresh data
+        cnx.rollback()
+    metrics.record('mysql', query, len(df), connected - start, time.perf_counter() - connected,
+                   explain=lambda: explain(query, params))
+    return df
+
+
+def _stream(query, params=None, batch_size=BATCH_SIZE):
+    # a query slot is taken for the execute and for each fetch, not while the caller works
+    # on a batch, so a slow consumer only holds its pooled connection
+    pool = get_pool()
+    start = time.perf_counter()
+    try:
+        conn = pool.acquire()
+    except (mysql.connector.Error, PoolTimeout) as e:
+        print(f"Error: {e}")
+        return
+    connected = time.perf_counter()
+    rows = 0
+    finished = False
+    try:
+        # unbuffered cursor, rows stay on the server until they are fetched
+        cursor = conn.raw.cursor()
+        with limits.slot('mysql'):
+            cursor.execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        while True:
+            with limits.slot('mysql'):
+                batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            rows += len(batch)
+            yield columns, batch
+        cursor.close()
+        conn.raw.rollback()
+        finished = True
+    except (mysql.connector.Error, Overloaded) as e:
         print(f"Error: {e}")
-        return pd.DataFrame()
     finally:
-        if cnx and cnx.is_connected():
-            cnx.close()
\ No newline at end of file
+        # an unread result set would have to be drained before the connection is reused,
+        # closing the connection is cheaper when the caller stopped early
+        pool.release(conn, broken=not finished)
+        metrics.record('mysql', query, rows, connected - start, time.perf_counter() - connected)
+
+
+def iter_chunks(query, params=None, chunksize=BATCH_SIZE):
+    """
+    Stream a read query as DataFrames of at most chunksize rows. Uncached; rows are fetched
+    from the server as the chunks are consumed, so memory is bounded by chunksize.
+    """
+    with closing(_stream(query, params, chunksize)) as batches:
+        for columns, batch in batches:
+            yield pd.DataFrame(batch, columns=columns)
+
+
+def iter_rows(query, params=None, batch_size=BATCH_SIZE, limit=None):
+    """
+    Stream a read query row by row as dicts, stopping after limit rows without fetching the rest.
+    """
+    if limit is not None:
+        batch_size = max(min(batch_size, limit), 1)
+    n = 0
+    with closing(_stream(query, params, batch_size)) as batches:
+        for columns, batch in batches:
+            for row in batch:
+                yield dict(zip(columns, row))
+                n += 1
+                if limit is not None and n >= limit:
+                    return
+
+
+def fetch_data(query, params=None, cache=True):
+    # cache=False always reads the current data: change detection and the store loads it triggers
+    # must not see a cached result from before an external write
+    try:
+        if is_sql_write(query):
+            with limits.slot('mysql'), get_pool().connection() as cnx:
+                cursor = cnx.cursor()
+                cursor.execute(query, params)
+                cnx.commit()
+                cursor.close()
+            query_cache.invalidate(sql_tags(query))
+            return pd.DataFrame()
+        if not cache:
+            return _read_sql(query, params)
+        key = make_key('mysql', query, params)
+        return query_cache.cached(key, lambda: _read_sql(query, params), sql_tags(query), query)
+    except (mysql.connector.Error, PoolTimeout) as e:
+        print(f"Error: {e}")
+        return pd.DataFrame()
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None:
+        _pool.close_all()
@@ -1,19 +1,152 @@
+import atexit
+import threading
+import time
 from neo4j import GraphDatabase
+from pool_utils import PoolStats
+from cache_utils import query_cache, make_key, is_cypher_write, cypher_tags, cypher_set_properties
+from metrics_utils import metrics
+from flight_utils import limits, Overloaded, Superseded
 
 URI = "neo4j://localhost"
 AUTH = ("neo4j", "ilovecs411")  # Replace with your actual password
+# driver pool settings... the driver owns the connection pool, lifetimes are in seconds
+MAX_POOL_SIZE = 50
+MAX_CONNECTION_LIFETIME = 3600
+ACQUISITION_TIMEOUT = 10
+LIVENESS_CHECK_TIMEOUT = 30
+# records pulled per round trip when streaming
+BATCH_SIZE = 1000
 
-def run_query(query, parameters=None, database="academicworld"):
-    # Create a driver instance
-    driver = GraphDatabase.driver(URI, auth=AUTH)
-    
-    # Verify connectivity and run query
+_driver = None
+_driver_lock = threading.Lock()
+stats = PoolStats()
+
+
+def get_driver():
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(
+                    URI,
+                    auth=AUTH,
+                    max_connection_pool_size=MAX_POOL_SIZE,
+                    max_connection_lifetime=MAX_CONNECTION_LIFETIME,
+                    connection_acquisition_timeout=ACQUISITION_TIMEOUT,
+                    liveness_check_timeout=LIVENESS_CHECK_TIMEOUT
+                )
+    return _driver
+
+
+def pool_stats():
+    # sessions are lazy and the driver takes a connection from its own pool inside run(),
+    # so the wait for a connection cannot be told apart from the query; the pool settings
+    # are reported instead of a wait time
+    snapshot = {name: value for name, value in stats.snapshot().items() if name not in ('avg_wait_ms', 'max_wait_ms')}
+    snapshot.update(max_pool_size=MAX_POOL_SIZE, acquisition_timeout_s=ACQUISITION_TIMEOUT,
+                    max_connection_lifetime_s=MAX_CONNECTION_LIFETIME)
+    return snapshot
+
+
+def explain(query, parameters=None, database="academicworld", profile=False):
+    # PROFILE runs the query again, only for manual investigation and never for writes
+    with get_driver().session(database=database) as session:
+        if profile and not is_cypher_write(query):
+            return session.run('PROFILE ' + query, parameters).consume().profile
+        return session.run('EXPLAIN ' + query, parameters).consume().plan
+
+
+def _run(query, parameters=None, database="academicworld"):
+    try:
+        with limits.slot('neo4j'):
+            return _execute(query, parameters, database)
+    except Overloaded as e:
+        stats.incr('timeouts')
+        print(f"Query failed: {e}")
+        return None
+
+
+def _execute(query, parameters=None, database="academicworld"):
+    try:
+        # a short lived session per query, the driver pools the connections behind it
+        # (requests run on threads that come and go, sessions kept per thread would never be closed)
+        session = get_driver().session(database=database)
+    except Exception as e:
+        stats.incr('timeouts')
+        print(f"Query failed: {e}")
+        return None
+    # creating the session does not wait for a connection, run() does, so no wait is recorded
+    stats.record_checkout(0)
+    checked_out = time.monotonic()
+    try:
+        with session:
+            records = [record.data() for record in session.run(query, parameters)]
+        metrics.record('neo4j', query, len(records), 0, time.monotonic() - checked_out,
+                       explain=lambda: explain(query, parameters, database))
+        return records
+    except Exception as e:
+        print(f"Query failed: {e}")
+    finally:
+        stats.record_checkin(time.monotonic() - checked_out)
+
+
+def stream_query(query, parameters=None, database="academicworld", batch_size=BATCH_SIZE, limit=None):
+    """
+    Iterate over the records of a read query as dicts, uncached. The driver pulls batch_size
+    records at a time, and stopping early (or after limit records) discards the rest on the server.
+    Runs in its own session so other queries can be issued while iterating. The driver pulls
+    the next batch inside the iteration, so the query slot is held until the stream ends or is
+    closed; bound long streams with limit.
+    """
+    if limit is not None:
+        batch_size = max(min(batch_size, limit), 1)
+    start = connected = time.monotonic()
+    rows = 0
     try:
-        with driver.session(database=database) as session:
-            result = session.run(query, parameters)
-            return [record.data() for record in result]
+        with limits.slot('neo4j'), get_driver().session(database=database, fetch_size=batch_size) as session:
+            connected = time.monotonic()
+            for record in session.run(query, parameters):
+                yield record.data()
+                rows += 1
+                if limit is not None and rows >= limit:
+                    break
+    except Superseded:
+        raise
     except Exception as e:
         print(f"Query failed: {e}")
     finally:
-        driver.close()
+        metrics.record('neo4j', query, rows, connected - start, time.monotonic() - connected)
+
+
+def write_transaction(query, parameters=None, database="academicworld", tags=None):
+    """
+    Run a write in one explicit transaction, all or nothing, and return its records.
+    Errors are raised so the caller can report them. tags replace the cache tags derived
+    from the query, for writes like UNWIND batches whose nodes are named in the rows.
+    """
+    with limits.slot('neo4j'):
+        start = time.monotonic()
+        with get_driver().session(database=database) as session:
+            connected = time.monotonic()
+            records = session.execute_write(lambda tx: [record.data() for record in tx.run(query, parameters)])
+        metrics.record('neo4j', query, len(records), connected - start, time.monotonic() - connected)
+    query_cache.invalidate(tags if tags is not None else cypher_tags(query, parameters), cypher_set_properties(query))
+    return records
+
+
+def run_query(query, parameters=None, database="academicworld"):
+    if is_cypher_write(query):
+        result = _run(query, parameters, database)
+        # drop exactly the cached reads of the nodes and properties this write touched
+        query_cache.invalidate(cypher_tags(query, parameters), cypher_set_properties(query))
+        return result
+    key = make_key('neo4j:' + database, query, parameters)
+    return query_cache.cached(key, lambda: _run(query, parameters, database), cypher_tags(query, parameters), query)
+
 
+@atexit.register
+def close_driver():
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PoolStats:
+    def __init__(self):
+        """
+        Thread safe counters describing how a connection pool is being used.
+        Wait time is the time a caller spent blocked before getting a connection.
+        """
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.unhealthy = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_checkout_time = 0.0
+
+    def record_checkout(self, wait):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_checkin(self, held):
+        with self._lock:
+            self.in_use -= 1
+            self.total_checkout_time += held
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            checkouts = self.checkouts or 1
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'unhealthy': self.unhealthy,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'avg_wait_ms': 1000 * self.total_wait / checkouts,
+                'max_wait_ms': 1000 * self.max_wait,
+                'avg_checkout_ms': 1000 * self.total_checkout_time / checkouts,
+            }
+
+
+class _PooledConnection:
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=5, timeout=10, recycle=3600, health_check=None, close=None):
+        """
+        A bounded pool of long lived connections.
+
+        :param factory: callable returning a new raw connection
+        :param size: maximum number of open connections
+        :param timeout: seconds to wait for a free connection before raising PoolTimeout
+        :param recycle: seconds after which a connection is closed and replaced
+        :param health_check: callable(raw) -> bool run on each checkout
+        :param close: callable(raw) used to close a connection
+        """
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check = health_check
+        self._close = close or (lambda raw: raw.close())
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.stats = PoolStats()
+
+    def _discard(self, conn):
+        try:
+            self._close(conn.raw)
+        except Exception as e:
+            print(f"Error closing pooled connection: {e}")
+
+    def _usable(self, conn):
+        if self.recycle and time.monotonic() - conn.created_at > self.recycle:
+            self.stats.incr('recycled')
+            return False
+        if self.health_check and not self.health_check(conn.raw):
+            self.stats.incr('unhealthy')
+            return False
+        return True
+
+    def acquire(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.incr('timeouts')
+            raise PoolTimeout(f"no connection available after {self.timeout}s (pool size {self.size})")
+        try:
+            conn = None
+            while conn is None:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = _PooledConnection(self.factory())
+                    self.stats.incr('created')
+                    break
+                if not self._usable(conn):
+                    self._discard(conn)
+                    conn = None
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats.record_checkout(time.monotonic() - start)
+        conn.checked_out_at = time.monotonic()
+        return conn
+
+    def release(self, conn, broken=False):
+        self.stats.record_checkin(time.monotonic() - conn.checked_out_at)
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn.raw
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
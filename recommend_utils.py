@@ -0,0 +1,209 @@
+import threading
+import numpy as np
+from scipy import sparse
+import mysql_utils as sqlDB
+from flight_utils import single_flight
+from keyword_utils import KEYWORD_FACULTY_QUERY, FINGERPRINT_QUERY
+from analytics_utils import top_k
+from snapshot_utils import sparse_arrays, sparse_from
+
+# above this many faculty the approximate index is used unless asked otherwise
+ANN_THRESHOLD = 50000
+# clusters scanned per lookup
+ANN_PROBES = 8
+ANN_ITERATIONS = 10
+# rows assigned to clusters at a time, bounds the dense rows x clusters block
+ANN_CHUNK = 20000
+
+
+def _normalize_rows(m):
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel()) if sparse.issparse(m) else np.linalg.norm(m, axis=1)
+    scale = 1 / np.maximum(norms, 1e-12)
+    return (sparse.diags(scale) @ m).tocsr() if sparse.issparse(m) else m * scale[:, None]
+
+
+class ClusterIndex:
+    def __init__(self, X, n_clusters=None, probes=ANN_PROBES, iterations=ANN_ITERATIONS, seed=0):
+        """
+        Approximate nearest neighbour index (inverted file): the unit length rows of X are
+        grouped by spherical k-means, and a lookup only scores the rows of the probes
+        clusters whose centroids are closest to the query. With about sqrt(n) clusters a
+        lookup scores roughly probes * sqrt(n) rows instead of n.
+
+        :param X: n x d sparse matrix with unit length rows
+        :param n_clusters: defaults to sqrt(n)
+        :param probes: clusters scanned per lookup, more find more true neighbours
+        """
+        n = X.shape[0]
+        self.n_clusters = max(1, min(n_clusters or int(np.sqrt(n)), n))
+        self.probes = probes
+        rng = np.random.default_rng(seed)
+        centroids = X[rng.choice(n, self.n_clusters, replace=False)].toarray()
+        for _ in range(iterations):
+            assignment = self._assign(X, centroids)
+            members = sparse.csr_matrix((np.ones(n, dtype=np.float32), (assignment, np.arange(n))),
+                                        shape=(self.n_clusters, n))
+            sums = np.asarray((members @ X).todense())
+            empty = np.flatnonzero(np.asarray(members.sum(axis=1)).ravel() == 0)
+            if len(empty):
+                # an empty cluster restarts from a random row
+                sums[empty] = X[rng.choice(n, len(empty), replace=False)].toarray()
+            centroids = _normalize_rows(sums)
+        self.centroids = centroids.astype(np.float32)
+        assignment = self._assign(X, self.centroids)
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(self.n_clusters + 1))
+
+    @classmethod
+    def from_arrays(cls, centroids, order, offsets, probes=ANN_PROBES):
+        index = cls.__new__(cls)
+        index.n_clusters = len(centroids)
+        index.probes = probes
+        index.centroids, index.order, index.offsets = centroids, order, offsets
+        return index
+
+    def _assign(self, X, centroids):
+        return np.concatenate([np.asarray(X[start:start + ANN_CHUNK] @ centroids.T).argmax(axis=1)
+                               for start in range(0, X.shape[0], ANN_CHUNK)])
+
+    def candidates(self, x):
+        """
+        Row indices in the clusters closest to x.
+        """
+        # only the query's nonzero keywords contribute
+        similarity = self.centroids[:, x.indices] @ x.data
+        probes = np.argsort(-similarity)[:self.probes]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+
+
+class CollaboratorIndex:
+    def __init__(self, fetch=None, ann=None):
+        """
+        Faculty similarity by research profile, for recommending collaborators.
+
+        Each faculty member is a row of a faculty x keyword matrix of publication counts
+        (the joins behind their research interests), weighted by sublinear TF-IDF and
+        normalized to unit length, so the cosine similarity of two faculty is the dot
+        product of their rows. A lookup scores every faculty member with one sparse
+        matrix-vector product and keeps the best k with argpartition.
+
+        :param fetch: query function with the same signature as mysql_utils.fetch_data
+        :param ann: use the approximate ClusterIndex, None to decide by ANN_THRESHOLD
+        """
+        self.fetch = fetch or sqlDB.fetch_data
+        self.ann = ann
+        self._lock = threading.Lock()
+        self.fingerprint = None
+        self.state = None
+
+    @property
+    def ready(self):
+        return self.state is not None
+
+    def _fingerprint(self):
+        df = self.fetch(FINGERPRINT_QUERY, cache=False)
+        if df.empty:
+            return None
+        return tuple(int(value) for value in df.iloc[0])
+
+    def build(self):
+        fingerprint = self._fingerprint()
+        df = self.fetch(KEYWORD_FACULTY_QUERY, cache=False)
+        if fingerprint is None or df.empty:
+            return False
+        names, rows = np.unique(df['name'].to_numpy(str), return_inverse=True)
+        keywords, cols = np.unique(df['keyword'].to_numpy(str), return_inverse=True)
+        counts = df['num_publications'].to_numpy(np.float32)
+        # sublinear term frequency, and keywords most faculty share count for less
+        tf = sparse.csr_matrix((np.log1p(counts), (rows, cols)), shape=(len(names), len(keywords)))
+        document_frequency = np.bincount(cols, minlength=len(keywords))
+        idf = np.log((1 + len(names)) / (1 + document_frequency)) + 1
+        X = _normalize_rows(tf @ sparse.diags(idf.astype(np.float32))).astype(np.float32)
+        ann = self.ann if self.ann is not None else len(names) > ANN_THRESHOLD
+        state = {
+            'X': X,
+            'names': names,
+            'keywords': keywords,
+            'lookup': {name: i for i, name in enumerate(names)},
+            'ann': ClusterIndex(X) if ann else None,
+        }
+        with self._lock:
+            self.state = state
+            self.fingerprint = fingerprint
+        return True
+
+    def export_state(self):
+        state = self.state
+        if state is None:
+            return {}, None
+        arrays = dict(sparse_arrays('X', state['X']), names=state['names'], keywords=state['keywords'])
+        ann = state['ann']
+        if ann is not None:
+            arrays.update(centroids=ann.centroids, order=ann.order, offsets=ann.offsets)
+        return arrays, {'fingerprint': self.fingerprint, 'probes': ann.probes if ann is not None else None}
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        names = arrays['names']
+        state = {
+            'X': sparse_from(arrays, 'X'),
+            'names': names,
+            'keywords': arrays['keywords'],
+            'lookup': {name: i for i, name in enumerate(names.tolist())},
+            'ann': ClusterIndex.from_arrays(arrays['centroids'], arrays['order'], arrays['offsets'], document['probes'])
+            if 'centroids' in arrays else None,
+        }
+        with self._lock:
+            self.state = state
+            self.fingerprint = tuple(document['fingerprint'])
+
+    def refresh(self):
+        # concurrent refreshes share one fingerprint check and build
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if self.ready and self.fingerprint is not None and self._fingerprint() == self.fingerprint:
+            return 'unchanged'
+        return 'built' if self.build() else 'failed'
+
+    def similar(self, faculty_name, k=10, shared=3):
+        """
+        [(faculty, similarity, [shared keywords])] for the k faculty most similar to faculty_name,
+        best first. The shared keywords are the ones contributing most to the similarity.
+        """
+        if not self.ready:
+            self.refresh()
+        state = self.state
+        if state is None or faculty_name not in state['lookup']:
+            return []
+        X = state['X']
+        i = state['lookup'][faculty_name]
+        x = X[i]
+        x_dense = x.toarray().ravel()
+        candidates = None
+        if state['ann'] is not None:
+            candidates = state['ann'].candidates(x)
+            candidates = candidates[candidates != i]
+            if len(candidates) < k:
+                # too few rows in the probed clusters, score everyone instead
+                candidates = None
+        if candidates is None:
+            scores = X @ x_dense
+            scores[i] = -np.inf
+            best = top_k(scores, k, names=state['names'])
+            best_scores = scores[best]
+        else:
+            scores = X[candidates] @ x_dense
+            order = top_k(scores, k, names=state['names'][candidates])
+            best, best_scores = candidates[order], scores[order]
+        keep = best_scores > 0
+        best, best_scores = best[keep], best_scores[keep]
+        # per keyword contributions to each similarity, all results in one product
+        overlap = sparse.csr_matrix(X[best].multiply(x))
+        results = []
+        for row, (j, score) in enumerate(zip(best, best_scores)):
+            start, end = overlap.indptr[row], overlap.indptr[row + 1]
+            strongest = overlap.indices[start:end][np.argsort(-overlap.data[start:end], kind='stable')[:shared]]
+            results.append((str(state['names'][j]), float(score), [str(state['keywords'][c]) for c in strongest]))
+        return results
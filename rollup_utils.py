@@ -0,0 +1,132 @@
+import threading
+import mysql_utils as sqlDB
+from flight_utils import single_flight
+
+METRICS = ('total_publications', 'total_citations')
+
+# one pass over the join computes both rankings, optionally restricted to a range of publication ids
+ROLLUP_QUERY = """
+SELECT university.name AS university_name,
+    COUNT(DISTINCT fp.publication_Id) AS total_publications,
+    COALESCE(SUM(publication.num_citations), 0) AS total_citations
+FROM university
+JOIN faculty ON university.id = faculty.university_id
+JOIN faculty_publication fp ON faculty.id = fp.faculty_Id
+JOIN publication ON publication.id = fp.publication_Id
+WHERE publication.id > %s AND publication.id <= %s
+GROUP BY university.name
+"""
+
+# cheap single table scans used to decide whether the rollups are still valid
+FINGERPRINT_QUERY = """
+SELECT
+    (SELECT COALESCE(MAX(id), 0) FROM publication) AS max_publication_id,
+    (SELECT COUNT(*) FROM faculty_publication WHERE publication_Id <= %s) AS old_links,
+    (SELECT COALESCE(SUM(num_citations), 0) FROM publication WHERE id <= %s) AS old_citations,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', COALESCE(university_id, '')))), 0) FROM faculty) AS faculty_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0) FROM university) AS university_checksum
+"""
+
+
+class UniversityRollups:
+    def __init__(self, fetch=None):
+        """
+        Precomputed per university totals for publications and citations.
+
+        The rankings are built once from a single grouped query and kept sorted in memory,
+        so serving a range of the ranking is a list slice. refresh() only queries the
+        publications added since the last build when nothing older has changed.
+
+        :param fetch: query function with the same signature as mysql_utils.fetch_data
+        """
+        self.fetch = fetch or sqlDB.fetch_data
+        self._lock = threading.Lock()
+        self.totals = {}
+        self.rankings = {metric: [] for metric in METRICS}
+        self.max_publication_id = None
+        self.fingerprint = None
+
+    @property
+    def ready(self):
+        return self.max_publication_id is not None
+
+    def _fingerprint(self, upto):
+        df = self.fetch(FINGERPRINT_QUERY, params=(upto, upto), cache=False)
+        if df.empty:
+            return None
+        row = df.iloc[0]
+        return {
+            'max_publication_id': int(row['max_publication_id']),
+            'old': (int(row['old_links']), int(row['old_citations']),
+                    int(row['faculty_checksum']), int(row['university_checksum']))
+        }
+
+    def _query_totals(self, low, high):
+        df = self.fetch(ROLLUP_QUERY, params=(low, high), cache=False)
+        return {
+            row['university_name']: [int(row['total_publications']), int(row['total_citations'])]
+            for _, row in df.iterrows()
+        }
+
+    def _publish(self, totals, max_publication_id, fingerprint):
+        rankings = {}
+        for i, metric in enumerate(METRICS):
+            ranked = sorted(totals.items(), key=lambda item: (-item[1][i], item[0]))
+            rankings[metric] = [(name, values[i]) for name, values in ranked]
+        with self._lock:
+            self.totals = totals
+            self.rankings = rankings
+            self.max_publication_id = max_publication_id
+            self.fingerprint = fingerprint
+
+    def build(self):
+        fingerprint = self._fingerprint(0)
+        if fingerprint is None:
+            return False
+        max_id = fingerprint['max_publication_id']
+        # taken before the totals are read, a change made meanwhile is caught by the next refresh
+        fingerprint = self._fingerprint(max_id)
+        if fingerprint is None:
+            return False
+        totals = self._query_totals(0, max_id)
+        self._publish(totals, max_id, fingerprint)
+        return True
+
+    def refresh(self):
+        """
+        Bring the rollups up to date. Returns 'built', 'incremental', 'unchanged' or 'failed'.
+        Refreshes requested while one is running (every open tab on the hourly tick) wait for it.
+        """
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if not self.ready:
+            return 'built' if self.build() else 'failed'
+        current = self._fingerprint(self.max_publication_id)
+        if current is None:
+            return 'failed'
+        if current['old'] != self.fingerprint['old']:
+            # existing publications, links or affiliations changed, a delta is not enough
+            return 'built' if self.build() else 'failed'
+        new_max = current['max_publication_id']
+        if new_max == self.max_publication_id:
+            return 'unchanged'
+        fingerprint = self._fingerprint(new_max)
+        if fingerprint is None:
+            return 'failed'
+        delta = self._query_totals(self.max_publication_id, new_max)
+        totals = {name: list(values) for name, values in self.totals.items()}
+        for name, (publications, citations) in delta.items():
+            entry = totals.setdefault(name, [0, 0])
+            entry[0] += publications
+            entry[1] += citations
+        self._publish(totals, new_max, fingerprint)
+        return 'incremental'
+
+    def top(self, metric, start, end):
+        """
+        Return [(university_name, value)] for ranks start..end (1 based, inclusive).
+        """
+        if not self.ready:
+            self.refresh()
+        return self.rankings[metric][start - 1:end]
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+import time
+from flight_utils import single_flight
+
+
+class Snapshot:
+    __slots__ = ('version', 'created_at', 'digest', '_payload')
+
+    def __init__(self, version, datasets):
+        """
+        An immutable, versioned copy of the precomputed datasets. The datasets are kept
+        serialized, so every reader gets its own copy and nothing can change a published snapshot.
+        """
+        self._payload = json.dumps(datasets, sort_keys=True, default=str)
+        self.version = version
+        self.created_at = time.time()
+        self.digest = hashlib.md5(self._payload.encode()).hexdigest()
+
+    def get(self, name):
+        return json.loads(self._payload)[name]
+
+    def to_json(self):
+        return self._payload
+
+
+class PrecomputeScheduler:
+    def __init__(self, builders, refreshers=(), interval=300):
+        """
+        Recompute the dashboard's aggregate datasets on the server, independent of how many
+        browsers are open, and publish them as versioned snapshots.
+
+        Every interval seconds (or right away after trigger()) the refreshers bring the
+        in memory stores up to date, which only reruns queries when their fingerprints
+        changed, and the builders produce the datasets. A new version is only published
+        when the datasets differ from the current snapshot.
+
+        :param builders: dict of dataset name -> callable returning JSON serializable data
+        :param refreshers: callables run before the builders (rollup and index refreshes)
+        :param interval: seconds between runs
+        """
+        self.builders = builders
+        self.refreshers = list(refreshers)
+        self.interval = interval
+        self.current = None
+        self.runs = 0
+        self.published = 0
+        self.last_run = None
+        self.last_error = None
+        # callables run after every successful run, e.g. publishing a shared snapshot
+        self.listeners = []
+        self._source = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self.current.version if self.current is not None else 0
+
+    def run_once(self):
+        """
+        Refresh and rebuild now. Returns the current snapshot, new or not.
+        """
+        return single_flight.do(('precompute', id(self)), self._run)
+
+    def follow(self, source):
+        """
+        Take the snapshots another process publishes instead of computing them here:
+        every run only calls source (e.g. SharedSnapshot.sync), which imports the newest one.
+        """
+        self._source = source
+
+    def _run(self):
+        if self._source is not None:
+            self._source()
+            return self.current
+        start = time.monotonic()
+        try:
+            for refresh in self.refreshers:
+                refresh()
+            snapshot = Snapshot(self.version + 1, {name: build() for name, build in self.builders.items()})
+            if self.current is None or snapshot.digest != self.current.digest:
+                # readers hold on to whichever snapshot they got, publishing is a reference swap
+                self.current = snapshot
+                self.published += 1
+            self.last_error = None
+            for listener in self.listeners:
+                listener()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Precompute failed: {e}")
+        self.runs += 1
+        self.last_run = time.monotonic() - start
+        return self.current
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._stopped.is_set():
+                self.run_once()
+
+    def start(self):
+        """
+        Run every interval seconds in a background thread. The first run is left to the caller
+        (it is one of the startup warmers) so startup does not compute everything twice.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='precompute', daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def export_state(self):
+        if self.current is None:
+            return {}, None
+        return {}, {'version': self.current.version, 'payload': self.current.to_json()}
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        self.current = Snapshot(document['version'], json.loads(document['payload']))
+
+    def stats(self):
+        return {'version': self.version, 'runs': self.runs, 'published': self.published,
+                'last_run_s': self.last_run or 0.0, 'failing': int(self.last_error is not None)}
@@ -0,0 +1,252 @@
+import argparse
+import sys
+import mysql_utils as sqlDB
+import neo4j_utils as neo4jDB
+import contact_utils
+import rollup_utils
+import trend_utils
+from analytics_utils import PARITY_QUERIES
+from keyword_utils import MONGO_TOP_PUBLICATIONS
+
+# (table, index name, columns)... an existing index whose leading columns match counts,
+# whatever its name, so the hand made keyword and university name indexes are kept
+MYSQL_INDEXES = [
+    ('faculty_publication', 'idx_faculty_publication_faculty', ('faculty_Id',)),
+    ('faculty_publication', 'idx_faculty_publication_publication', ('publication_Id',)),
+    ('Publication_Keyword', 'idx_publication_keyword_publication', ('publication_id',)),
+    ('Publication_Keyword', 'idx_publication_keyword_keyword', ('keyword_id',)),
+    ('faculty', 'idx_faculty_university', ('university_id',)),
+    ('keyword', 'idx_keyword_name', ('name',)),
+    ('university', 'idx_university_name', ('name',)),
+]
+# (collection, index name, keys)
+MONGO_INDEXES = [
+    ('publications', 'keywords_name_num_citations', [('keywords.name', 1), ('numCitations', -1)]),
+    ('faculty', 'name', [('name', 1)]),
+]
+# (label, index name, property)
+NEO4J_INDEXES = [
+    ('Faculty', 'faculty_name', 'name'),
+]
+
+# Neo4j operators that read every node (of a label)
+NEO4J_SCANS = ('AllNodesScan', 'NodeByLabelScan')
+
+
+def _mysql_indexes(table):
+    indexes = {}
+    query = """
+    SELECT INDEX_NAME AS name, COLUMN_NAME AS col
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """
+    for row in sqlDB.iter_rows(query, (table,)):
+        indexes.setdefault(row['name'], []).append(row['col'].lower())
+    return indexes
+
+
+def ensure_mysql(create=True):
+    """
+    Verify, and unless create is False create, the MySQL indexes.
+
+    :return: list of (status, description), status is ok, created, missing or failed
+    """
+    results = []
+    for table, name, columns in MYSQL_INDEXES:
+        wanted = [c.lower() for c in columns]
+        description = f"mysql {table}({', '.join(columns)})"
+
+        def present():
+            return any(cols[:len(wanted)] == wanted for cols in _mysql_indexes(table).values())
+
+        if present():
+            results.append(('ok', description))
+        elif not create:
+            results.append(('missing', description))
+        else:
+            sqlDB.fetch_data(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+            results.append(('created' if present() else 'failed', description))
+    return results
+
+
+def ensure_mongo(mongo_client, create=True):
+    results = []
+    for collection, name, keys in MONGO_INDEXES:
+        description = f"mongo {collection} {keys}"
+        existing = [list(info['key']) for info in mongo_client.db[collection].index_information().values()]
+        if any([tuple(k) for k in key[:len(keys)]] == [tuple(k) for k in keys] for key in existing):
+            results.append(('ok', description))
+        elif not create:
+            results.append(('missing', description))
+        else:
+            try:
+                mongo_client.db[collection].create_index(keys, name=name)
+                results.append(('created', description))
+            except Exception as e:
+                print(f"Could not create {description}: {e}")
+                results.append(('failed', description))
+    return results
+
+
+def ensure_neo4j(create=True):
+    results = []
+    shown = list(neo4jDB.stream_query("SHOW INDEXES YIELD labelsOrTypes, properties"))
+    for label, name, prop in NEO4J_INDEXES:
+        description = f"neo4j :{label}({prop})"
+        if any((row['labelsOrTypes'] or [])[:1] == [label] and (row['properties'] or [])[:1] == [prop] for row in shown):
+            results.append(('ok', description))
+        elif not create:
+            results.append(('missing', description))
+        else:
+            created = neo4jDB.run_query(f"CREATE INDEX {name} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})")
+            results.append(('created' if created is not None else 'failed', description))
+    return results
+
+
+def mysql_full_scans(plan, allowed=()):
+    """
+    Tables read with access_type ALL anywhere in an EXPLAIN FORMAT=JSON plan.
+    """
+    scans = []
+    if isinstance(plan, dict):
+        if plan.get('access_type') == 'ALL' and plan.get('table_name') not in allowed:
+            scans.append(plan.get('table_name'))
+        values = plan.values()
+    elif isinstance(plan, list):
+        values = plan
+    else:
+        return scans
+    for value in values:
+        scans.extend(mysql_full_scans(value, allowed))
+    return scans
+
+
+def mongo_full_scans(explain):
+    """
+    COLLSCAN stages of the winning plans in find or aggregate explain output.
+    """
+    scans = []
+
+    def walk(node, in_winning):
+        if isinstance(node, dict):
+            if in_winning and node.get('stage') == 'COLLSCAN':
+                scans.append(node.get('stage'))
+            for key, value in node.items():
+                walk(value, in_winning or key == 'winningPlan')
+        elif isinstance(node, list):
+            for value in node:
+                walk(value, in_winning)
+
+    walk(explain, False)
+    return scans
+
+
+def neo4j_full_scans(plan):
+    if not plan:
+        return []
+    scans = []
+    operator = plan.get('operatorType', '').split('@')[0]
+    if operator in NEO4J_SCANS:
+        scans.append(operator)
+    for child in plan.get('children', []):
+        scans.extend(neo4j_full_scans(child))
+    return scans
+
+
+def _sample(rows, key):
+    rows = list(rows)
+    return rows[0][key] if rows else None
+
+
+def check_plans(mongo_client=None, backends=('mysql', 'neo4j', 'mongo')):
+    """
+    EXPLAIN the hot per request queries with real sample values and report every full table,
+    collection or label scan. Bulk loads (index builds, fingerprints) scan on purpose and are
+    not checked.
+
+    :return: list of (backend, check name, scans or error message), scans empty when the plan is fine
+    """
+    keyword = _sample(sqlDB.iter_rows("SELECT name FROM keyword", limit=1), 'name')
+    university = _sample(sqlDB.iter_rows("SELECT name FROM university", limit=1), 'name')
+    faculty = _sample(neo4jDB.stream_query("MATCH (f:Faculty) RETURN f.name AS name", limit=1), 'name')
+    max_id = _sample(sqlDB.iter_rows("SELECT COALESCE(MAX(id), 0) AS id FROM publication", limit=1), 'id') or 0
+    checks = [
+        ('mysql', 'university_names', "SELECT DISTINCT name FROM university", None),
+        ('mysql', 'rollup_delta', rollup_utils.ROLLUP_QUERY, (max(max_id - 100, 0), max_id)),
+        ('mysql', 'trend_university_delta', trend_utils.UNIVERSITY_CELLS_QUERY, (max(max_id - 100, 0), max_id)),
+        ('mysql', 'trend_keyword_delta', trend_utils.KEYWORD_CELLS_QUERY, (max(max_id - 100, 0), max_id)),
+        ('mysql', 'research_areas', PARITY_QUERIES['research_areas'], (university, 10, 0)),
+        ('mysql', 'keyword_universities', PARITY_QUERIES['keyword_universities'], (keyword, 10, 0)),
+        ('mysql', 'keyword_faculty', PARITY_QUERIES['keyword_faculty'], (keyword, 10, 0)),
+        ('neo4j', 'faculty_contact', contact_utils.CONTACT_QUERY, {'name': faculty}),
+        ('neo4j', 'bulk_contact_update', contact_utils.UPDATE_QUERY,
+         {'rows': [{'row': 1, 'name': faculty, 'email': None, 'phone': None}]}),
+    ]
+    results = []
+    for backend, name, query, params in checks:
+        if backend not in backends:
+            continue
+        try:
+            if backend == 'mysql':
+                scans = mysql_full_scans(sqlDB.explain(query, params))
+            else:
+                scans = neo4j_full_scans(neo4jDB.explain(query, params, profile=False))
+        except Exception as e:
+            scans = f"explain failed: {e}"
+        results.append((backend, name, scans))
+
+    if mongo_client is not None and 'mongo' in backends:
+        db = mongo_client.db
+        mongo_checks = [
+            ('top_publications_lookup', lambda: db[MONGO_TOP_PUBLICATIONS].find({'_id': keyword}).explain()),
+            ('publications_by_keyword',
+             lambda: db['publications'].find({'keywords.name': keyword}).sort('numCitations', -1).limit(10).explain()),
+            ('faculty_by_name', lambda: db['faculty'].find({'name': faculty}).explain()),
+        ]
+        for name, run_explain in mongo_checks:
+            try:
+                scans = mongo_full_scans(run_explain())
+            except Exception as e:
+                scans = f"explain failed: {e}"
+            results.append(('mongo', name, scans))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or create the indexes the dashboard needs and check query plans.")
+    parser.add_argument('--check-only', action='store_true', help="report missing indexes instead of creating them")
+    parser.add_argument('--skip-plans', action='store_true', help="do not EXPLAIN the hot queries")
+    parser.add_argument('--skip', default='', help="comma separated backends to leave out: mysql, neo4j, mongo")
+    args = parser.parse_args(argv)
+    skip = set(filter(None, args.skip.split(',')))
+
+    mongo_client = None
+    if 'mongo' not in skip:
+        import mongodb_utils
+        mongo_client = mongodb_utils.MongoDBClient()
+
+    results = []
+    if 'mysql' not in skip:
+        results += ensure_mysql(create=not args.check_only)
+    if 'neo4j' not in skip:
+        results += ensure_neo4j(create=not args.check_only)
+    if mongo_client is not None:
+        results += ensure_mongo(mongo_client, create=not args.check_only)
+    for status, description in results:
+        print(f"{status:8} {description}")
+    failed = any(status in ('missing', 'failed') for status, _ in results)
+
+    if not args.skip_plans:
+        backends = [backend for backend in ('mysql', 'neo4j', 'mongo') if backend not in skip]
+        for backend, name, scans in check_plans(mongo_client, backends):
+            if scans:
+                failed = True
+                print(f"FAIL     {backend} {name}: {scans if isinstance(scans, str) else 'full scan of ' + ', '.join(map(str, scans))}")
+            else:
+                print(f"ok       {backend} {name}: uses indexes")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
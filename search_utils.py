@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+# fuzzy matches need at least this share of the query's trigrams
+FUZZY_THRESHOLD = 0.5
+FUZZY_CANDIDATES = 200
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, values=(), loader=None, max_age=None, fuzzy=True):
+        """
+        Server side typeahead index over a list of names.
+
+        Matches are ranked exact, then prefix of the whole name, then prefix of every query
+        word against the name's words, then substring, then (optionally) fuzzy trigram
+        similarity for typos. sync() applies only the values that were added or removed.
+
+        :param values: initial values
+        :param loader: optional callable returning the current values, used to resync
+        :param max_age: seconds after which a search triggers a background resync from loader
+        :param fuzzy: whether to fall back to trigram similarity when there are few matches
+        """
+        self.loader = loader
+        self.max_age = max_age
+        self.fuzzy = fuzzy
+        self._lock = threading.RLock()
+        self._syncing = False
+        self.values = []
+        self.norms = []
+        self.ids = {}
+        self.full = []
+        self.words = []
+        self.grams = {}
+        self.synced_at = time.monotonic()
+        self._apply(values, ())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _apply(self, added, removed):
+        # the sorted key lists are extended or filtered and sorted once, not per value
+        with self._lock:
+            gone = set()
+            for value in removed:
+                i = self.ids.pop(value, None)
+                if i is None:
+                    continue
+                gone.add(i)
+                for gram in trigrams(self.norms[i]):
+                    self.grams[gram].discard(i)
+                # the slot is left empty so other ids stay valid
+                self.values[i] = None
+            if gone:
+                self.full = [key for key in self.full if key[1] not in gone]
+                self.words = [key for key in self.words if key[1] not in gone]
+            start = len(self.values)
+            for value in added:
+                if value is None or value in self.ids:
+                    continue
+                i = len(self.values)
+                norm = normalize(value)
+                self.values.append(value)
+                self.norms.append(norm)
+                self.ids[value] = i
+                self.full.append((norm, i))
+                self.words.extend((word, i) for word in set(norm.split()))
+                for gram in trigrams(norm):
+                    self.grams.setdefault(gram, set()).add(i)
+            if len(self.values) > start:
+                self.full.sort()
+                self.words.sort()
+
+    def sync(self, values):
+        """
+        Apply the difference between the indexed values and values.
+        """
+        values = set(v for v in values if v is not None)
+        with self._lock:
+            current = set(self.ids)
+            self._apply(values - current, current - values)
+            self.synced_at = time.monotonic()
+
+    def _resync(self):
+        try:
+            self.sync(self.loader() or [])
+        except Exception as e:
+            print(f"Search index resync failed: {e}")
+        finally:
+            self._syncing = False
+
+    def _maybe_resync(self):
+        if self.loader is None or self.max_age is None or self._syncing:
+            return
+        if time.monotonic() - self.synced_at > self.max_age:
+            self._syncing = True
+            threading.Thread(target=self._resync, daemon=True).start()
+
+    def _prefix(self, keys, prefix):
+        start = bisect.bisect_left(keys, (prefix,))
+        for j in range(start, len(keys)):
+            key, i = keys[j]
+            if not key.startswith(prefix):
+                break
+            yield i
+
+    def search(self, query, limit=20):
+        """
+        Return up to limit values matching query, best matches first.
+        """
+        self._maybe_resync()
+        q = normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            scores = {}
+            for i in self._prefix(self.full, q):
+                scores[i] = 4.0 if self.norms[i] == q else 3.0
+            # every query word must be a prefix of some word of the value
+            q_words = q.split()
+            for i in self._prefix(self.words, q_words[0]):
+                if i not in scores:
+                    words = self.norms[i].split()
+                    if all(any(w.startswith(qw) for w in words) for qw in q_words[1:]):
+                        scores[i] = 2.0
+            q_grams = trigrams(q)
+            if len(q) >= 3:
+                # a substring match contains every trigram inside the query
+                inner = [self.grams.get(q[j:j + 3], set()) for j in range(len(q) - 2)]
+                candidates = set.intersection(*inner)
+                for i in candidates:
+                    if i not in scores and q in self.norms[i]:
+                        scores[i] = 1.0
+            if self.fuzzy and len(scores) < limit:
+                shared = Counter()
+                for gram in q_grams:
+                    shared.update(self.grams.get(gram, ()))
+                for i, count in shared.most_common(FUZZY_CANDIDATES):
+                    if i in scores:
+                        continue
+                    # share of the query found in the value, ties go to the closer overall match
+                    coverage = count / len(q_grams)
+                    if coverage >= FUZZY_THRESHOLD:
+                        jaccard = count / len(q_grams | trigrams(self.norms[i]))
+                        scores[i] = 0.5 * coverage + 0.49 * jaccard
+            ranked = sorted(scores, key=lambda i: (-scores[i], len(self.norms[i]), self.norms[i]))
+            return [self.values[i] for i in ranked[:limit]]
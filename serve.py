@@ -0,0 +1,180 @@
+import argparse
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# worker processes serving requests, one per core by default
+WORKERS = int(os.environ.get('DASHBOARD_WORKERS', os.cpu_count() or 1))
+BACKLOG = 2048
+# seconds the workers wait for the publisher's first snapshot
+READY_TIMEOUT = 600
+# a child that exits is restarted after this many seconds
+RESTART_DELAY = 1
+# a snapshot left by a previous run is only served while the new publisher loads if it is
+# at most this many seconds old, 0 always waits for a fresh publish
+SNAPSHOT_MAX_AGE = int(os.environ.get('DASHBOARD_SNAPSHOT_MAX_AGE', 3600))
+
+
+def default_snapshot_path():
+    # a tmpfs keeps the mapped pages in memory
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f"dashboard-{os.getuid() if hasattr(os, 'getuid') else 0}.snapshot")
+
+
+def cache_directory(snapshot):
+    return snapshot + '.cache'
+
+
+def listen(host, port, backlog=BACKLOG):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_child(role, sock, snapshot, setup, access_log):
+    """
+    Body of a forked child: the publisher loads everything and keeps the shared snapshot
+    up to date, a worker maps the snapshot and serves requests on the inherited socket.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ['DASHBOARD_SHARED_SNAPSHOT'] = snapshot
+    os.environ['DASHBOARD_SHARED_ROLE'] = role
+    # one query cache for all children, a write in one worker invalidates the others' copies
+    # through the shared log instead of them serving stale contact info until the TTL
+    os.environ.setdefault('DASHBOARD_CACHE_DIR', cache_directory(snapshot))
+    if setup is not None:
+        setup(role)
+    if role == 'publish':
+        sock.close()
+        import app  # noqa: F401 - loads, publishes and starts the precompute thread
+        while True:
+            time.sleep(3600)
+    from werkzeug.serving import make_server
+    import app
+    if not access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    host, port = sock.getsockname()[:2]
+    # every worker accepts on the socket the master bound, each connection gets a thread
+    server = make_server(host, port, app.app.server, threaded=True, fd=sock.fileno())
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def serve(workers=WORKERS, host='0.0.0.0', port=8050, snapshot=None, setup=None, access_log=False,
+          ready_timeout=READY_TIMEOUT, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Pre-fork server. The master binds the port and forks one publisher and workers
+    processes. The publisher runs the database loads and the precompute scheduler and
+    publishes a memory mapped snapshot of the aggregate and lookup data; every worker
+    accepts connections on the shared socket and answers the dashboard from its mapping of
+    that snapshot, so all workers share one copy and none of them loads data on its own.
+    Every store is exported as arrays; what each worker still builds for itself is small:
+    the key -> row dicts over the mapped arrays, the engine's name lookups and the typeahead
+    search indexes. Children that exit are restarted; SIGTERM or SIGINT stops everything. The children share
+    one query cache directory next to the snapshot unless DASHBOARD_CACHE_DIR is set.
+
+    :param snapshot: snapshot file, defaults to one in /dev/shm
+    :param setup: optional callable(role) run in each child before the app is imported
+    :param max_age: seconds a previous run's snapshot may be old to be served until the first publish
+    """
+    snapshot = snapshot or default_snapshot_path()
+    if 'DASHBOARD_CACHE_DIR' not in os.environ:
+        # entries cached by a previous run may predate writes made since
+        shutil.rmtree(cache_directory(snapshot), ignore_errors=True)
+    sock = listen(host, port)
+    children = {}
+    stopping = []
+
+    def spawn(role):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_child(role, sock, snapshot, setup, access_log)
+            except BaseException as e:
+                print(f"{role} {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = role
+        return pid
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    previous = os.stat(snapshot) if os.path.exists(snapshot) else None
+    usable = previous is not None and time.time() - previous.st_mtime <= max_age
+    if previous is not None and not usable:
+        print(f"Snapshot {snapshot} is {time.time() - previous.st_mtime:.0f}s old, waiting for a fresh one")
+
+    def published():
+        return os.path.exists(snapshot) and (previous is None or os.stat(snapshot).st_mtime_ns != previous.st_mtime_ns)
+
+    spawn('publish')
+    # workers start from the previous run's snapshot if it is recent enough, otherwise wait for the first
+    deadline = time.monotonic() + ready_timeout
+    while not usable and not published() and not stopping:
+        if time.monotonic() > deadline:
+            stop(None, None)
+            raise RuntimeError(f"no snapshot published to {snapshot} after {ready_timeout}s")
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            role = children.pop(pid)
+            print(f"{role} {pid} exited before publishing, restarting")
+            time.sleep(RESTART_DELAY)
+            spawn(role)
+        time.sleep(0.2)
+    for _ in range(workers):
+        spawn('read')
+    print(f"Serving on {host}:{port} with {workers} workers, snapshot {snapshot}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        role = children.pop(pid, None)
+        if role is None or stopping:
+            continue
+        print(f"{role} {pid} exited with status {status}, restarting")
+        time.sleep(RESTART_DELAY)
+        spawn(role)
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard with several worker processes sharing one data snapshot.")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--snapshot', help="shared snapshot file, defaults to one in /dev/shm")
+    parser.add_argument('--access-log', action='store_true', help="log every request")
+    parser.add_argument('--snapshot-max-age', type=int, default=SNAPSHOT_MAX_AGE,
+                        help="seconds a previous snapshot may be old to be served at startup, 0 waits for a fresh one")
+    args = parser.parse_args(argv)
+    serve(args.workers, args.host, args.port, args.snapshot, access_log=args.access_log,
+          max_age=args.snapshot_max_age)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
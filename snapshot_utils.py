@@ -0,0 +1,279 @@
+import json
+import mmap
+import os
+import threading
+import time
+import numpy as np
+from scipy import sparse
+
+MAGIC = b'DASHSNP1'
+# array offsets are aligned so every view starts on a cache line
+ALIGN = 64
+# seconds between checks of whether a newer snapshot file was published
+CHECK_INTERVAL = float(os.environ.get('DASHBOARD_SNAPSHOT_CHECK', 2))
+
+
+def sparse_arrays(name, m):
+    """
+    The arrays of a CSR or CSC matrix, for export_state.
+    """
+    return {f"{name}.data": m.data, f"{name}.indices": m.indices, f"{name}.indptr": m.indptr,
+            f"{name}.shape": np.array(m.shape, dtype=np.int64)}
+
+
+def sparse_from(arrays, name, fmt='csr'):
+    """
+    Rebuild a matrix stored with sparse_arrays around the same (mapped) arrays, without copying.
+    """
+    matrix = sparse.csr_matrix if fmt == 'csr' else sparse.csc_matrix
+    parts = (arrays[f"{name}.data"], arrays[f"{name}.indices"], arrays[f"{name}.indptr"])
+    return matrix(parts, shape=tuple(int(n) for n in arrays[f"{name}.shape"]), copy=False)
+
+
+class GroupedRows:
+    def __init__(self, keys, offsets, columns):
+        """
+        A dict of key -> list of rows kept as flat arrays: the keys, offsets into the rows
+        (rows of keys[i] are offsets[i]:offsets[i + 1]) and one array per column. Only the
+        key lookup is a Python dict, the rows stay in the arrays, mapped or not.
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.columns = columns
+        self.lookup = {key: i for i, key in enumerate(keys.tolist())}
+
+    @classmethod
+    def from_dict(cls, groups, width):
+        """
+        :param groups: dict of key -> list of rows, rows are tuples of width values (or
+            plain values when width is 1); strings become numpy strings, numbers int64
+        """
+        rows = [row if width > 1 else (row,) for values in groups.values() for row in values]
+        offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+        np.cumsum([len(values) for values in groups.values()], out=offsets[1:])
+        columns = [np.array(column) for column in zip(*rows)] if rows else [np.array([], dtype=str)] * width
+        # NULL names would make object arrays, which cannot be mapped
+        columns = [column.astype(str) if column.dtype.hasobject else column for column in columns]
+        return cls(np.array(list(groups), dtype=str), offsets, columns)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, key, start=0, stop=None):
+        """
+        Rows start..stop of key as tuples of Python values (plain values for one column).
+        """
+        i = self.lookup.get(key)
+        if i is None:
+            return []
+        low, high = int(self.offsets[i]), int(self.offsets[i + 1])
+        stop = high if stop is None else min(low + stop, high)
+        columns = [column[low + start:stop].tolist() for column in self.columns]
+        return columns[0] if len(columns) == 1 else list(zip(*columns))
+
+
+def grouped_arrays(name, grouped):
+    """
+    The arrays of a GroupedRows, for export_state.
+    """
+    return dict({f"{name}.keys": grouped.keys, f"{name}.offsets": grouped.offsets},
+                **{f"{name}.{i}": column for i, column in enumerate(grouped.columns)})
+
+
+def grouped_from(arrays, name):
+    """
+    Rebuild a GroupedRows stored with grouped_arrays around the same (mapped) arrays.
+    """
+    columns = []
+    while f"{name}.{len(columns)}" in arrays:
+        columns.append(arrays[f"{name}.{len(columns)}"])
+    return GroupedRows(arrays[f"{name}.keys"], arrays[f"{name}.offsets"], columns)
+
+
+def write_snapshot(path, version, arrays, documents):
+    """
+    Write arrays (name -> numpy array) and documents (name -> JSON serializable) to path.
+
+    The file is a JSON header followed by the raw array bytes, so a reader can map it and
+    use the arrays in place. It is written next to path and renamed over it, so readers
+    see either the old or the new snapshot, never a partial one.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise ValueError(f"{name} holds Python objects, only plain arrays can be mapped")
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({'version': version, 'created_at': time.time(), 'arrays': layout,
+                         'documents': documents}, default=str).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MappedSnapshot:
+    def __init__(self, path):
+        """
+        A published snapshot mapped read only. The arrays are views into the mapping, so
+        every process that maps the same file shares one copy in the page cache. The
+        mapping stays valid after a newer snapshot is renamed over the file, for as long as
+        anything still references its arrays.
+        """
+        with open(path, 'rb') as f:
+            info = os.fstat(f.fileno())
+            self.identity = (info.st_ino, info.st_mtime_ns, info.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a dashboard snapshot")
+        length = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 8], 'little')
+        header = json.loads(self._map[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+        start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+        self.version = header['version']
+        self.created_at = header['created_at']
+        self.documents = header['documents']
+        self.arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            self.arrays[name] = np.frombuffer(self._map, dtype=dtype, count=count,
+                                              offset=start + spec['offset']).reshape(spec['shape'])
+
+    @property
+    def nbytes(self):
+        return len(self._map)
+
+    def section(self, prefix):
+        return {name[len(prefix) + 1:]: array for name, array in self.arrays.items() if name.startswith(prefix + '/')}
+
+
+def snapshot_identity(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_ino, info.st_mtime_ns, info.st_size
+
+
+class SharedSnapshot:
+    def __init__(self, path, stores, check_interval=CHECK_INTERVAL):
+        """
+        One file holding the state of several in memory stores, written by a single
+        publisher process and mapped by every serving worker.
+
+        Each store implements export_state() -> (arrays, document) and
+        import_state(arrays, document). The publisher calls publish() after its refreshes;
+        a reader calls attach() once, after which the stores' refresh() maps the newest
+        published file instead of querying the databases.
+
+        :param path: snapshot file, preferably on a tmpfs such as /dev/shm
+        :param stores: dict of section name -> store
+        :param check_interval: seconds between checks for a newer file in sync()
+        """
+        self.path = path
+        self.stores = stores
+        self.check_interval = check_interval
+        self.current = None
+        self.published = 0
+        self.loads = 0
+        self.last_error = None
+        self._published_key = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.current.version if self.current is not None else 0
+
+    def _key(self):
+        # stores tell their state apart by fingerprint, version or (option lists) being warm
+        return repr([(getattr(store, 'fingerprint', None), getattr(store, 'version', None), getattr(store, 'warm', None))
+                     for store in self.stores.values()])
+
+    def publish(self, force=False):
+        """
+        Write the stores' current state as a new snapshot version, unless nothing changed
+        since the last one.
+        """
+        with self._lock:
+            key = self._key()
+            if not force and key == self._published_key:
+                return False
+            arrays = {}
+            documents = {}
+            for name, store in self.stores.items():
+                store_arrays, documents[name] = store.export_state()
+                arrays.update({f"{name}/{array_name}": array for array_name, array in store_arrays.items()})
+            version = max(self.published, self.version) + 1
+            try:
+                write_snapshot(self.path, version, arrays, documents)
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                print(f"Could not publish snapshot {self.path}: {e}")
+                return False
+            self.published = version
+            self._published_key = key
+            self.last_error = None
+            return True
+
+    def attach(self, poll=True):
+        """
+        Serve the stores from the published snapshots from now on. With poll a background
+        thread picks up newer snapshots every check_interval seconds.
+        """
+        for store in self.stores.values():
+            if hasattr(store, 'refresh'):
+                store.refresh = self.sync
+        self.sync(force=True)
+        if poll:
+            threading.Thread(target=self._poll, name='shared-snapshot', daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.sync()
+
+    def sync(self, force=False):
+        """
+        Map the published file if it is newer than the one in use and hand each store its
+        section. Checks at most every check_interval seconds unless forced.
+        Returns 'loaded', 'unchanged' or 'failed'.
+        """
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return 'unchanged'
+        with self._lock:
+            self._checked_at = now
+            identity = snapshot_identity(self.path)
+            if identity is None:
+                return 'failed'
+            if self.current is not None and identity == self.current.identity:
+                return 'unchanged'
+            try:
+                snapshot = MappedSnapshot(self.path)
+                for name, store in self.stores.items():
+                    if name in snapshot.documents:
+                        store.import_state(snapshot.section(name), snapshot.documents[name])
+            except (OSError, ValueError, KeyError) as e:
+                self.last_error = str(e)
+                print(f"Could not load snapshot {self.path}: {e}")
+                return 'failed'
+            # the previous mapping is released once no store references its arrays
+            self.current = snapshot
+            self.loads += 1
+            self.last_error = None
+            return 'loaded'
+
+    def stats(self):
+        return {'version': self.version, 'published': self.published, 'loads': self.loads,
+                'mapped_bytes': self.current.nbytes if self.current is not None else 0,
+                'failing': int(self.last_error is not None)}
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# time the process started importing the app, used for the cold start report
+PROCESS_START = time.monotonic()
+
+
+class OptionLists:
+    def __init__(self, loaders, snapshot=None, max_workers=4, retry_delay=30, max_retry_delay=60*60):
+        """
+        Fetch the dropdown option lists concurrently in the background, once each.
+
+        Until every list is loaded the app is 'warming' and get() returns an empty list.
+        With a snapshot path the lists are read from that JSON file when it exists and
+        written to it after the first successful load. Lists that failed to load are
+        retried by retry(), which backs off exponentially while they keep failing.
+
+        :param loaders: dict of name -> callable returning a list
+        :param snapshot: optional JSON file holding previously fetched lists
+        :param max_workers: number of loaders run at the same time
+        :param retry_delay: seconds before the first retry of a failed list
+        :param max_retry_delay: longest wait between retries
+        """
+        self.loaders = loaders
+        self.snapshot = snapshot
+        self.max_workers = max_workers
+        self.values = {}
+        self.timings = {}
+        self.errors = {}
+        self.source = None
+        self.warm_at = None
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.retries = 0
+        self._retry_at = None
+        self._done = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+
+    @property
+    def status(self):
+        if self._done.is_set():
+            return 'ready' if not self.errors else 'degraded'
+        return 'warming' if self._started else 'cold'
+
+    @property
+    def warm(self):
+        return self._done.is_set()
+
+    def get(self, name):
+        values = self.values.get(name, [])
+        # lists taken from a shared snapshot stay numpy arrays over the mapping
+        return values.tolist() if isinstance(values, np.ndarray) else values
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def start(self, warmers=(), background=True):
+        """
+        Begin loading. warmers are extra callables (e.g. building the rollups) run in
+        the same pool whose results are ignored.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if background:
+            threading.Thread(target=self._load, args=(warmers,), name='option-lists', daemon=True).start()
+        else:
+            self._load(warmers)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read option snapshot {self.snapshot}: {e}")
+            return False
+        if not all(name in data for name in self.loaders):
+            return False
+        self.values = {name: data[name] for name in self.loaders}
+        self.source = 'snapshot'
+        return True
+
+    def save_snapshot(self, path=None):
+        path = path or self.snapshot
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.values, f)
+        os.replace(tmp, path)
+
+    def _timed(self, name, loader):
+        start = time.monotonic()
+        try:
+            return loader()
+        finally:
+            self.timings[name] = time.monotonic() - start
+
+    def _load(self, warmers):
+        start = time.monotonic()
+        if self.snapshot and os.path.exists(self.snapshot) and self._load_snapshot():
+            self.timings['snapshot'] = time.monotonic() - start
+        else:
+            self.source = 'database'
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+            if self.source == 'database':
+                futures = {name: pool.submit(self._timed, name, loader) for name, loader in self.loaders.items()}
+            warm_futures = [pool.submit(self._timed, getattr(w, '__qualname__', repr(w)), w) for w in warmers]
+            for name, future in futures.items():
+                try:
+                    self.values[name] = self._dedupe(future.result())
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    self.values[name] = []
+                    print(f"Loading {name} failed: {e}")
+            if self.errors:
+                self._retry_at = time.monotonic() + self.retry_delay
+            # option lists are usable as soon as they are in, the warmers may still be running
+            self.warm_at = time.monotonic()
+            self._done.set()
+            self.timings['option_lists'] = self.warm_at - start
+            print(self.report())
+            for future in warm_futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Warmup failed: {e}")
+        if self.snapshot and self.source == 'database' and not self.errors and not os.path.exists(self.snapshot):
+            self.save_snapshot()
+
+    @staticmethod
+    def _dedupe(values):
+        # dedupe while keeping the order the database returned
+        return list(dict.fromkeys(v for v in (values or []) if v is not None))
+
+    def retry(self):
+        """
+        Load the lists that failed again, meant to be called periodically (it is one of the
+        precompute refreshers). Does nothing until the backoff delay has passed, which
+        doubles after every retry that still fails.
+        """
+        if not self._done.is_set() or not self.errors or time.monotonic() < self._retry_at:
+            return
+        self.retries += 1
+        for name in list(self.errors):
+            try:
+                self.values[name] = self._dedupe(self._timed(name, self.loaders[name]))
+                del self.errors[name]
+            except Exception as e:
+                self.errors[name] = str(e)
+                print(f"Retrying {name} failed: {e}")
+        if self.errors:
+            delay = min(self.retry_delay * 2 ** self.retries, self.max_retry_delay)
+            self._retry_at = time.monotonic() + delay
+            return
+        print(f"Option lists ready after {self.retries} retries")
+        self.retries = 0
+        if self.snapshot and self.source == 'database' and not os.path.exists(self.snapshot):
+            self.save_snapshot()
+
+    def export_state(self):
+        if not self.warm:
+            return {}, None
+        return {name: np.array(values, dtype=str) for name, values in self.values.items()}, list(self.values)
+
+    def import_state(self, arrays, document):
+        """
+        Take the lists from a shared snapshot instead of loading them. The loaders are
+        replaced too, so the typeahead indexes resync from the shared lists.
+        """
+        if document is None:
+            return
+        self.values = {name: arrays[name] for name in document}
+        self.loaders = {name: (lambda name=name: self.get(name)) for name in document}
+        self.source = 'shared'
+        with self._lock:
+            self._started = True
+        if not self._done.is_set():
+            self.warm_at = time.monotonic()
+            self._done.set()
+
+    def report(self):
+        lines = [f"Cold start: option lists {self.status} from {self.source}"]
+        if self.warm_at is not None:
+            lines[0] += f" {self.warm_at - PROCESS_START:.2f}s after process start"
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name}: {seconds:.3f}s")
+        return '\n'.join(lines)
@@ -0,0 +1,316 @@
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import mysql_utils as sqlDB
+from flight_utils import single_flight
+from snapshot_utils import sparse_arrays, sparse_from
+
+METRICS = ('publications', 'citations')
+# keywords need at least this many publications in the recent window to rank as growing
+MIN_COUNT = 5
+
+# per (year, keyword, university) counts for a range of publication ids, a publication with
+# authors at two universities counts once for each of them
+UNIVERSITY_CELLS_QUERY = """
+SELECT publication.year AS year, pk.keyword_id AS keyword_id, pu.university_id AS university_id,
+    COUNT(*) AS publications, COALESCE(SUM(publication.num_citations), 0) AS citations
+FROM (
+    SELECT DISTINCT fp.publication_Id AS publication_id, faculty.university_id AS university_id
+    FROM faculty_publication fp
+    JOIN faculty ON faculty.id = fp.faculty_Id
+    WHERE fp.publication_Id > %s AND fp.publication_Id <= %s AND faculty.university_id IS NOT NULL
+) pu
+JOIN publication ON publication.id = pu.publication_id
+JOIN Publication_Keyword pk ON pk.publication_id = publication.id
+WHERE publication.year IS NOT NULL
+GROUP BY publication.year, pk.keyword_id, pu.university_id
+"""
+
+# the all universities plane is counted separately so every publication counts once
+KEYWORD_CELLS_QUERY = """
+SELECT publication.year AS year, pk.keyword_id AS keyword_id,
+    COUNT(*) AS publications, COALESCE(SUM(publication.num_citations), 0) AS citations
+FROM publication
+JOIN Publication_Keyword pk ON pk.publication_id = publication.id
+WHERE publication.id > %s AND publication.id <= %s AND publication.year IS NOT NULL
+GROUP BY publication.year, pk.keyword_id
+"""
+
+KEYWORDS_QUERY = "SELECT id, name FROM keyword"
+UNIVERSITIES_QUERY = "SELECT id, name FROM university"
+
+# whether anything at or below the last loaded publication id changed, in which case a delta is not enough
+FINGERPRINT_QUERY = """
+SELECT
+    (SELECT COALESCE(MAX(id), 0) FROM publication) AS max_publication_id,
+    (SELECT COUNT(*) FROM faculty_publication WHERE publication_Id <= %s) AS old_links,
+    (SELECT COUNT(*) FROM Publication_Keyword WHERE publication_id <= %s) AS old_labels,
+    (SELECT COALESCE(SUM(num_citations), 0) + COALESCE(SUM(year), 0) FROM publication WHERE id <= %s) AS old_publications,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', COALESCE(university_id, '')))), 0) FROM faculty) AS faculty_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0) FROM keyword) AS keyword_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0) FROM university) AS university_checksum
+"""
+
+
+class TrendCube:
+    def __init__(self, fetch=None):
+        """
+        Publication and citation counts per year x keyword x university, for the research
+        trends view.
+
+        Each metric is one sparse matrix with a row per keyword and a column per (year,
+        university) pair, year major, so a year range is a contiguous block of columns.
+        University slot 0 of every year holds the totals over all universities. Matrices are
+        kept in CSC form, since every lookup selects a handful of columns.
+
+        refresh() only aggregates the publications added since the last load and adds them
+        to the cube; a full rebuild only happens when older publications, links or names
+        changed. Series, range totals and growth rankings never query the databases.
+
+        :param fetch: query function with the same signature as mysql_utils.fetch_data
+        """
+        self.fetch = fetch or sqlDB.fetch_data
+        self._lock = threading.Lock()
+        self.max_publication_id = None
+        self.fingerprint = None
+        self.state = None
+
+    @property
+    def ready(self):
+        return self.state is not None
+
+    def _fingerprint(self, upto):
+        df = self.fetch(FINGERPRINT_QUERY, params=(upto, upto, upto), cache=False)
+        if df.empty:
+            return None
+        row = df.iloc[0]
+        return {
+            'max_publication_id': int(row['max_publication_id']),
+            'old': tuple(int(row[column]) for column in df.columns if column != 'max_publication_id')
+        }
+
+    def _cells(self, low, high):
+        """
+        (year, keyword id, university id or 0 for all, publications, citations) for the
+        publications with ids in (low, high], None if a query failed.
+        """
+        universities = self.fetch(UNIVERSITY_CELLS_QUERY, params=(low, high), cache=False)
+        totals = self.fetch(KEYWORD_CELLS_QUERY, params=(low, high), cache=False)
+        if 'year' not in universities or 'year' not in totals:
+            return None
+        totals['university_id'] = 0
+        return pd.concat([universities, totals], ignore_index=True)
+
+    def _layout(self, cells, keywords, universities, base=None):
+        """
+        Place cells (and the cells of the base state, if any) into a new cube over the given
+        keyword and university dimensions.
+        """
+        years = cells['year'].to_numpy(np.int64)
+        first_year = min(years.min(initial=10 ** 6), base['first_year'] if base else 10 ** 6)
+        last_year = max(years.max(initial=-10 ** 6), base['last_year'] if base else -10 ** 6)
+        if first_year > last_year:
+            first_year = last_year = 0
+        first_year, last_year = int(first_year), int(last_year)
+        keyword_ids = pd.Index(keywords['id'])
+        # university slot 0 is the all universities plane
+        university_ids = pd.Index([0] + list(universities['id']))
+        stride = len(university_ids)
+        shape = (len(keyword_ids), (last_year - first_year + 1) * stride)
+
+        rows = keyword_ids.get_indexer(cells['keyword_id'])
+        slots = university_ids.get_indexer(cells['university_id'])
+        keep = (rows >= 0) & (slots >= 0)
+        cols = (years - first_year) * stride + slots
+        parts = {metric: [(cells[metric].to_numpy(np.int64)[keep], rows[keep], cols[keep])] for metric in METRICS}
+        if base is not None:
+            # carry the existing counts over, their keywords and universities can have moved
+            base_keywords = keyword_ids.get_indexer(base['keyword_ids'])
+            base_slots = university_ids.get_indexer(base['university_ids'])
+            for metric in METRICS:
+                old = base[metric].tocoo()
+                old_years, old_slots = np.divmod(old.col, base['stride'])
+                new_rows, new_slots = base_keywords[old.row], base_slots[old_slots]
+                ok = (new_rows >= 0) & (new_slots >= 0)
+                parts[metric].append((old.data[ok], new_rows[ok],
+                                      (old_years[ok] + base['first_year'] - first_year) * stride + new_slots[ok]))
+        state = {
+            'first_year': first_year,
+            'last_year': last_year,
+            'stride': stride,
+            'keyword_ids': keyword_ids,
+            'university_ids': university_ids,
+            'keywords': keywords['name'].to_numpy(str),
+            'keyword_lookup': {name: i for i, name in enumerate(keywords['name'])},
+            'university_lookup': {name: i + 1 for i, name in enumerate(universities['name'])},
+        }
+        for metric in METRICS:
+            data, r, c = (np.concatenate(arrays) for arrays in zip(*parts[metric]))
+            # duplicates (a cell in both the base and the delta) are summed
+            state[metric] = sparse.csc_matrix((data, (r, c)), shape=shape, dtype=np.int64)
+        return state
+
+    def _publish(self, state, max_publication_id, fingerprint):
+        with self._lock:
+            self.state = state
+            self.max_publication_id = max_publication_id
+            self.fingerprint = fingerprint
+
+    def build(self):
+        fingerprint = self._fingerprint(0)
+        if fingerprint is None:
+            return False
+        max_id = fingerprint['max_publication_id']
+        # taken before the cells are read, a change made while they load leaves an older
+        # fingerprint behind and the next refresh rebuilds instead of missing it
+        fingerprint = self._fingerprint(max_id)
+        if fingerprint is None:
+            return False
+        cells = self._cells(0, max_id)
+        if cells is None:
+            return False
+        state = self._layout(cells, self.fetch(KEYWORDS_QUERY, cache=False), self.fetch(UNIVERSITIES_QUERY, cache=False))
+        self._publish(state, max_id, fingerprint)
+        return True
+
+    def export_state(self):
+        state = self.state
+        if state is None:
+            return {}, None
+        universities = sorted(state['university_lookup'], key=state['university_lookup'].get)
+        arrays = dict(sparse_arrays('publications', state['publications']),
+                      **sparse_arrays('citations', state['citations']),
+                      keyword_ids=state['keyword_ids'].to_numpy(), university_ids=state['university_ids'].to_numpy(),
+                      keywords=state['keywords'], universities=np.array(universities, dtype=str))
+        document = {'first_year': state['first_year'], 'last_year': state['last_year'], 'stride': state['stride'],
+                    'max_publication_id': self.max_publication_id, 'fingerprint': self.fingerprint}
+        return arrays, document
+
+    def import_state(self, arrays, document):
+        if document is None:
+            return
+        state = {
+            'first_year': document['first_year'],
+            'last_year': document['last_year'],
+            'stride': document['stride'],
+            'keyword_ids': pd.Index(arrays['keyword_ids']),
+            'university_ids': pd.Index(arrays['university_ids']),
+            'keywords': arrays['keywords'],
+            'keyword_lookup': {name: i for i, name in enumerate(arrays['keywords'].tolist())},
+            'university_lookup': {name: i + 1 for i, name in enumerate(arrays['universities'].tolist())},
+        }
+        for metric in METRICS:
+            state[metric] = sparse_from(arrays, metric, 'csc')
+        self._publish(state, document['max_publication_id'], document['fingerprint'])
+
+    def refresh(self):
+        """
+        Bring the cube up to date. Returns 'built', 'incremental', 'unchanged' or 'failed'.
+        """
+        return single_flight.do(('refresh', id(self)), self._refresh)
+
+    def _refresh(self):
+        if not self.ready:
+            return 'built' if self.build() else 'failed'
+        current = self._fingerprint(self.max_publication_id)
+        if current is None:
+            return 'failed'
+        if current['old'] != self.fingerprint['old']:
+            return 'built' if self.build() else 'failed'
+        new_max = current['max_publication_id']
+        if new_max == self.max_publication_id:
+            return 'unchanged'
+        fingerprint = self._fingerprint(new_max)
+        if fingerprint is None:
+            return 'failed'
+        # only the new publications are aggregated, then added to the existing cells
+        cells = self._cells(self.max_publication_id, new_max)
+        if cells is None:
+            return 'failed'
+        state = self._layout(cells, self.fetch(KEYWORDS_QUERY, cache=False), self.fetch(UNIVERSITIES_QUERY, cache=False), base=self.state)
+        self._publish(state, new_max, fingerprint)
+        return 'incremental'
+
+    def _state(self):
+        if not self.ready:
+            self.refresh()
+        return self.state
+
+    def years(self):
+        state = self._state()
+        if state is None or not state['publications'].nnz:
+            return None, None
+        return state['first_year'], state['last_year']
+
+    def _columns(self, state, start, end, university):
+        """
+        Column indices of years start..end (inclusive, clipped to the cube) for university,
+        or None if the university is unknown.
+        """
+        slot = state['university_lookup'].get(university) if university else 0
+        if slot is None:
+            return None, None
+        start = max(state['first_year'], start if start is not None else state['first_year'])
+        end = min(state['last_year'], end if end is not None else state['last_year'])
+        years = np.arange(start, end + 1)
+        return years, (years - state['first_year']) * state['stride'] + slot
+
+    def series(self, keyword, university=None, start=None, end=None):
+        """
+        [(year, publications, citations)] for keyword, at university or over all universities.
+        """
+        state = self._state()
+        if state is None or keyword not in state['keyword_lookup']:
+            return []
+        years, cols = self._columns(state, start, end, university)
+        if cols is None or not len(cols):
+            return []
+        row = state['keyword_lookup'][keyword]
+        values = [state[metric][:, cols][row].toarray().ravel() for metric in METRICS]
+        return [(int(year), int(publications), int(citations))
+                for year, publications, citations in zip(years, *values)]
+
+    def _totals(self, state, start, end, university, metric):
+        # per keyword sum over a block of columns
+        _, cols = self._columns(state, start, end, university)
+        if cols is None or not len(cols):
+            return None
+        return np.asarray(state[metric][:, cols].sum(axis=1)).ravel()
+
+    def top_keywords(self, start=None, end=None, university=None, metric='publications', k=10):
+        """
+        [(keyword, total)] for the k keywords with the most publications (or citations) in
+        years start..end.
+        """
+        state = self._state()
+        if state is None:
+            return []
+        totals = self._totals(state, start, end, university, metric)
+        if totals is None:
+            return []
+        best = np.lexsort((state['keywords'], -totals))[:k]
+        return [(str(state['keywords'][i]), int(totals[i])) for i in best if totals[i] > 0]
+
+    def top_growth(self, end=None, span=3, university=None, metric='publications', k=10, min_count=MIN_COUNT):
+        """
+        Fastest growing keywords: the span years up to end against the span years before.
+        Growth is the ratio of the two totals (smoothed by one, so new keywords rank but do
+        not dominate), keywords need min_count in the recent window.
+
+        :return: [(keyword, previous total, recent total, growth ratio)], fastest first
+        """
+        state = self._state()
+        if state is None or not state['publications'].nnz:
+            return []
+        end = min(end if end is not None else state['last_year'], state['last_year'])
+        recent = self._totals(state, end - span + 1, end, university, metric)
+        previous = self._totals(state, end - 2 * span + 1, end - span, university, metric)
+        if recent is None:
+            return []
+        if previous is None:
+            previous = np.zeros_like(recent)
+        growth = (recent + 1) / (previous + 1)
+        candidates = np.flatnonzero(recent >= min_count)
+        order = candidates[np.lexsort((state['keywords'][candidates], -recent[candidates], -growth[candidates]))][:k]
+        return [(str(state['keywords'][i]), int(previous[i]), int(recent[i]), float(growth[i])) for i in order]